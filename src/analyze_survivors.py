@@ -1,30 +1,39 @@
-import pandas as pd
 import matplotlib.pyplot as plt
 
+from pipeline import run_pipeline
+
 # Load your results
 file_path = "P9_Grid_Survivors.csv"
+BRIGHT_GHOST_CUT = 23.3
+
+# 1. THE NOISE FILTER (Mag > cut)
+# Pan-STARRS often misses things fainter than 23.3. These are likely just static stars.
+# 2. THE "BRIGHT GHOST" FILTER (Mag <= cut)
+# These are bright enough that Pan-STARRS *should* have seen them.
+# The fact that it didn't suggests they MOVED.
+# Sorted by Magnitude (Brightest first = Most suspicious). Only the split and
+# what follows it are recomputed when the cut changes (see pipeline.py).
+STAGES = [
+    {'stage': 'load_csv', 'path': file_path},
+    {'stage': 'bright_split', 'cut': BRIGHT_GHOST_CUT},
+    {'stage': 'sort', 'by': 'mag'},
+    {'stage': 'save', 'path': "P9_Priority_Targets.csv"},
+]
+
 print(f"--- ANALYZING {file_path} ---")
 
 try:
-    df = pd.read_csv(file_path)
+    outputs = run_pipeline(STAGES)
+    df = outputs['load_csv']
     total = len(df)
-    
-    # 1. THE NOISE FILTER (Mag > 23.3)
-    # Pan-STARRS often misses things fainter than 23.3. These are likely just static stars.
-    noise = df[df['mag'] > 23.3]
-    
-    # 2. THE "BRIGHT GHOST" FILTER (Mag < 23.3)
-    # These are bright enough that Pan-STARRS *should* have seen them.
-    # The fact that it didn't suggests they MOVED.
-    candidates = df[df['mag'] <= 23.3].copy()
-    
+    noise = df[df['mag'] > BRIGHT_GHOST_CUT]
+    candidates = outputs['save']
+
     print(f"Total Raw Survivors: {total}")
-    print(f"Removed Faint Background (Mag > 23.3): {len(noise)}")
-    print(f"PRIORITY CANDIDATES (Mag <= 23.3): {len(candidates)}")
+    print(f"Removed Faint Background (Mag > {BRIGHT_GHOST_CUT}): {len(noise)}")
+    print(f"PRIORITY CANDIDATES (Mag <= {BRIGHT_GHOST_CUT}): {len(candidates)}")
     
     if not candidates.empty:
-        # Sort by Magnitude (Brightest first = Most suspicious)
-        candidates = candidates.sort_values('mag')
         
         print("\n" + "="*60)
         print("TOP 10 'BRIGHT GHOST' CANDIDATES")
@@ -52,8 +61,7 @@ try:
         plt.savefig(output_img)
         print(f"\n[VISUAL] Saved detection map to '{output_img}'")
         
-        # Save the "Kill List"
-        candidates.to_csv("P9_Priority_Targets.csv", index=False)
+        # The "Kill List" was saved by the pipeline's last stage
         print("\n[ACTION] Data saved to 'P9_Priority_Targets.csv'.")
         print("These are the coordinates you must visually inspect.")
 
@@ -1,6 +1,7 @@
-import requests
 import urllib.parse
 
+import http_client
+
 # --- CANDIDATE DATA ---
 # Target: 54.881786, -10.032207 -> 03 39 31.6, -10 01 56
 # Date: 2018 03 28
@@ -28,7 +29,7 @@ def check_mpc_brute_force():
     try:
         print(f"[*] Sending POST request to MPC for 2018-03-28...")
         # POST request is often handled better than GET for 'checkmp'
-        response = requests.post(url, data=payload)
+        response = http_client.post(url, data=payload, timeout=60)
         
         if response.status_code == 200:
             content = response.text
@@ -42,7 +43,7 @@ def check_mpc_brute_force():
                 get_params = "ra=03+39+31&decl=-10+01+56&obs_code=W84&date=2018+03+28&radius=15&limit=5"
                 full_url = f"{url}?{get_params}"
                 
-                response_get = requests.get(full_url)
+                response_get = http_client.get(full_url, timeout=60)
                 content = response_get.text
             
             # --- PARSE RESULT ---
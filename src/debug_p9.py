@@ -1,5 +1,7 @@
-import re
 import sys
+import numpy as np
+
+from itf_parser import open_itf, iter_blocks, line_bounds, line_matrix, decode_lines, box_mask
 
 # --- CONFIGURATION ---
 SEARCH_RA_MIN_DEG = 45.0
@@ -27,58 +29,44 @@ def main():
 
     hits_found = 0
     
-    with open(FILENAME, 'r') as f:
-        for line in f:
-            if len(line) < 60: continue
-            
-            # Raw Slice (Standard MPC)
-            ra_str = line[32:44]   # HH MM SS.s
-            dec_str = line[44:56]  # sDD MM SS.s
-            
-            # Quick Spatial Check
-            try:
-                # Parse RA
-                ra_h = float(ra_str[0:2])
-                ra_m = float(ra_str[3:5])
-                ra_s = float(ra_str[6:])
-                ra_deg = (ra_h + ra_m/60 + ra_s/3600) * 15.0
-                
-                # Parse Dec
-                dec_sign = -1 if dec_str[0] == '-' else 1
-                dec_d = float(dec_str[1:3])
-                dec_m = float(dec_str[4:6])
-                dec_s = float(dec_str[7:])
-                dec_deg = dec_sign * (dec_d + dec_m/60 + dec_s/3600)
-                
-                # CHECK IF IN BOX
-                if (SEARCH_RA_MIN_DEG <= ra_deg <= SEARCH_RA_MAX_DEG) and \
-                   (SEARCH_DEC_MIN <= dec_deg <= SEARCH_DEC_MAX):
-                    
-                    hits_found += 1
-                    print(f"HIT #{hits_found}")
-                    print(f"RAW LINE: {line.rstrip()}")
-                    print(f"   > RA: {ra_deg:.4f} | Dec: {dec_deg:.4f}")
-                    
-                    # Test Date Regex
-                    date_chunk = line[14:32]
-                    # Improved Regex: allows integer days (no decimal)
-                    match = re.search(r"(19\d{2}|20\d{2})\s+(\d{2})\s+(\d{2}(\.\d+)?)", date_chunk)
-                    if match:
-                        print(f"   > DATE PARSE: SUCCESS ({match.group(0)})")
-                    else:
-                        print(f"   > DATE PARSE: FAILED (Saw '{date_chunk}')")
-                        
-                    # Test Mag
-                    mag_chunk = line[65:70]
-                    print(f"   > MAG PARSE: '{mag_chunk}'")
-                    print("-" * 80)
-                    
-                    if hits_found >= 5:
-                        print("Diagnostic Limit Reached. Stopping.")
-                        sys.exit()
-                        
-            except Exception:
-                continue
+    data = open_itf(FILENAME)
+    box = (SEARCH_RA_MIN_DEG, SEARCH_RA_MAX_DEG, SEARCH_DEC_MIN, SEARCH_DEC_MAX)
+
+    for start, stop in iter_blocks(data):
+        block = np.asarray(data[start:stop])
+        starts, ends = line_bounds(block)
+        long_enough = (ends - starts) >= 60
+        starts, ends = starts[long_enough], ends[long_enough]
+
+        lines = line_matrix(block, starts, ends)
+        cols = decode_lines(lines)
+
+        # Quick Spatial Check (whole block at once)
+        in_box = np.isfinite(cols['ra']) & np.isfinite(cols['dec']) & \
+                 box_mask(cols['ra'], cols['dec'], box)
+
+        for i in np.flatnonzero(in_box):
+            line = bytes(block[starts[i]:ends[i]]).decode('ascii', 'replace')
+            hits_found += 1
+            print(f"HIT #{hits_found}")
+            print(f"RAW LINE: {line.rstrip()}")
+            print(f"   > RA: {cols['ra'][i]:.4f} | Dec: {cols['dec'][i]:.4f}")
+
+            # Test Date Columns (same rules as the regex: integer days allowed)
+            date_chunk = line[14:32]
+            if cols['valid'][i]:
+                print(f"   > DATE PARSE: SUCCESS ({date_chunk.strip()})")
+            else:
+                print(f"   > DATE PARSE: FAILED (Saw '{date_chunk}')")
+
+            # Test Mag
+            mag_chunk = line[65:70]
+            print(f"   > MAG PARSE: '{mag_chunk}'")
+            print("-" * 80)
+
+            if hits_found >= 5:
+                print("Diagnostic Limit Reached. Stopping.")
+                sys.exit()
 
     if hits_found == 0:
         print("Strange... No spatial hits found this time.")
@@ -1,12 +1,10 @@
-import requests
 import pandas as pd
-import numpy as np
-from io import BytesIO
-import gzip
-from astropy.coordinates import SkyCoord
-import astropy.units as u
 from tqdm import tqdm
 
+from itf_stream import stream_itf
+from regions import box_region, regions_from_targets, save_region_results
+from p9_track import TARGETS, SEARCH_RADIUS
+
 # --- CONFIGURATION: The "Batygin Box" (2025 Refined) ---
 SEARCH_RA_MIN = 45.0   # 3h 00m in degrees
 SEARCH_RA_MAX = 65.0   # 4h 20m in degrees (Expanded slightly)
@@ -19,76 +17,42 @@ MAX_MAG = 25.5         # Limit of standard surveys (Rubin goes deeper)
 # Note: The ITF is large. If this URL fails, check the MPC "Identifications" page.
 ITF_URL = "https://www.minorplanetcenter.net/iau/ITF/itf.txt.gz" 
 
-def parse_mpc80_line(line):
-    """Parses a single line of MPC 80-column format."""
-    try:
-        # Fixed width format parsing
-        # Cols 0-12: ID, 15-32: Date, 32-44: RA, 44-56: Dec, 65-71: Mag
-        obj_id = line[0:12].strip()
-        
-        # Skip header/comments
-        if not line[15].isdigit(): return None
-        
-        # Parse RA (HH MM SS.s) -> Decimal Degrees
-        ra_str = line[32:44]
-        ra_h = float(ra_str[0:2])
-        ra_m = float(ra_str[3:5])
-        ra_s = float(ra_str[6:11])
-        ra_deg = (ra_h + ra_m/60 + ra_s/3600) * 15
-        
-        # Parse Dec (sDD MM SS.s) -> Decimal Degrees
-        dec_str = line[44:56]
-        dec_sign = -1 if dec_str[0] == '-' else 1
-        dec_d = float(dec_str[1:3])
-        dec_m = float(dec_str[4:6])
-        dec_s = float(dec_str[7:11])
-        dec_deg = dec_sign * (dec_d + dec_m/60 + dec_s/3600)
-        
-        # Parse Mag (optional)
-        mag_str = line[65:70].strip()
-        mag = float(mag_str) if mag_str else np.nan
-        
-        return {
-            "id": obj_id,
-            "ra": ra_deg,
-            "dec": dec_deg,
-            "mag": mag,
-            "line": line.strip()
-        }
-    except Exception:
-        return None
+# Same download pass also tags detections in every Grand Tour sector
+# (TARGETS, cones of SEARCH_RADIUS); per-region tables go to these files
+SCAN_SECTORS = True
+PRIMARY_REGION = "PRIMARY_BOX"
+REGION_CANDIDATES_FILE = "P9_Region_Candidates.csv"
+REGION_MOTION_FILE = "P9_Region_Motion.csv"
 
 def main():
     print(f"--- PLANET NINE SEARCH PROTOCOL (Target: RA {SEARCH_RA_MIN}-{SEARCH_RA_MAX}) ---")
     print(f"Downloading ITF from {ITF_URL} (this may take a moment)...")
     
     try:
-        response = requests.get(ITF_URL, stream=True)
-        response.raise_for_status()
-        
-        # Handle gzip if needed, otherwise plain text
-        if ITF_URL.endswith('.gz'):
-            f = gzip.GzipFile(fileobj=BytesIO(response.content))
-        else:
-            f = BytesIO(response.content)
-            
-        candidates = []
-        
-        # Stream the file line by line to save memory
-        for line in tqdm(f, desc="Scanning Tracklets"):
-            line_str = line.decode('utf-8')
-            parsed = parse_mpc80_line(line_str)
-            
-            if parsed:
-                # SPATIAL FILTER: Is it in the box?
-                if (SEARCH_RA_MIN <= parsed['ra'] <= SEARCH_RA_MAX) and \
-                   (SEARCH_DEC_MIN <= parsed['dec'] <= SEARCH_DEC_MAX):
-                       
-                       # MAGNITUDE FILTER: Is it faint enough?
-                       if parsed['mag'] > MIN_MAG:
-                           candidates.append(parsed)
-        
-        df = pd.DataFrame(candidates)
+        # Streaming pipeline: download, gunzip and parse overlap block by block,
+        # so memory stays bounded and candidates appear while still downloading.
+        # ITF_URL may also be a local path (plain or .gz).
+        regions = [box_region(PRIMARY_REGION, SEARCH_RA_MIN, SEARCH_RA_MAX, SEARCH_DEC_MIN, SEARCH_DEC_MAX)]
+        if SCAN_SECTORS:
+            regions += regions_from_targets(TARGETS, SEARCH_RADIUS)
+
+        pbar = tqdm(unit='B', unit_scale=True, desc="Scanning Tracklets")
+        frames = []
+        for block_df in stream_itf(ITF_URL,
+                                   regions=regions,
+                                   min_mag=MIN_MAG,  # Is it faint enough?
+                                   progress=pbar.update):
+            frames.append(block_df[['region', 'id', 'mjd', 'ra', 'dec', 'mag', 'line']])
+            pbar.set_postfix(candidates=sum(len(f) for f in frames))
+        pbar.close()
+        tagged = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+        if SCAN_SECTORS and not tagged.empty:
+            save_region_results(tagged.drop(columns='line'), REGION_CANDIDATES_FILE, REGION_MOTION_FILE, regions)
+
+        df = pd.DataFrame()
+        if not tagged.empty:
+            df = tagged[tagged['region'] == PRIMARY_REGION].drop(columns='region').reset_index(drop=True)
         
         if not df.empty:
             print(f"\nFound {len(df)} raw detections in the Primary Target Zone!")
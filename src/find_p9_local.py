@@ -1,10 +1,12 @@
 import pandas as pd
-import numpy as np
-from astropy.time import Time
-from astropy import units as u
-from astropy.coordinates import SkyCoord
+import os
 from tqdm import tqdm
-import re
+
+from itf_cache import select
+from itf_index import load_itf_index, query_box, query_regions
+from tracklets import tracklet_motion, fit_linear_motion
+from regions import box_region, regions_from_targets, split_regions, save_region_results
+from p9_track import TARGETS, SEARCH_RADIUS
 
 # --- CONFIGURATION: 2025 SEARCH PARAMETERS ---
 SEARCH_RA_MIN = 45.0   # 3h
@@ -17,113 +19,42 @@ DISCARD_BRIGHTER_THAN = 15.0
 
 FILENAME = 'itf.txt'
 
-def parse_mag(mag_str):
-    """Returns float mag or None if empty."""
-    try:
-        if not mag_str or mag_str.isspace(): return None
-        match = re.search(r"(\d+\.\d+|\d+)", mag_str)
-        if match:
-            return float(match.group(1))
-        return None
-    except:
-        return None
-
-def parse_date_bulletproof(date_chunk):
-    """
-    Manually handles 'YYYY MM DD.ddddd' to avoid Astropy ISO errors.
-    """
-    try:
-        # Regex: Group 1=Year, 2=Month, 3=Day(Int), 4=Decimal(Optional)
-        match = re.search(r"(19\d{2}|20\d{2})\s+(\d{2})\s+(\d{2})(\.\d+)?", date_chunk)
-        
-        if match:
-            y, m, d = match.group(1), match.group(2), match.group(3)
-            decimal_part = match.group(4)
-            
-            # 1. Create base time from integer date (Safe for Astropy)
-            iso_base = f"{y}-{m}-{d}"
-            t = Time(iso_base, format='iso', scale='utc')
-            
-            # 2. Add the decimal portion directly to MJD
-            mjd = t.mjd
-            if decimal_part:
-                mjd += float(decimal_part)
-                
-            return mjd
-        return None
-    except:
-        return None
-
-def parse_line(line):
-    try:
-        if len(line) < 60: return None
-        
-        # --- 1. SPATIAL PARSE (Do this first for speed) ---
-        ra_str = line[32:44]
-        dec_str = line[44:56]
-        
-        if not ra_str[0].isdigit() and ra_str[0] != ' ': return None
-
-        # RA
-        ra_h = float(ra_str[0:2])
-        ra_m = float(ra_str[3:5])
-        ra_s = float(ra_str[6:])
-        ra_deg = (ra_h + ra_m/60 + ra_s/3600) * 15.0
-
-        # Check RA Box
-        if not (SEARCH_RA_MIN <= ra_deg <= SEARCH_RA_MAX): return None
-
-        # Dec
-        dec_sign = -1 if dec_str[0] == '-' else 1
-        dec_d = float(dec_str[1:3])
-        dec_m = float(dec_str[4:6])
-        dec_s = float(dec_str[7:])
-        dec_deg = dec_sign * (dec_d + dec_m/60 + dec_s/3600)
-        
-        # Check Dec Box
-        if not (SEARCH_DEC_MIN <= dec_deg <= SEARCH_DEC_MAX): return None
-
-        # --- 2. MAG PARSE ---
-        mag_str = line[65:70]
-        mag = parse_mag(mag_str)
-        
-        # Filter: Only toss if BRIGHT (Low mag number)
-        if mag is not None and mag < DISCARD_BRIGHTER_THAN:
-            return None
-
-        # --- 3. DATE PARSE (The Bulletproof Version) ---
-        date_chunk = line[14:32]
-        mjd = parse_date_bulletproof(date_chunk)
-        if not mjd: return None
-
-        return {
-            'id': line[0:12].strip(),
-            'mjd': mjd,
-            'ra': ra_deg,
-            'dec': dec_deg,
-            'mag': mag if mag is not None else np.nan
-        }
-    except:
-        return None
+# Parallel scan: processes used to parse itf.txt when the cache is (re)built
+# (1 = serial, None = every core). Output is identical either way.
+SCAN_WORKERS = None
+
+# Multi-region pass: the box above plus every Grand Tour sector (TARGETS,
+# cones of SEARCH_RADIUS) in one lookup; per-region tables go to these files
+SCAN_SECTORS = True
+REGION_CANDIDATES_FILE = "P9_Region_Candidates.csv"
+REGION_MOTION_FILE = "P9_Region_Motion.csv"
+
+def scan_regions(cache, index, box):
+    """Per-region candidates and motion for the box and all survey sectors."""
+    regions = [box_region("PRIMARY_BOX", *box)] + regions_from_targets(TARGETS, SEARCH_RADIUS)
+    print(f"\n[*] Multi-region pass: {len(regions)} regions")
+    rows = query_regions(index, regions)
+    df = select(cache, rows=rows, discard_brighter=DISCARD_BRIGHTER_THAN)
+    tagged = split_regions(df[['id', 'mjd', 'ra', 'dec', 'mag']], regions)
+    save_region_results(tagged, REGION_CANDIDATES_FILE, REGION_MOTION_FILE, regions)
 
 def main():
     print(f"--- PLANET NINE BULLETPROOF SEARCH ---")
     print(f"Target: RA {SEARCH_RA_MIN}-{SEARCH_RA_MAX} | Dec {SEARCH_DEC_MIN} to {SEARCH_DEC_MAX}")
     
-    candidates = []
-    
-    with open(FILENAME, 'r') as f:
-        f.seek(0, 2) 
-        size = f.tell()
-        f.seek(0)
-        pbar = tqdm(total=size, unit='B', unit_scale=True, desc="Extracting")
-        
-        for line in f:
-            pbar.update(len(line))
-            res = parse_line(line)
-            if res:
-                candidates.append(res)
-        pbar.close()
+    # Parsed columns are cached next to the ITF; only the first run reads the text
+    size = os.path.getsize(FILENAME)
+    pbar = tqdm(total=size, unit='B', unit_scale=True, desc="Extracting")
+    cache, index = load_itf_index(FILENAME, workers=SCAN_WORKERS, progress=pbar.update)
+    pbar.close()
+
+    # The sky/time index only touches partitions overlapping the box
+    box = (SEARCH_RA_MIN, SEARCH_RA_MAX, SEARCH_DEC_MIN, SEARCH_DEC_MAX)
+    df = select(cache, rows=query_box(index, box), discard_brighter=DISCARD_BRIGHTER_THAN)
+    candidates = df[['id', 'mjd', 'ra', 'dec', 'mag']]
+
+    if SCAN_SECTORS:
+        scan_regions(cache, index, box)
         
     print(f"\nRaw Objects in Zone: {len(candidates)}")
     
@@ -133,46 +64,43 @@ def main():
 
     # --- MOTION ANALYSIS ---
     print("Calculating velocity vectors...")
-    df = pd.DataFrame(candidates)
+    df = candidates
     
-    # Filter for multiple observations
-    counts = df['id'].value_counts()
-    multi_obs_ids = counts[counts > 1].index
-    df_filtered = df[df['id'].isin(multi_obs_ids)]
+    # One vectorized pass over all tracklets (sorted runs, no per-ID masks)
+    motion = tracklet_motion(df)
+
+    # Least-squares rate over every detection (outliers clipped); same row order
+    fits, _ = fit_linear_motion(df)
+    motion['velocity'] = fits['rate'].to_numpy()
+    motion['pa'] = fits['pa'].to_numpy()
+    motion['rms'] = fits['rms'].to_numpy()
+    motion['n_used'] = fits['n_used'].to_numpy()
     
-    unique_ids = df_filtered['id'].unique()
-    print(f"Tracklets with motion: {len(unique_ids)}")
+    # Filter for multiple observations
+    motion = motion[motion['n_obs'] > 1]
+    print(f"Tracklets with motion: {len(motion)}")
     
-    final_suspects = []
+    # P9 FILTER: arc > 0.5 hr, 0.5 to 5.0 arcsec/hour
+    hits = motion[(motion['arc_hours'] > 0.5) &
+                  (motion['velocity'] > 0.5) & (motion['velocity'] < 5.0)]
     
-    for uid in tqdm(unique_ids, desc="Computing Orbits"):
-        group = df_filtered[df_filtered['id'] == uid].sort_values('mjd')
-        
-        t_start = group.iloc[0]
-        t_end = group.iloc[-1]
-        dt_hours = (t_end['mjd'] - t_start['mjd']) * 24.0
-        
-        if dt_hours > 0.5:
-            c1 = SkyCoord(ra=t_start['ra']*u.deg, dec=t_start['dec']*u.deg)
-            c2 = SkyCoord(ra=t_end['ra']*u.deg, dec=t_end['dec']*u.deg)
-            sep_arcsec = c1.separation(c2).arcsec
-            velocity = sep_arcsec / dt_hours
-            
-            # P9 FILTER: 0.5 to 5.0 arcsec/hour
-            if 0.5 < velocity < 5.0:
-                avg_mag = group['mag'].mean()
-                final_suspects.append({
-                    'ID': uid,
-                    'Vel': round(velocity, 3),
-                    'Mag': round(avg_mag, 1) if not np.isnan(avg_mag) else "N/A",
-                    'RA': round(t_start['ra'], 4),
-                    'Dec': round(t_start['dec'], 4),
-                    'Obs': len(group),
-                    'Arc(hr)': round(dt_hours, 1)
-                })
-
-    if final_suspects:
-        res_df = pd.DataFrame(final_suspects).sort_values('Vel')
+    # Series.round is the same NumPy rounding the per-row round() calls used
+    mean_mag = hits['mean_mag'].round(1)
+    final_suspects = pd.DataFrame({
+        'ID': hits['id'],
+        'Vel': hits['velocity'].round(3),
+        'Mag': mean_mag.astype(object).where(mean_mag.notna(), "N/A"),
+        'RA': hits['ra_first'].round(4),
+        'Dec': hits['dec_first'].round(4),
+        'Obs': hits['n_obs'],
+        'Used': hits['n_used'],
+        'PA': hits['pa'].round(1),
+        'RMS': hits['rms'].round(3),
+        'Arc(hr)': hits['arc_hours'].round(1)
+    })
+
+    if not final_suspects.empty:
+        res_df = final_suspects.sort_values('Vel')
         print("\n" + "="*60)
         print(f"!!! PLANET NINE CANDIDATES: {len(res_df)} !!!")
         print("="*60)
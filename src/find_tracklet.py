@@ -1,64 +1,58 @@
 import pandas as pd
-import numpy as np
+
+from tracklets import LINK_MAX_RATE, LINK_MIN_RATE, link_tracklets, night_of
 
 # --- CONFIGURATION ---
-TARGET_MJD = 58211.525916  # The timestamp of your discovery
-TARGET_SECTOR = "SECTOR_ALPHA"
-TARGET_RA = 54.881786
-TARGET_DEC = -10.032207
-TIME_WINDOW = 0.2  # Look for hits within +/- 4 hours (0.2 days)
+SURVIVORS_FILE = "results/P9_Grand_Tour_Survivors.csv"
+OUTPUT_FILE = "results/P9_Grand_Tour_Tracklets.csv"  # one row per detection, grouped by tracklet
+SHOW_TOP = 20
+
+# Each survivor is an nsc_dr2.object row, and its mjd (and position) is the
+# mean over that object's detections. A slow mover usually leaves a separate
+# single-detection object per exposure, where the mean is the exposure
+# itself. For multi-detection objects the linked epoch is only approximate,
+# so confirm candidates with their per-exposure nsc_dr2.meas epochs:
+# 'python p9_full_grid_survey.py --movers' (movers.py).
 
 print(f"--- TRACKLET HUNTER ---")
-print(f"Target: {TARGET_SECTOR} on MJD {TARGET_MJD}")
-print(f"Anchor Position: {TARGET_RA}, {TARGET_DEC}")
+print(f"Linking every survivor in '{SURVIVORS_FILE}' night by night ({LINK_MIN_RATE}-{LINK_MAX_RATE} \"/hr)")
 
 try:
-    df = pd.read_csv("P9_Grid_Survivors.csv")
-    
-    # Filter for the specific night and sector
-    night_hits = df[
-        (df['sector'] == TARGET_SECTOR) & 
-        (np.abs(df['mjd'] - TARGET_MJD) < TIME_WINDOW)
-    ].copy()
-    
-    print(f"\n[SEARCH RESULT] Found {len(night_hits)} detections on this night.")
-    
-    if len(night_hits) > 1:
-        print("\n>>> POSSIBLE TRACKLET FOUND! <<<")
-        print("These points form a motion vector:")
-        
-        # Sort by time
-        night_hits = night_hits.sort_values('mjd')
-        print(night_hits[['ra', 'dec', 'mag', 'mjd']].to_string(index=False))
-        
-        # Calculate Velocity
-        t1 = night_hits.iloc[0]
-        t2 = night_hits.iloc[-1]
-        
-        dt_hours = (t2['mjd'] - t1['mjd']) * 24.0
-        if dt_hours > 0:
-            # Calculate spherical distance (approximate)
-            dra = (t2['ra'] - t1['ra']) * np.cos(np.deg2rad(t1['dec']))
-            ddec = t2['dec'] - t1['dec']
-            dist_deg = np.sqrt(dra**2 + ddec**2)
-            dist_arcsec = dist_deg * 3600
-            
-            velocity = dist_arcsec / dt_hours
-            
-            print("\n" + "="*40)
-            print(f"CALCULATED VELOCITY: {velocity:.2f} arcsec/hour")
-            print("="*40)
-            
-            if velocity < 5.0:
-                print(">>> VERDICT: PLANET NINE CANDIDATE (Slow Mover)")
-            elif velocity > 20.0:
-                print(">>> VERDICT: MAIN BELT ASTEROID (Fast Mover)")
-            else:
-                print(">>> VERDICT: DISTANT OBJECT (Centaur/Kuiper Belt)")
+    df = pd.read_csv(SURVIVORS_FILE)
+
+    # All nights at once: pairs, triples and longer chains consistent with linear motion (tracklets.py)
+    tracklets, members = link_tracklets(df)
+
+    print(f"\n[SEARCH RESULT] {len(df)} survivors on {len(set(night_of(df['mjd'])))} nights -> "
+          f"{len(tracklets)} tracklets ({int((tracklets['n_points'] >= 3).sum())} with 3+ points).")
+
+    if len(tracklets):
+        print("\n>>> POSSIBLE TRACKLETS FOUND! <<<")
+        print(tracklets[['tracklet', 'night', 'n_points', 'rate', 'pa', 'rms', 'arc_hours', 'score']]
+              .head(SHOW_TOP).to_string(index=False, float_format=lambda v: f"{v:.2f}"))
+
+        # Best tracklet first, each tracklet's detections in time order
+        detections = tracklets.merge(members, on='tracklet').join(df, on='row')
+        detections.drop(columns=['row']).to_csv(OUTPUT_FILE, index=False)
+
+        best = tracklets.iloc[0]
+        print("\n" + "="*40)
+        print(f"BEST TRACKLET: {int(best['n_points'])} points, {best['arc_hours']:.1f} h arc")
+        print(f"CALCULATED VELOCITY: {best['rate']:.2f} arcsec/hour")
+        print(f"Position angle: {best['pa']:.1f} deg | RMS: {best['rms']:.2f}\"")
+        print("="*40)
+
+        if best['rate'] < 5.0:
+            print(">>> VERDICT: PLANET NINE CANDIDATE (Slow Mover)")
+        elif best['rate'] > 20.0:
+            print(">>> VERDICT: MAIN BELT ASTEROID (Fast Mover)")
+        else:
+            print(">>> VERDICT: DISTANT OBJECT (Centaur/Kuiper Belt)")
+        print(f"\n>>> Saved the detections of every tracklet to '{OUTPUT_FILE}'")
     else:
-        print("\nResult: Only 1 detection found.")
-        print("We have a 'Singleton'. We cannot calculate speed without a second point.")
-        print("This remains an Unidentified Transient, but orbit is indeterminate.")
+        print("\nResult: No survivor has a partner on its night.")
+        print("They remain 'Singletons'. We cannot calculate speed without a second point.")
+        print("These remain Unidentified Transients, but orbits are indeterminate.")
 
 except Exception as e:
-    print(f"Error: {e}")
\ No newline at end of file
+    print(f"Error: {e}")
@@ -1,12 +1,32 @@
+import sys
+import pandas as pd
+
+from itf_lookup import fetch_lines
+
 filename = 'itf.txt'
-target_id = '8o3c9x4'
-
-print(f"Searching for ID: {target_id}...")
-with open(filename, 'r') as f:
-    for line in f:
-        if line.startswith(target_id):
-            print("\nFOUND IT:")
-            print(line.strip())
-            # Extract Date roughly (cols 15-32)
-            print(f"Date String: {line[15:32]}")
-            break
\ No newline at end of file
+target_ids = ['8o3c9x4']
+
+# Optional: IDs on the command line, or a candidates CSV with an 'ID' column
+# e.g. python get_date.py results/P9_Bulletproof_Candidates.csv
+if len(sys.argv) > 1:
+    target_ids = []
+    for arg in sys.argv[1:]:
+        if arg.endswith('.csv'):
+            target_ids += pd.read_csv(arg)['ID'].astype(str).tolist()
+        else:
+            target_ids.append(arg)
+
+print(f"Searching for {len(target_ids)} ID(s): {', '.join(target_ids[:10])}...")
+found = fetch_lines(filename, target_ids)
+
+for target_id, group in found.groupby('id', sort=False):
+    line = group['line'].iloc[0]
+    print(f"\nFOUND IT: {target_id} ({len(group)} lines)")
+    for raw in group['line']:
+        print(raw.strip())
+    # Extract Date roughly (cols 15-32)
+    print(f"Date String: {line[15:32]}")
+
+missing = sorted(set(target_ids) - set(found['id']))
+if missing:
+    print(f"\nNot in ITF: {', '.join(missing)}")
@@ -0,0 +1,192 @@
+import email.utils
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- SHARED HTTP CLIENT ---
+# Every network call (NOIRLab TAP, Pan-STARRS, MPC, the ITF download) goes
+# through here:
+#   - one pooled requests.Session: keep-alive, no TLS handshake per call
+#   - a token bucket per host: a global requests-per-second ceiling that
+#     holds across threads, scripts' helper modules and retries
+#   - retries with exponential backoff (plus jitter) on connection errors,
+#     timeouts and 429/5xx, honouring the server's Retry-After header
+#   - per-host counters (requests, retries, failures, latency): report()
+#
+# request() returns the final Response (the caller still checks the status)
+# or raises the last requests exception once the retries are used up.
+
+# --- CONFIGURATION ---
+DEFAULT_TIMEOUT = 30
+MAX_RETRIES = 4
+BACKOFF_BASE = 1.0        # seconds, doubled per attempt
+BACKOFF_MAX = 60.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+POOL_SIZE = 32
+
+# host: (requests per second, burst); a key also covers its subdomains (www.)
+HOST_LIMITS = {
+    'datalab.noirlab.edu': (2.0, 4),
+    'catalogs.mast.stsci.edu': (10.0, 10),
+    'minorplanetcenter.net': (1.0, 2),
+    'ssp.imcce.fr': (1.0, 2),
+}
+DEFAULT_LIMIT = (5.0, 5)
+
+_lock = threading.Lock()
+_session = None
+_buckets = {}     # host -> [tokens, last refill time, rate, burst]
+_stats = {}       # host -> counters
+
+
+def session():
+    """The shared pooled Session (created on first use)."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            _session.mount('http://', adapter)
+            _session.mount('https://', adapter)
+        return _session
+
+
+def _host(url):
+    return urlsplit(url).hostname or ''
+
+
+def set_rate(url_or_host, rate, burst=None):
+    """Changes the requests-per-second ceiling of a host (rate None or 0: unlimited)."""
+    host = _host(url_or_host) if '://' in url_or_host else url_or_host
+    with _lock:
+        bucket = _bucket(host)
+        bucket[2] = rate
+        bucket[3] = burst if burst is not None else max(1.0, rate or 1.0)
+        bucket[0] = min(bucket[0], bucket[3])
+
+
+def _limit(host):
+    """HOST_LIMITS entry of a host or of the domain it belongs to."""
+    for name, limit in HOST_LIMITS.items():
+        if host == name or host.endswith('.' + name):
+            return limit
+    return DEFAULT_LIMIT
+
+
+def _bucket(host):
+    if host not in _buckets:
+        rate, burst = _limit(host)
+        _buckets[host] = [float(burst), time.monotonic(), rate, float(burst)]
+    return _buckets[host]
+
+
+def _acquire(host):
+    """Takes one token from the host's bucket, sleeping until it is available."""
+    with _lock:
+        bucket = _bucket(host)
+        tokens, last, rate, burst = bucket
+        if not rate:
+            return
+        now = time.monotonic()
+        tokens = min(burst, tokens + (now - last) * rate) - 1.0
+        bucket[0], bucket[1] = tokens, now
+    # A negative balance is this caller's place in the queue
+    if tokens < 0:
+        time.sleep(-tokens / rate)
+
+
+def _count(host, key, value=1):
+    with _lock:
+        counters = _stats.setdefault(host, {'requests': 0, 'retries': 0, 'failures': 0,
+                                            'latency': 0.0, 'max_latency': 0.0})
+        if key == 'latency':
+            counters['latency'] += value
+            counters['max_latency'] = max(counters['max_latency'], value)
+        else:
+            counters[key] += value
+
+
+def _retry_after(response):
+    """Seconds requested by a Retry-After header (delta or HTTP date), or None."""
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        when = email.utils.parsedate_to_datetime(value)
+        return max(0.0, when.timestamp() - time.time()) if when else None
+
+
+def _backoff(attempt):
+    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)
+    return delay * (0.5 + random.random() / 2)
+
+
+def request(method, url, timeout=DEFAULT_TIMEOUT, retries=MAX_RETRIES, **kwargs):
+    """
+    One HTTP request through the shared session, rate limit and retry policy.
+    Returns the Response; raises the last exception if every attempt failed
+    to connect or timed out.
+    """
+    host = _host(url)
+    s = session()
+    for attempt in range(retries + 1):
+        _acquire(host)
+        _count(host, 'requests')
+        start = time.monotonic()
+        response, error = None, None
+        try:
+            response = s.request(method, url, timeout=timeout, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = e
+        _count(host, 'latency', time.monotonic() - start)
+
+        if error is None and response.status_code not in RETRY_STATUSES:
+            return response
+        if attempt == retries:
+            break
+        _count(host, 'retries')
+        wait = _retry_after(response)
+        if response is not None:
+            # A streamed body is never read: give the connection back to the pool
+            response.close()
+        time.sleep(min(BACKOFF_MAX, wait) if wait is not None else _backoff(attempt))
+
+    _count(host, 'failures')
+    if error is not None:
+        raise error
+    return response
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
+
+
+def stats():
+    """Per-host counters: requests, retries, failures, mean and max latency (s)."""
+    with _lock:
+        out = {}
+        for host, c in _stats.items():
+            out[host] = dict(c)
+            out[host]['mean_latency'] = c['latency'] / c['requests'] if c['requests'] else 0.0
+        return out
+
+
+def report():
+    """Prints the per-host counters."""
+    rows = stats()
+    if not rows:
+        return
+    print(f"{'Host':<28} {'Requests':>8} {'Retries':>8} {'Failed':>7} {'Mean s':>7} {'Max s':>7}")
+    for host, c in rows.items():
+        print(f"{host:<28} {c['requests']:>8} {c['retries']:>8} {c['failures']:>7} "
+              f"{c['mean_latency']:>7.2f} {c['max_latency']:>7.2f}")
@@ -0,0 +1,380 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import skycells
+from itf_parser import (BLOCK_BYTES, COL_ID, open_itf, iter_blocks, line_bounds, line_matrix,
+                        scan_parts, scan_block, box_mask, mag_mask)
+from timeconv import calendar_to_mjd
+
+# --- PERSISTENT COLUMNAR CACHE OF PARSED ITF DETECTIONS ---
+# The first run parses itf.txt once and writes one .npy file per column
+# into 'itf.txt.cache/'. Later runs memory-map those arrays instead of
+# re-reading the text, so changing the search box costs a mask, not a scan.
+#
+# Layout:
+#   mjd.npy, ra.npy, dec.npy (float64), mag.npy (float32, NaN = blank)
+#   id_code.npy (int32)  -> index into ids.npy (sorted unique tracklet IDs)
+#   offset.npy (int64), length.npy (int16) -> raw line location in itf.txt
+#   chunks.npy           -> content-defined chunks of itf.txt (offset, length, digest)
+#   meta.json            -> source size / mtime / sha256, written last
+#
+# The cache is refreshed when the source size changes. If only the mtime
+# changed, the content hash decides (a 'touch' does not force a re-parse).
+# A refresh only re-parses the chunks whose digest is new (see update_cache).
+
+CACHE_VERSION = 2
+CACHE_SUFFIX = '.cache'
+HASH_CHUNK = 16 * 1024 * 1024
+
+COLUMNS = {
+    'mjd': np.float64,
+    'ra': np.float64,
+    'dec': np.float64,
+    'mag': np.float32,
+    'id_code': np.int32,
+    'offset': np.int64,
+    'length': np.int16,
+}
+
+
+def cache_dir_for(path):
+    return path + CACHE_SUFFIX
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _source_stat(path):
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+
+# --- CONTENT-DEFINED CHUNKS ---
+# A line opens a new chunk when it starts a new tracklet and a hash of its
+# tracklet ID hits 1 in CHUNK_TRACKLETS. Cut points depend only on the text
+# around them, so when the MPC appends, drops or edits tracklets only the
+# chunks touching the edit get a new digest; all other chunks are found
+# again (at shifted offsets) and their parsed rows are reused.
+
+CHUNK_TRACKLETS = 256              # mean chunk ~256 tracklets (~100 KB)
+CHUNK_DTYPE = np.dtype([('offset', np.int64), ('length', np.int64), ('digest', 'S16')])
+_ID_WIDTH = COL_ID[1] - COL_ID[0]
+_ID_WEIGHTS = np.array([pow(0x100000001B3, k, 1 << 64) for k in range(_ID_WIDTH)], dtype=np.uint64)
+HASH_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+
+def _cut_lines(block, starts, prev_id):
+    """Mask of the lines in 'block' that open a chunk; also returns the block's last ID."""
+    ends = np.minimum(starts + _ID_WIDTH, len(block))
+    ids = line_matrix(block, starts, ends, width=_ID_WIDTH)
+    with np.errstate(over='ignore'):
+        h = (ids.astype(np.uint64) @ _ID_WEIGHTS) * HASH_MIX
+    hit = (h >> np.uint64(40)) % np.uint64(CHUNK_TRACKLETS) == 0
+    prev = np.concatenate((prev_id[None, :], ids[:-1]))
+    new_id = np.any(ids != prev, axis=1)
+    return hit & new_id, ids[-1]
+
+
+def chunk_file(path, block_bytes=BLOCK_BYTES):
+    """
+    One pass over 'path': returns (sha256 hex, chunk table) where the table is a
+    CHUNK_DTYPE array of content-defined, newline-aligned byte ranges.
+    """
+    data = open_itf(path)
+    sha = hashlib.sha256()
+    chunks = []
+    chunk_hash = hashlib.blake2b(digest_size=16)
+    chunk_start = 0
+    prev_id = np.full(_ID_WIDTH, 0, dtype=np.uint8)
+
+    for start, stop in iter_blocks(data, block_bytes):
+        block = data[start:stop]
+        sha.update(block)
+        starts, _ = line_bounds(block)
+        if not len(starts):
+            continue
+        cut, prev_id = _cut_lines(block, starts, prev_id)
+        pos = 0
+        for c in starts[cut]:
+            if start + c == 0:
+                continue
+            chunk_hash.update(block[pos:c])
+            chunks.append((chunk_start, start + c - chunk_start, chunk_hash.digest()))
+            chunk_hash = hashlib.blake2b(digest_size=16)
+            chunk_start, pos = start + c, c
+        chunk_hash.update(block[pos:])
+
+    if len(data) > chunk_start:
+        chunks.append((chunk_start, len(data) - chunk_start, chunk_hash.digest()))
+    return sha.hexdigest(), np.array(chunks, dtype=CHUNK_DTYPE)
+
+
+def read_meta(cache_dir):
+    try:
+        with open(os.path.join(cache_dir, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(cache_dir, meta):
+    tmp = os.path.join(cache_dir, 'meta.json.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(tmp, os.path.join(cache_dir, 'meta.json'))
+
+
+def is_fresh(path, cache_dir=None, verify_hash=False):
+    """True if the cache describes the current contents of 'path'."""
+    cache_dir = cache_dir or cache_dir_for(path)
+    meta = read_meta(cache_dir)
+    if not meta or meta.get('version') != CACHE_VERSION:
+        return False
+
+    stat = _source_stat(path)
+    if stat['size'] != meta['size']:
+        return False
+    if stat['mtime_ns'] == meta['mtime_ns'] and not verify_hash:
+        return True
+
+    # Same size but touched (or explicitly asked): let the content decide
+    if file_sha256(path) != meta['sha256']:
+        return False
+    if stat['mtime_ns'] != meta['mtime_ns']:
+        meta['mtime_ns'] = stat['mtime_ns']
+        _write_meta(cache_dir, meta)
+    return True
+
+
+def _parts_columns(parts):
+    """Concatenates scan_block outputs (no cuts) into (id bytes, cache column arrays)."""
+    if parts:
+        cols = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+    else:
+        cols = scan_block(np.zeros(0, dtype=np.uint8))
+    return cols['id'], {
+        'mjd': calendar_to_mjd(cols['year'], cols['month'], cols['day']),
+        'ra': cols['ra'],
+        'dec': cols['dec'],
+        'mag': cols['mag'],
+        'offset': cols['offset'],
+        'length': cols['length'],
+    }
+
+
+def parse_all(path, block_bytes=BLOCK_BYTES, workers=1, progress=None):
+    """Parses every valid detection in an ITF file (no cuts) into column arrays."""
+    parts = scan_parts(path, block_bytes=block_bytes, workers=workers, progress=progress)
+    row_ids, columns = _parts_columns(parts)
+    ids, columns['id_code'] = np.unique(row_ids, return_inverse=True)
+    return ids, columns
+
+
+def save_array(path, arr):
+    """np.save via a temp file + rename, so readers that memory-mapped the old file keep it."""
+    with open(path + '.tmp', 'wb') as f:
+        np.save(f, arr)
+    os.replace(path + '.tmp', path)
+
+
+def write_cache(cache_dir, ids, columns, meta, chunks):
+    """Writes column arrays + meta.json. meta.json goes last so a crash never leaves a 'fresh' cache."""
+    os.makedirs(cache_dir, exist_ok=True)
+    try:
+        os.remove(os.path.join(cache_dir, 'meta.json'))
+    except FileNotFoundError:
+        pass
+    save_array(os.path.join(cache_dir, 'ids.npy'), np.asarray(ids, dtype='S12'))
+    save_array(os.path.join(cache_dir, 'chunks.npy'), np.asarray(chunks, dtype=CHUNK_DTYPE))
+    for name, dtype in COLUMNS.items():
+        save_array(os.path.join(cache_dir, f'{name}.npy'), np.asarray(columns[name], dtype=dtype))
+    meta = dict(meta, version=CACHE_VERSION, rows=int(len(columns['mjd'])), n_ids=int(len(ids)))
+    _write_meta(cache_dir, meta)
+
+
+def build_cache(path, cache_dir=None, block_bytes=BLOCK_BYTES, workers=1, progress=None):
+    cache_dir = cache_dir or cache_dir_for(path)
+    stat = _source_stat(path)
+    ids, columns = parse_all(path, block_bytes, workers, progress)
+    sha, chunks = chunk_file(path, block_bytes)
+    write_cache(cache_dir, ids, columns, dict(stat, sha256=sha), chunks)
+    return cache_dir
+
+
+def update_cache(path, cache_dir=None, block_bytes=BLOCK_BYTES, progress=None):
+    """
+    Brings an existing cache up to date with a new version of 'path'.
+    Chunks whose digest is already cached keep their parsed rows (offsets
+    shifted); only new/changed chunks are parsed. Returns a summary dict.
+    """
+    cache_dir = cache_dir or cache_dir_for(path)
+    old = open_cache(cache_dir)
+    old_chunks = np.load(os.path.join(cache_dir, 'chunks.npy'))
+    stat = _source_stat(path)
+    sha, chunks = chunk_file(path, block_bytes)
+
+    # Pair every new chunk with an unused old chunk of the same content
+    free = {}
+    for j, digest in enumerate(old_chunks['digest']):
+        free.setdefault(digest, []).append(j)
+    match = np.array([free[d].pop(0) if free.get(d) else -1 for d in chunks['digest']], dtype=np.int64)
+    kept = match >= 0
+
+    # Reused rows: cached rows inside matched chunks, moved to the new chunk position
+    old_offset = np.asarray(old['offset'])
+    src = old_chunks[match[kept]]
+    lo = np.searchsorted(old_offset, src['offset'])
+    hi = np.searchsorted(old_offset, src['offset'] + src['length'])
+    rows = skycells.slices(lo, hi)
+    shift = np.repeat(chunks['offset'][kept] - src['offset'], hi - lo)
+
+    # Parsed rows: only the new/changed chunks
+    data = open_itf(path)
+    parts = []
+    for start, length in zip(chunks['offset'][~kept], chunks['length'][~kept]):
+        parts.append(scan_block(data[start:start + length], base=start))
+        if progress:
+            progress(length)
+    if progress:
+        progress(int(chunks['length'][kept].sum()))
+    new_row_ids, new_cols = _parts_columns(parts)
+
+    # Merge: the new ID dictionary only has to absorb the (few) parsed IDs
+    all_ids = np.union1d(np.asarray(old['ids']), new_row_ids)
+    id_code = np.concatenate((np.searchsorted(all_ids, old['ids'])[old['id_code'][rows]],
+                              np.searchsorted(all_ids, new_row_ids)))
+    # Tracklets that lost all their rows (e.g. identified and removed) leave the dictionary
+    present = np.bincount(id_code, minlength=len(all_ids)) > 0
+    ids = all_ids[present]
+    id_code = (np.cumsum(present) - 1)[id_code]
+    columns = {name: np.concatenate((np.asarray(old[name])[rows], new_cols[name]))
+               for name in ('mjd', 'ra', 'dec', 'mag', 'length')}
+    columns['offset'] = np.concatenate((old_offset[rows] + shift, new_cols['offset']))
+    columns['id_code'] = id_code
+    order = np.argsort(columns['offset'], kind='stable')
+    columns = {name: col[order] for name, col in columns.items()}
+
+    summary = {
+        'chunks_kept': int(kept.sum()),
+        'chunks_parsed': int((~kept).sum()),
+        'bytes_parsed': int(chunks['length'][~kept].sum()),
+        'rows_kept': int(len(rows)),
+        'rows_parsed': int(len(new_row_ids)),
+        'rows_dropped': int(len(old_offset) - len(rows)),
+    }
+    del old
+    write_cache(cache_dir, ids, columns, dict(stat, sha256=sha), chunks)
+    return summary
+
+
+def open_cache(cache_dir):
+    """Memory-maps every cached column. Returns a dict of arrays (plus 'ids')."""
+    cache = {name: np.load(os.path.join(cache_dir, f'{name}.npy'), mmap_mode='r')
+             for name in list(COLUMNS) + ['ids']}
+    cache['meta'] = dict(read_meta(cache_dir), dir=cache_dir)
+    return cache
+
+
+def load_detections(path, cache_dir=None, verify_hash=False, workers=1, progress=None):
+    """
+    Returns the memory-mapped detection columns for 'path', building the
+    cache first if it is missing, or updating only the changed chunks if stale.
+    workers > 1 parses the text in a process pool when a rebuild is needed.
+    """
+    cache_dir = cache_dir or cache_dir_for(path)
+    if is_fresh(path, cache_dir, verify_hash):
+        if progress:
+            progress(os.path.getsize(path))
+    elif (read_meta(cache_dir) or {}).get('version') == CACHE_VERSION:
+        print(f"[*] {path} changed; updating detection cache '{cache_dir}'...")
+        summary = update_cache(path, cache_dir, progress=progress)
+        print(f"[*] Reused {summary['rows_kept']} rows ({summary['chunks_kept']} chunks), "
+              f"parsed {summary['bytes_parsed']} bytes -> {summary['rows_parsed']} rows, "
+              f"dropped {summary['rows_dropped']} rows.")
+    else:
+        print(f"[*] Building detection cache '{cache_dir}' (one-time parse)...")
+        build_cache(path, cache_dir, workers=workers, progress=progress)
+    return open_cache(cache_dir)
+
+
+def select(cache, box=None, discard_brighter=None, min_mag=None, rows=None):
+    """
+    Applies box/mag cuts to cached columns and returns a DataFrame
+    (id, mjd, ra, dec, mag, offset, length). 'rows' pre-restricts to row indices.
+    """
+    ra, dec, mag = cache['ra'], cache['dec'], cache['mag']
+    if rows is not None:
+        ra, dec, mag = ra[rows], dec[rows], mag[rows]
+
+    keep = mag_mask(mag, discard_brighter, min_mag)
+    if box is not None:
+        keep &= box_mask(ra, dec, box)
+    idx = np.flatnonzero(keep)
+    if rows is not None:
+        idx = np.asarray(rows)[idx]
+
+    return pd.DataFrame({
+        'id': cache['ids'][cache['id_code'][idx]].astype('U'),
+        'mjd': cache['mjd'][idx],
+        'ra': cache['ra'][idx],
+        'dec': cache['dec'][idx],
+        # float32 on disk; MPC mags have at most 2 decimals, so round back exactly
+        'mag': np.round(cache['mag'][idx].astype(np.float64), 2),
+        'offset': cache['offset'][idx],
+        'length': cache['length'][idx],
+    })
+
+
+# --- DERIVED ARRAYS (indexes built on top of the cache) ---
+# Stored as <name>_<key>.npy + <name>_meta.json in the cache directory and
+# tied to the source sha256, so they go stale together with the cache.
+# Sets that can be refreshed incrementally ask for the stale copy explicitly.
+
+def _derived_meta_path(cache_dir, name):
+    return os.path.join(cache_dir, f'{name}_meta.json')
+
+
+def load_derived(cache, name, params=None, stale_ok=False):
+    """
+    Memory-maps a derived array set, or returns None if missing/stale.
+    stale_ok=True also returns a set built for an earlier version of the source.
+    """
+    cache_dir = cache['meta']['dir']
+    try:
+        with open(_derived_meta_path(cache_dir, name)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('params') != (params or {}):
+        return None
+    if meta.get('sha256') != cache['meta']['sha256'] and not stale_ok:
+        return None
+    arrays = {key: np.load(os.path.join(cache_dir, f'{name}_{key}.npy'), mmap_mode='r')
+              for key in meta['arrays']}
+    return arrays, meta.get('info', {})
+
+
+def save_derived(cache, name, arrays, params=None, info=None):
+    """Writes a derived array set; the meta file goes last (commit marker)."""
+    cache_dir = cache['meta']['dir']
+    path = _derived_meta_path(cache_dir, name)
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    for key, arr in arrays.items():
+        save_array(os.path.join(cache_dir, f'{name}_{key}.npy'), arr)
+    meta = {'sha256': cache['meta']['sha256'], 'params': params or {},
+            'arrays': list(arrays), 'info': info or {}}
+    with open(path + '.tmp', 'w') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(path + '.tmp', path)
@@ -0,0 +1,127 @@
+import numpy as np
+
+import skycells
+from itf_cache import load_detections, load_derived, save_derived
+from itf_parser import box_mask
+from regions import all_region_cells, assign_regions
+
+# --- SPATIO-TEMPORAL INDEX (HEALPIX CELL x MJD BUCKET) ---
+# Detections are ordered by partition key = cell * n_buckets + bucket.
+# Within one sky cell the MJD buckets are consecutive keys, so a query
+# "cone/box between MJD a and b" costs two binary searches per candidate
+# cell and only touches the rows stored in those partitions.
+#
+# The ITF index lives inside the detection cache directory (index_*.npy)
+# and is rebuilt whenever the cache itself is rebuilt.
+# build_index() also works on any ra/dec/mjd arrays (e.g. a survivors CSV).
+
+INDEX_NSIDE = skycells.DEFAULT_NSIDE
+BUCKET_DAYS = 30.0
+
+
+def build_index(ra, dec, mjd, nside=INDEX_NSIDE, bucket_days=BUCKET_DAYS):
+    """Builds an in-memory index over coordinate/epoch arrays. Returns a dict."""
+    ra = np.asarray(ra, dtype=np.float64)
+    dec = np.asarray(dec, dtype=np.float64)
+    mjd = np.asarray(mjd, dtype=np.float64)
+
+    mjd0 = float(np.floor(mjd.min())) if len(mjd) else 0.0
+    bucket = np.floor((mjd - mjd0) / bucket_days).astype(np.int64) if len(mjd) else np.zeros(0, np.int64)
+    n_buckets = int(bucket.max()) + 1 if len(bucket) else 1
+
+    key = skycells.ang2pix(nside, ra, dec) * n_buckets + bucket
+    order = np.argsort(key, kind='stable')
+    sorted_key = key[order]
+
+    return {
+        'ra': ra, 'dec': dec, 'mjd': mjd,
+        'order': order,
+        'key': sorted_key,
+        'nside': nside, 'bucket_days': bucket_days,
+        'mjd0': mjd0, 'n_buckets': n_buckets,
+    }
+
+
+def _bucket_range(index, mjd_min, mjd_max):
+    lo = 0 if mjd_min is None else int(np.floor((mjd_min - index['mjd0']) / index['bucket_days']))
+    hi = index['n_buckets'] - 1 if mjd_max is None else int(np.floor((mjd_max - index['mjd0']) / index['bucket_days']))
+    return max(lo, 0), min(hi, index['n_buckets'] - 1)
+
+
+def _candidate_rows(index, cells, mjd_min, mjd_max):
+    """Row numbers stored in the partitions of 'cells' x overlapping MJD buckets."""
+    b_lo, b_hi = _bucket_range(index, mjd_min, mjd_max)
+    if b_lo > b_hi or len(cells) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    cells = np.asarray(cells, dtype=np.int64)
+    starts = np.searchsorted(index['key'], cells * index['n_buckets'] + b_lo, side='left')
+    stops = np.searchsorted(index['key'], cells * index['n_buckets'] + b_hi, side='right')
+    nonempty = stops > starts
+    starts, stops = starts[nonempty], stops[nonempty]
+    if len(starts) == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    return np.asarray(index['order'][skycells.slices(starts, stops)])
+
+
+def _time_mask(mjd, mjd_min, mjd_max):
+    keep = np.ones(len(mjd), dtype=bool)
+    if mjd_min is not None:
+        keep &= mjd >= mjd_min
+    if mjd_max is not None:
+        keep &= mjd <= mjd_max
+    return keep
+
+
+def query_cone(index, ra, dec, radius, mjd_min=None, mjd_max=None):
+    """Sorted row indices of detections within 'radius' deg of (ra, dec) and the MJD window."""
+    rows = _candidate_rows(index, skycells.cone_cells(index['nside'], ra, dec, radius), mjd_min, mjd_max)
+    r_ra, r_dec, r_mjd = index['ra'][rows], index['dec'][rows], index['mjd'][rows]
+    keep = (skycells.angsep(ra, dec, r_ra, r_dec) <= radius) & _time_mask(r_mjd, mjd_min, mjd_max)
+    return np.sort(rows[keep])
+
+
+def query_box(index, box, mjd_min=None, mjd_max=None):
+    """Sorted row indices of detections in an (ra_min, ra_max, dec_min, dec_max) box and MJD window."""
+    rows = _candidate_rows(index, skycells.box_cells(index['nside'], box), mjd_min, mjd_max)
+    r_ra, r_dec, r_mjd = index['ra'][rows], index['dec'][rows], index['mjd'][rows]
+    keep = box_mask(r_ra, r_dec, box) & _time_mask(r_mjd, mjd_min, mjd_max)
+    return np.sort(rows[keep])
+
+
+def query_regions(index, regions, mjd_min=None, mjd_max=None):
+    """
+    Sorted row indices of detections inside at least one of 'regions' (see regions.py)
+    and the MJD window: one lookup over the union of the regions' cells.
+    """
+    cells, _ = all_region_cells(regions, index['nside'])
+    rows = _candidate_rows(index, np.unique(cells), mjd_min, mjd_max)
+    rows = rows[_time_mask(index['mjd'][rows], mjd_min, mjd_max)]
+    det, _ = assign_regions(index['ra'][rows], index['dec'][rows], regions, index['nside'])
+    return np.sort(rows[np.unique(det)])
+
+
+# --- PERSISTENT ITF INDEX ---
+
+def load_itf_index(path, cache_dir=None, workers=1, progress=None):
+    """
+    Loads (building if needed) the detection cache and its spatio-temporal index.
+    Returns (cache, index); query results are row numbers into the cache.
+    """
+    cache = load_detections(path, cache_dir, workers=workers, progress=progress)
+    params = {'nside': INDEX_NSIDE, 'bucket_days': BUCKET_DAYS}
+
+    stored = load_derived(cache, 'index', params)
+    if stored:
+        arrays, info = stored
+        index = dict(arrays, **params, **info)
+    else:
+        print("[*] Building sky/time index over cached detections...")
+        index = build_index(cache['ra'], cache['dec'], cache['mjd'])
+        info = {'mjd0': index['mjd0'], 'n_buckets': index['n_buckets']}
+        save_derived(cache, 'index', {'order': index['order'], 'key': index['key']}, params, info)
+
+    # Exact filtering reads the memory-mapped cache columns directly
+    index['ra'], index['dec'], index['mjd'] = cache['ra'], cache['dec'], cache['mjd']
+    return cache, index
@@ -0,0 +1,130 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+from itf_cache import HASH_MIX, load_detections, load_derived, save_derived
+from itf_lookup import load_id_index, rows_for_codes
+from tracklets import tracklet_motion, fit_linear_motion
+
+# --- INCREMENTAL ITF INGEST ---
+# The MPC republishes the ITF regularly and most of it does not change.
+# Run this after downloading a new itf.txt:
+#   1. the detection cache is updated chunk by chunk (itf_cache.update_cache):
+#      an appended tail, removed (identified) tracklets and edited blocks only
+#      re-parse the chunks they touch;
+#   2. the per-tracklet motion table (motion_*.npy in the cache directory)
+#      is refreshed: every tracklet carries a digest of its detections, and
+#      only tracklets whose digest is new or different are fitted again.
+#
+#   python itf_ingest.py [itf.txt]
+
+FILENAME = 'itf.txt'
+SCAN_WORKERS = None   # processes for a full (first) parse; updates only parse the delta
+
+MOTION_VERSION = 1
+MOTION_COLUMNS = [
+    'n_obs', 'mjd_first', 'mjd_last', 'arc_hours',
+    'ra_first', 'dec_first', 'ra_last', 'dec_last',
+    'sep_arcsec', 'velocity', 'mean_mag',
+    'rate', 'pa', 'rms', 'n_used',
+]
+
+
+def tracklet_digests(cache, id_index):
+    """64-bit digest of every tracklet's parsed detections (order-independent), aligned with cache['ids']."""
+    fields = [np.asarray(cache[name]).view(np.uint64) for name in ('mjd', 'ra', 'dec')]
+    fields.append(np.asarray(cache['mag']).view(np.uint32).astype(np.uint64))
+
+    h = np.zeros(len(fields[0]), dtype=np.uint64)
+    for k, bits in enumerate(fields):
+        h ^= (bits + np.uint64(k + 1)) * HASH_MIX
+        h ^= h >> np.uint64(29)
+        h *= HASH_MIX
+    if len(h) == 0:
+        return np.zeros(len(cache['ids']), dtype=np.uint64)
+    return np.add.reduceat(h[np.asarray(id_index['order'])], np.asarray(id_index['start'][:-1]))
+
+
+def compute_motion(cache, id_index, codes):
+    """Motion columns (MOTION_COLUMNS) for the tracklets with the given ID codes, in that order."""
+    rows = rows_for_codes(id_index, np.asarray(codes, dtype=np.int64))
+    df = pd.DataFrame({
+        'id': np.asarray(cache['id_code'][rows]),
+        'mjd': cache['mjd'][rows],
+        'ra': cache['ra'][rows],
+        'dec': cache['dec'][rows],
+        'mag': np.round(cache['mag'][rows].astype(np.float64), 2),
+    })
+    motion = tracklet_motion(df)
+    fits, _ = fit_linear_motion(df)
+    for col in ('rate', 'pa', 'rms', 'n_used'):
+        motion[col] = fits[col].to_numpy()
+    return {col: motion[col].to_numpy() for col in MOTION_COLUMNS}
+
+
+def load_motion(path, cache=None, workers=1, progress=None):
+    """
+    Per-tracklet motion for every tracklet in the ITF (one row per ID).
+    Reuses the stored table and only re-fits new or changed tracklets.
+    """
+    cache = cache if cache is not None else load_detections(path, workers=workers, progress=progress)
+    params = {'version': MOTION_VERSION}
+
+    stored = load_derived(cache, 'motion', params)
+    if stored:
+        arrays = stored[0]
+    else:
+        arrays = _refresh_motion(path, cache, params)
+
+    motion = pd.DataFrame({col: arrays[col] for col in MOTION_COLUMNS})
+    motion.insert(0, 'id', np.asarray(arrays['id']).astype('U'))
+    return motion
+
+
+def _refresh_motion(path, cache, params):
+    cache, id_index = load_id_index(path, cache)
+    ids = np.asarray(cache['ids'])
+    digest = tracklet_digests(cache, id_index)
+
+    reuse = np.zeros(len(ids), dtype=bool)
+    pos = np.zeros(len(ids), dtype=np.int64)
+    removed = 0
+    old = load_derived(cache, 'motion', params, stale_ok=True)
+    if old and len(old[0]['id']):
+        old = old[0]
+        old_ids = np.asarray(old['id'])
+        pos = np.minimum(np.searchsorted(old_ids, ids), len(old_ids) - 1)
+        found = old_ids[pos] == ids
+        reuse = found & (np.asarray(old['digest'])[pos] == digest)
+        removed = len(old_ids) - int(found.sum())
+    else:
+        old = None
+
+    todo = np.flatnonzero(~reuse)
+    print(f"[*] Motion table: {int(reuse.sum())} tracklets unchanged, "
+          f"{len(todo)} new/changed to fit, {removed} removed.")
+    fresh = compute_motion(cache, id_index, todo)
+
+    arrays = {'id': ids, 'digest': digest}
+    for col in MOTION_COLUMNS:
+        out = np.empty(len(ids), dtype=fresh[col].dtype)
+        if old is not None:
+            out[reuse] = np.asarray(old[col])[pos[reuse]]
+        out[todo] = fresh[col]
+        arrays[col] = out
+
+    save_derived(cache, 'motion', arrays, params, {'fitted': len(todo), 'removed': removed})
+    return arrays
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else FILENAME
+    print(f"--- ITF INGEST: {path} ---")
+    cache = load_detections(path, workers=SCAN_WORKERS)
+    motion = load_motion(path, cache)
+    print(f"[*] Up to date: {len(cache['mjd'])} detections, {len(motion)} tracklets.")
+
+
+if __name__ == "__main__":
+    main()
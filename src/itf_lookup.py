@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+import skycells
+from itf_cache import load_detections, load_derived, save_derived
+from itf_parser import open_itf
+
+# --- TRACKLET ID -> RAW LINE INDEX ---
+# Built in one pass over the cached id_code column and stored next to the
+# cache: rows are grouped by ID (CSR layout), so fetching every raw
+# 80-column line of a tracklet is one binary search in the sorted ID list
+# plus one seek per line. Batch lookups resolve a whole candidate list at once.
+#
+#   ids_order.npy  row numbers ordered by ID
+#   ids_start.npy  ids_order[start[k]:start[k+1]] are the rows of ids[k]
+
+
+def build_id_index(id_code, n_ids):
+    order = np.argsort(id_code, kind='stable')
+    start = np.searchsorted(np.asarray(id_code)[order], np.arange(n_ids + 1))
+    return {'order': order, 'start': start}
+
+
+def load_id_index(path, cache=None):
+    """Returns (cache, id_index), building the index on first use."""
+    cache = cache if cache is not None else load_detections(path)
+    stored = load_derived(cache, 'ids')
+    if stored:
+        return cache, stored[0]
+    index = build_id_index(cache['id_code'], len(cache['ids']))
+    save_derived(cache, 'ids', index)
+    return cache, index
+
+
+def id_codes(cache, tracklet_ids):
+    """Dictionary codes for a list of IDs (-1 where the ID is not in the ITF)."""
+    ids = cache['ids']
+    keys = np.array([str(t).strip().encode('ascii') for t in tracklet_ids], dtype=ids.dtype)
+    if len(ids) == 0:
+        return np.full(len(keys), -1)
+    pos = np.minimum(np.searchsorted(ids, keys), len(ids) - 1)
+    return np.where(ids[pos] == keys, pos, -1)
+
+
+def rows_for_ids(cache, id_index, tracklet_ids):
+    """Cache row numbers of every detection of the given IDs, grouped by ID in input order."""
+    codes = id_codes(cache, tracklet_ids)
+    return rows_for_codes(id_index, codes[codes >= 0])
+
+
+def rows_for_codes(id_index, codes):
+    """Cache row numbers of every detection of the given ID codes, grouped by code."""
+    starts = np.asarray(id_index['start'][codes])
+    stops = np.asarray(id_index['start'][codes + 1])
+    if len(codes) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.asarray(id_index['order'][skycells.slices(starts, stops)])
+
+
+def fetch_lines(path, tracklet_ids, cache=None):
+    """
+    Raw ITF lines for a batch of tracklet IDs.
+    Returns a DataFrame (id, mjd, line) in input-ID order, then file order.
+    """
+    cache, id_index = load_id_index(path, cache)
+    rows = rows_for_ids(cache, id_index, tracklet_ids)
+    data = open_itf(path)
+    offsets, lengths = cache['offset'][rows], cache['length'][rows]
+    return pd.DataFrame({
+        'id': cache['ids'][cache['id_code'][rows]].astype('U'),
+        'mjd': cache['mjd'][rows],
+        'line': [bytes(data[o:o + n]).decode('ascii', 'replace') for o, n in zip(offsets, lengths)],
+    })
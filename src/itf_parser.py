@@ -0,0 +1,278 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from timeconv import calendar_to_mjd
+
+# --- VECTORIZED MPC 80-COLUMN PARSER ---
+# Shared by find_p9_local.py, find_p9.py and debug_p9.py.
+# The ITF is memory-mapped and decoded one block of lines at a time:
+# every column of every line in the block is sliced out as a 2-D byte
+# array and converted to numbers with NumPy, so the interpreter only
+# runs once per block instead of once per line.
+
+BLOCK_BYTES = 8 * 1024 * 1024    # ~100k lines per block
+LINE_WIDTH = 80
+MIN_LINE_LENGTH = 60             # Shorter lines are headers / junk
+
+# Fixed-width column layout (0-based, end-exclusive)
+COL_ID = (0, 12)
+COL_YEAR = (15, 19)
+COL_MONTH = (20, 22)
+COL_DAY = (23, 32)
+COL_RA_H = (32, 34)
+COL_RA_M = (35, 37)
+COL_RA_S = (38, 44)
+COL_DEC_SIGN = (44, 45)
+COL_DEC_D = (45, 47)
+COL_DEC_M = (48, 50)
+COL_DEC_S = (51, 56)
+COL_MAG = (65, 70)
+
+NEWLINE = ord('\n')
+CR = ord('\r')
+SPACE = ord(' ')
+DOT = ord('.')
+MINUS = ord('-')
+ZERO = ord('0')
+
+
+def open_itf(path):
+    """Memory-maps an ITF file as a flat uint8 array (empty array if the file is empty)."""
+    try:
+        return np.memmap(path, dtype=np.uint8, mode='r')
+    except ValueError:
+        # np.memmap refuses zero-length files
+        return np.zeros(0, dtype=np.uint8)
+
+
+def iter_blocks(data, block_bytes=BLOCK_BYTES, start=0, stop=None):
+    """Yields (start, stop) byte ranges of ~block_bytes that end on a newline."""
+    stop = len(data) if stop is None else stop
+    while start < stop:
+        end = min(start + block_bytes, stop)
+        # Extend to the end of the current line (look ahead in small windows)
+        window = 256
+        while end < stop:
+            nl = np.flatnonzero(data[end:min(end + window, stop)] == NEWLINE)
+            if len(nl):
+                end += nl[0] + 1
+                break
+            end = min(end + window, stop)
+            window *= 2
+        yield start, end
+        start = end
+
+
+def line_bounds(block):
+    """Returns (starts, ends) of every line in a byte block, excluding CR/LF."""
+    nl = np.flatnonzero(block == NEWLINE).astype(np.int64)
+    ends = nl
+    if len(block) and block[-1] != NEWLINE:
+        ends = np.append(ends, len(block))
+    starts = np.concatenate(([0], nl + 1))[:len(ends)]
+    # Strip a trailing carriage return (Windows line endings)
+    has_cr = (ends > starts) & (block[np.maximum(ends - 1, 0)] == CR)
+    return starts, ends - has_cr
+
+
+def line_matrix(block, starts, ends, width=LINE_WIDTH):
+    """Gathers lines into an (N, width) byte matrix, right-padded with spaces."""
+    if len(starts) == 0:
+        return np.zeros((0, width), dtype=np.uint8)
+    # Row gather from a sliding-window view: one contiguous copy per line
+    padded = np.concatenate((block, np.full(width, SPACE, dtype=np.uint8)))
+    chars = np.lib.stride_tricks.sliding_window_view(padded, width)[starts]
+    chars[np.arange(width)[None, :] >= (ends - starts)[:, None]] = SPACE
+    return chars
+
+
+def parse_fixed_float(chars):
+    """
+    Decodes an (N, W) block of ASCII columns into floats.
+    Spaces are ignored, so '21.2 ', ' 5.3' and '13' all work.
+    Fields without any digit, or with anything other than digits, spaces
+    and one decimal point, become NaN (where float() used to raise).
+    """
+    n, width = chars.shape
+    value = np.zeros(n, dtype=np.int64)
+    n_digits = np.zeros(n, dtype=np.int8)
+    n_frac = np.zeros(n, dtype=np.int8)
+    n_dots = np.zeros(n, dtype=np.int8)
+    clean = np.ones(n, dtype=bool)
+
+    # Horner's rule column by column: W vector ops instead of N*W scalar ones
+    for j in range(width):
+        c = chars[:, j]
+        d = c.astype(np.int16) - ZERO
+        is_digit = (d >= 0) & (d <= 9)
+        is_dot = c == DOT
+        value = np.where(is_digit, value * 10 + d, value)
+        n_digits += is_digit
+        n_frac += is_digit & (n_dots > 0)
+        n_dots += is_dot
+        clean &= is_digit | is_dot | (c == SPACE)
+
+    ok = clean & (n_dots <= 1) & (n_digits > 0)
+    return np.where(ok, value / np.power(10.0, n_frac), np.nan)
+
+
+def _field(lines, col):
+    return parse_fixed_float(lines[:, col[0]:col[1]])
+
+
+def decode_lines(lines):
+    """
+    Decodes an (N, 80) line matrix into column arrays.
+    Returns a dict with id (bytes), year, month, day (fractional), ra, dec (deg),
+    mag (NaN when blank) and a 'valid' mask mirroring the old per-line parsers.
+    """
+    ra_h, ra_m, ra_s = _field(lines, COL_RA_H), _field(lines, COL_RA_M), _field(lines, COL_RA_S)
+    ra = (ra_h + ra_m / 60 + ra_s / 3600) * 15.0
+
+    dec_sign = np.where(lines[:, COL_DEC_SIGN[0]] == MINUS, -1.0, 1.0)
+    dec_d, dec_m, dec_s = _field(lines, COL_DEC_D), _field(lines, COL_DEC_M), _field(lines, COL_DEC_S)
+    dec = dec_sign * (dec_d + dec_m / 60 + dec_s / 3600)
+
+    year = _field(lines, COL_YEAR)
+    month = _field(lines, COL_MONTH)
+    day = _field(lines, COL_DAY)
+
+    # Same acceptance rules as the regex: 19xx/20xx year, two-digit month and day
+    y0 = lines[:, COL_YEAR[0]:COL_YEAR[0] + 2]
+    century_ok = ((y0[:, 0] == ord('1')) & (y0[:, 1] == ord('9'))) | \
+                 ((y0[:, 0] == ord('2')) & (y0[:, 1] == ord('0')))
+    date_ok = century_ok & (month >= 1) & (month <= 12) & (day >= 1) & (day < 32)
+
+    valid = np.isfinite(ra) & np.isfinite(dec) & date_ok
+
+    ids = lines[:, COL_ID[0]:COL_ID[1]].copy().view(f'S{COL_ID[1] - COL_ID[0]}').ravel()
+
+    return {
+        'id': np.char.strip(ids),
+        'year': year,
+        'month': month,
+        'day': day,
+        'ra': ra,
+        'dec': dec,
+        'mag': _field(lines, COL_MAG),
+        'valid': valid,
+    }
+
+
+def box_mask(ra, dec, box):
+    """Boolean mask for (ra_min, ra_max, dec_min, dec_max), inclusive like the old checks."""
+    ra_min, ra_max, dec_min, dec_max = box
+    return (ra >= ra_min) & (ra <= ra_max) & (dec >= dec_min) & (dec <= dec_max)
+
+
+def mag_mask(mag, discard_brighter=None, min_mag=None):
+    """
+    discard_brighter: drop detections brighter than this, but KEEP blank mags.
+    min_mag:          keep only detections fainter than this (blank mags dropped).
+    """
+    keep = np.ones(len(mag), dtype=bool)
+    if discard_brighter is not None:
+        keep &= ~(mag < discard_brighter)
+    if min_mag is not None:
+        keep &= mag > min_mag
+    return keep
+
+
+def scan_block(block, box=None, discard_brighter=None, min_mag=None, base=0):
+    """
+    Parses one newline-aligned byte block and applies the box/mag cuts as array masks.
+    'base' is the block's position in the file, so returned offsets are absolute.
+    """
+    block = np.asarray(block)
+    starts, ends = line_bounds(block)
+    long_enough = (ends - starts) >= MIN_LINE_LENGTH
+    starts, ends = starts[long_enough], ends[long_enough]
+
+    cols = decode_lines(line_matrix(block, starts, ends))
+    keep = cols['valid']
+    if box is not None:
+        keep &= box_mask(cols['ra'], cols['dec'], box)
+    keep &= mag_mask(cols['mag'], discard_brighter, min_mag)
+
+    out = {k: v[keep] for k, v in cols.items() if k != 'valid'}
+    out['offset'] = starts[keep] + base
+    out['length'] = ends[keep] - starts[keep]
+    return out
+
+
+def parts_to_frame(parts):
+    """Concatenates scan_block outputs into a detections DataFrame."""
+    if not parts:
+        return pd.DataFrame(columns=['id', 'mjd', 'ra', 'dec', 'mag', 'offset', 'length'])
+    cols = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+    return pd.DataFrame({
+        'id': cols['id'].astype('U'),
+        'mjd': calendar_to_mjd(cols['year'], cols['month'], cols['day']),
+        'ra': cols['ra'],
+        'dec': cols['dec'],
+        'mag': cols['mag'],
+        'offset': cols['offset'],
+        'length': cols['length'],
+    })
+
+
+def _scan_range(path, start, stop, box, discard_brighter, min_mag):
+    """Worker: memory-maps the file itself and parses one byte range."""
+    data = open_itf(path)
+    return scan_block(data[start:stop], box, discard_brighter, min_mag, base=start)
+
+
+def scan_parts(path, box=None, discard_brighter=None, min_mag=None,
+               block_bytes=BLOCK_BYTES, workers=1, progress=None):
+    """
+    Parses an ITF file block by block and returns the per-block column dicts
+    in file order. With workers > 1 the newline-aligned byte ranges are parsed
+    in a process pool; progress is reported as blocks finish, in any order,
+    but the result is identical to the serial scan.
+    """
+    data = open_itf(path)
+    ranges = list(iter_blocks(data, block_bytes))
+    cuts = (box, discard_brighter, min_mag)
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 or len(ranges) <= 1:
+        parts = []
+        for start, stop in ranges:
+            parts.append(scan_block(data[start:stop], *cuts, base=start))
+            if progress:
+                progress(stop - start)
+        return parts
+
+    parts = [None] * len(ranges)
+    with ProcessPoolExecutor(max_workers=min(workers, len(ranges))) as pool:
+        futures = {pool.submit(_scan_range, path, start, stop, *cuts): (i, stop - start)
+                   for i, (start, stop) in enumerate(ranges)}
+        for fut in as_completed(futures):
+            i, nbytes = futures[fut]
+            parts[i] = fut.result()
+            if progress:
+                progress(nbytes)
+    return parts
+
+
+def scan_itf(path, box=None, discard_brighter=None, min_mag=None,
+             block_bytes=BLOCK_BYTES, workers=1, progress=None):
+    """
+    Scans an ITF file and returns a DataFrame of detections passing the cuts:
+    id, mjd, ra, dec, mag, plus the byte offset/length of the source line.
+    progress(n_bytes) is called after each block (e.g. a tqdm bar's update).
+    workers > 1 (or None for every core) parses blocks in parallel processes.
+    """
+    parts = scan_parts(path, box, discard_brighter, min_mag, block_bytes, workers, progress)
+    return parts_to_frame([p for p in parts if len(p['ra'])])
+
+
+def read_lines(path, offsets, lengths):
+    """Returns the raw text lines at the given byte offsets."""
+    data = open_itf(path)
+    return [bytes(data[o:o + n]).decode('ascii', 'replace') for o, n in zip(offsets, lengths)]
+
@@ -0,0 +1,149 @@
+import itertools
+import queue
+import threading
+import zlib
+
+import numpy as np
+
+import http_client
+from itf_parser import BLOCK_BYTES, scan_block, parts_to_frame
+from regions import assign_regions
+
+# --- STREAMING ITF PIPELINE ---
+# chunked HTTP (or file) read -> incremental gzip decompress -> line framing
+# -> batch parse. The first three stages run in a background thread and hand
+# newline-aligned blocks to the parser through a bounded queue, so download
+# and parsing overlap and peak memory is ~(QUEUE_BLOCKS + 2) blocks no
+# matter how large the ITF is. Candidates are yielded block by block while
+# the download is still running.
+
+CHUNK_BYTES = 1024 * 1024
+QUEUE_BLOCKS = 4
+HTTP_TIMEOUT = 60
+GZIP_MAGIC = b'\x1f\x8b'
+
+_DONE = object()
+
+
+def iter_source(source, chunk_bytes=CHUNK_BYTES, progress=None):
+    """Raw byte chunks from an http(s) URL or a local file path."""
+    if source.startswith(('http://', 'https://')):
+        with http_client.get(source, stream=True, timeout=HTTP_TIMEOUT) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=chunk_bytes):
+                if progress:
+                    progress(len(chunk))
+                yield chunk
+    else:
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_bytes), b''):
+                if progress:
+                    progress(len(chunk))
+                yield chunk
+
+
+def iter_decompressed(chunks):
+    """Gunzips on the fly if the stream starts with the gzip magic; passes plain text through."""
+    chunks = iter(chunks)
+    first = next(chunks, b'')
+    if not first.startswith(GZIP_MAGIC):
+        if first:
+            yield first
+        yield from chunks
+        return
+
+    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    for chunk in itertools.chain([first], chunks):
+        while chunk:
+            out = inflater.decompress(chunk)
+            if out:
+                yield out
+            if inflater.eof:
+                # Concatenated gzip members: start a fresh decompressor
+                chunk = inflater.unused_data
+                inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            else:
+                chunk = b''
+    tail = inflater.flush()
+    if tail:
+        yield tail
+
+
+def iter_line_blocks(chunks, block_bytes=BLOCK_BYTES):
+    """Re-frames arbitrary byte chunks into blocks of whole lines (~block_bytes each)."""
+    buf = bytearray()
+    for chunk in chunks:
+        buf += chunk
+        if len(buf) >= block_bytes:
+            cut = buf.rfind(b'\n') + 1
+            if cut:
+                yield bytes(buf[:cut])
+                del buf[:cut]
+    if buf:
+        yield bytes(buf)
+
+
+def _put(out, item, stop):
+    """Bounded put: waits (backpressure) while the parser is behind, gives up on stop."""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _producer(source, block_bytes, out, stop, progress):
+    try:
+        chunks = iter_source(source, progress=progress)
+        for block in iter_line_blocks(iter_decompressed(chunks), block_bytes):
+            if not _put(out, block, stop):
+                return
+        _put(out, _DONE, stop)
+    except Exception as e:
+        _put(out, e, stop)
+
+
+def stream_itf(source, box=None, discard_brighter=None, min_mag=None,
+               block_bytes=BLOCK_BYTES, queue_blocks=QUEUE_BLOCKS, progress=None, regions=None):
+    """
+    Yields a DataFrame of candidates (id, mjd, ra, dec, mag, offset, length, line)
+    for every parsed block of 'source' (URL or local path, gzipped or not).
+    progress(n_bytes) reports raw (compressed) bytes read from the source.
+    With 'regions' (see regions.py) every detection is emitted once per region
+    it falls in, with a leading 'region' column, all in the same single pass.
+    """
+    blocks = queue.Queue(maxsize=queue_blocks)
+    stop = threading.Event()
+    worker = threading.Thread(target=_producer, args=(source, block_bytes, blocks, stop, progress),
+                              daemon=True)
+    worker.start()
+
+    base = 0
+    try:
+        while True:
+            block = blocks.get()
+            if block is _DONE:
+                break
+            if isinstance(block, Exception):
+                raise block
+
+            part = scan_block(np.frombuffer(block, dtype=np.uint8), box, discard_brighter, min_mag)
+            if regions is not None:
+                det, reg = assign_regions(part['ra'], part['dec'], regions)
+                part = {k: v[det] for k, v in part.items()}
+            if len(part['ra']):
+                lines = [block[o:o + n].decode('ascii', 'replace')
+                         for o, n in zip(part['offset'], part['length'])]
+                part['offset'] = part['offset'] + base
+                df = parts_to_frame([part])
+                df['line'] = lines
+                if regions is not None:
+                    df.insert(0, 'region', [regions[k]['id'] for k in reg])
+                yield df
+            base += len(block)
+    finally:
+        stop.set()
+        worker.join(timeout=5)
+
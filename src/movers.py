@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+
+import noirlab
+from skycells import slices
+from tracklets import (ASTROMETRY_FLOOR, LINK_MAX_RATE, LINK_MIN_DT_HOURS, LINK_MIN_RATE, fit_linear_motion,
+                       tangent_plane)
+
+# --- MOVER CONFIRMATION FROM NSC MEASUREMENTS ---
+# A survivor is an nsc_dr2.object row that PS1 does not know. Its nights are
+# in nsc_dr2.meas: every single-epoch detection DECam made around it. The
+# object's mjd is a mean over all its detections, so it is not used as an
+# epoch: one batched multi-cone query (noirlab.query_cones) per sector
+# fetches every measurement within LINK_RADIUS_DEG of each survivor, and the
+# linking is done locally:
+#   - the survivor's own detections are the measurements of the NSC object
+#     nearest to it (within OWN_RADIUS); each one is an anchor, with its own
+#     position and exposure time;
+#   - every other measurement taken LINK_MIN_DT_HOURS to LINK_WINDOW_HOURS
+#     from an anchor and at least MIN_OFFSET away from it (closer is
+#     astrometric noise) gives a velocity (offset / time); it is a companion
+#     if that rate is within [LINK_MIN_RATE, LINK_MAX_RATE] "/hr (the limits
+#     of tracklets.py);
+#   - companions of one anchor at different times whose velocities agree
+#     (within the astrometric error of both offsets) belong to the same
+#     tracklet. The companion with the most agreeing partners wins; the
+#     anchor plus its agreeing companions are fitted with
+#     tracklets.fit_linear_motion, and each survivor keeps its best anchor
+#     (most points, then lowest RMS).
+# A static neighbour seen at several times gives velocities that shrink
+# as 1/dt, so it does not agree with itself across the night; and an NSC
+# object re-detected at the same spot at different times (see
+# _static_objects) is not a companion at all, so it cannot make a pair.
+# Result per survivor: mover_status 'tracklet' (3+ points on a line),
+# 'pair' (one companion) or 'none', with the fitted rate/PA/RMS and the
+# epoch (mover_mjd) of the tracklet's first point.
+
+MEAS_TABLE = "nsc_dr2.meas"
+MEAS_SELECT = "measid, objectid, ra, dec, mjd, mag_auto"
+LINK_WINDOW_HOURS = 12.0   # one night either side of an anchor detection
+LINK_RADIUS_DEG = LINK_MAX_RATE * LINK_WINDOW_HOURS / 3600.0
+MIN_OFFSET = 3 * ASTROMETRY_FLOOR  # arcsec
+OWN_RADIUS = 1.0           # arcsec; the survivor's own NSC object
+MEAS_BATCH = 100           # survivor cones per meas query
+
+
+def fetch_meas(survivors, radius=LINK_RADIUS_DEG, batch=MEAS_BATCH):
+    """
+    nsc_dr2.meas rows around every survivor (ra, dec), in batched multi-cone
+    queries. Returns a DataFrame with an 'anchor' column (the survivor's
+    index label), or None if any query failed.
+    """
+    cones = [{'id': i, 'ra': float(r), 'dec': float(d), 'radius': radius}
+             for i, r, d in zip(survivors.index, survivors['ra'], survivors['dec'])]
+    found = noirlab.query_cones(cones, MEAS_SELECT, table=MEAS_TABLE, mag_col='mag_auto', batch=batch, key='measid')
+    frames = []
+    for anchor, rows in found.items():
+        if rows is None:
+            return None
+        if len(rows):
+            frames.append(rows.assign(anchor=anchor))
+    if not frames:
+        return pd.DataFrame(columns=['measid', 'objectid', 'ra', 'dec', 'mjd', 'mag_auto', 'anchor'])
+    return pd.concat(frames, ignore_index=True)
+
+
+def _static_objects(meas, floor):
+    """objectids detected at least LINK_MIN_DT_HOURS apart without moving more than 'floor' arcsec."""
+    det = meas.drop_duplicates(subset='measid')
+    g = det.assign(x=det['ra'] * np.cos(np.deg2rad(det['dec'])) * 3600.0,
+                   y=det['dec'] * 3600.0).groupby('objectid')
+    span = (g['mjd'].max() - g['mjd'].min()) * 24.0
+    scatter = np.hypot(g['x'].std(), g['y'].std())
+    return set(span.index[(span >= LINK_MIN_DT_HOURS) & (scatter <= floor)])
+
+
+def _anchors(survivors, meas):
+    """The survivors' own detections: (survivor position, meas row) of the NSC object nearest each survivor."""
+    pos = survivors.index.get_indexer(meas['anchor'])
+    x, y = tangent_plane(meas['ra'].to_numpy(dtype=np.float64), meas['dec'].to_numpy(dtype=np.float64),
+                         survivors['ra'].to_numpy(dtype=np.float64)[pos],
+                         survivors['dec'].to_numpy(dtype=np.float64)[pos])
+    sep = np.hypot(x, y)
+    order = np.lexsort((sep, pos))
+    _, first = np.unique(pos[order], return_index=True)
+    nearest = order[first]
+    nearest = nearest[sep[nearest] <= OWN_RADIUS]
+    own = pd.Series(meas['objectid'].to_numpy()[nearest], index=pos[nearest])
+    objectid = meas['objectid'].to_numpy()
+    mine = np.flatnonzero(own.reindex(pos).to_numpy() == objectid)
+    return pos[mine], mine
+
+
+def _companions(survivors, meas, min_rate, max_rate, window_hours, floor):
+    """
+    Measurements whose offset from an anchor detection is a plausible motion:
+    (anchor number, survivor position of each anchor, anchor meas rows,
+    companion meas row, vx, vy, dt) with one entry per (anchor, companion).
+    """
+    surv, anchor_row = _anchors(survivors, meas)
+    pos = survivors.index.get_indexer(meas['anchor'])
+    mjd = meas['mjd'].to_numpy(dtype=np.float64)
+    ra, dec = meas['ra'].to_numpy(dtype=np.float64), meas['dec'].to_numpy(dtype=np.float64)
+    candidate = np.flatnonzero(~meas['objectid'].isin(_static_objects(meas, floor)).to_numpy())
+
+    # Candidates of the anchor's own survivor within +/- window_hours: one sort on (survivor, mjd)
+    span = float(np.nanmax(mjd) - np.nanmin(mjd)) + 2.0 * window_hours / 24.0 + 1.0 if len(mjd) else 1.0
+    key = pos[candidate] * span + (mjd[candidate] - np.nanmin(mjd))
+    order = np.argsort(key, kind='stable')
+    key, candidate = key[order], candidate[order]
+    a_key = surv * span + (mjd[anchor_row] - np.nanmin(mjd))
+    lo = np.searchsorted(key, a_key - window_hours / 24.0, side='left')
+    hi = np.searchsorted(key, a_key + window_hours / 24.0, side='right')
+    a = np.repeat(np.arange(len(anchor_row)), hi - lo)
+    row = candidate[slices(lo, hi)]
+
+    dt = (mjd[row] - mjd[anchor_row[a]]) * 24.0
+    x, y = tangent_plane(ra[row], dec[row], ra[anchor_row[a]], dec[anchor_row[a]])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vx, vy = x / dt, y / dt
+    rate = np.hypot(vx, vy)
+    ok = ((np.abs(dt) >= LINK_MIN_DT_HOURS) & (np.hypot(x, y) >= MIN_OFFSET)
+          & (rate >= min_rate) & (rate <= max_rate))
+    return a[ok], surv, anchor_row, row[ok], vx[ok], vy[ok], dt[ok]
+
+
+def link_movers(survivors, meas, min_rate=LINK_MIN_RATE, max_rate=LINK_MAX_RATE, window_hours=LINK_WINDOW_HOURS,
+                floor=ASTROMETRY_FLOOR):
+    """
+    Intra-night tracklets through every survivor from its measurements (see
+    fetch_meas). Returns a DataFrame indexed like 'survivors' with
+    mover_status, mover_points, mover_rate ("/hr), mover_pa (deg),
+    mover_rms (") and mover_mjd.
+    """
+    out = pd.DataFrame({'mover_status': 'none', 'mover_points': 1, 'mover_rate': np.nan,
+                        'mover_pa': np.nan, 'mover_rms': np.nan, 'mover_mjd': np.nan}, index=survivors.index)
+    if meas is None or meas.empty:
+        return out
+    anchor, surv, anchor_row, row, vx, vy, dt = _companions(survivors, meas, min_rate, max_rate, window_hours, floor)
+    if len(anchor) == 0:
+        return out
+
+    # Every pair of companions of the same anchor: do their velocities agree?
+    order = np.lexsort((dt, anchor))
+    anchor, row, vx, vy, dt = anchor[order], row[order], vx[order], vy[order], dt[order]
+    counts = np.bincount(anchor, minlength=len(anchor_row))
+    start = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    i = np.repeat(np.arange(len(anchor)), counts[anchor])
+    j = slices(start[anchor], start[anchor] + counts[anchor])
+    tol = floor * (1.0 / np.abs(dt[i]) + 1.0 / np.abs(dt[j]))
+    agree = (np.hypot(vx[i] - vx[j], vy[i] - vy[j]) <= tol) & ((np.abs(dt[i] - dt[j]) >= LINK_MIN_DT_HOURS) | (i == j))
+
+    # The best-supported companion of each anchor and everything agreeing with it
+    support = np.bincount(i[agree], minlength=len(anchor))
+    best = np.full(len(anchor_row), -1)
+    top = np.zeros(len(anchor_row), dtype=np.int64)
+    np.maximum.at(top, anchor, support)
+    winners = np.flatnonzero(support == top[anchor])
+    _, first = np.unique(anchor[winners], return_index=True)
+    best[anchor[winners[first]]] = winners[first]
+    members = j[agree & (best[anchor[i]] == i)]
+
+    # Fit anchor + companions, one tracklet per anchor
+    linked = np.unique(anchor[members])
+    meas_mjd, meas_ra, meas_dec = (meas[c].to_numpy(dtype=np.float64) for c in ('mjd', 'ra', 'dec'))
+    rows = np.concatenate([anchor_row[linked], row[members]])
+    links = pd.DataFrame({'id': np.concatenate([linked, anchor[members]]),
+                          'mjd': meas_mjd[rows], 'ra': meas_ra[rows], 'dec': meas_dec[rows]})
+    fits, _ = fit_linear_motion(links)
+
+    # Each survivor keeps its best anchor: most points, then lowest RMS
+    fits['surv'] = surv[fits['id'].to_numpy()]
+    fits = fits.sort_values(['surv', 'n_used', 'rms'], ascending=[True, False, True]).drop_duplicates('surv')
+    idx = survivors.index[fits['surv'].to_numpy()]
+    out.loc[idx, 'mover_points'] = fits['n_used'].to_numpy()
+    out.loc[idx, 'mover_status'] = np.where(fits['n_used'] >= 3, 'tracklet', 'pair')
+    out.loc[idx, 'mover_rate'] = fits['rate'].to_numpy()
+    out.loc[idx, 'mover_pa'] = fits['pa'].to_numpy()
+    out.loc[idx, 'mover_rms'] = fits['rms'].to_numpy()
+    out.loc[idx, 'mover_mjd'] = fits['mjd_first'].to_numpy()
+    return out
+
+
+def confirm_movers(survivors, **link_args):
+    """
+    Fetches the measurements of every survivor (one batched query set per
+    'sector' if the column exists) and links them. Returns survivors with
+    the mover_* columns (re-indexed 0..n-1), or None if a query failed.
+    """
+    survivors = survivors.reset_index(drop=True)
+    groups = survivors.groupby('sector', sort=False) if 'sector' in survivors.columns else [(None, survivors)]
+    parts = []
+    for sector, rows in groups:
+        print(f"    > Measurements around {len(rows)} survivors" + (f" of {sector}" if sector else "") + "...")
+        meas = fetch_meas(rows)
+        if meas is None:
+            return None
+        parts.append(link_movers(rows, meas, **link_args))
+    if not parts:
+        return survivors.join(link_movers(survivors, None))
+    return survivors.join(pd.concat(parts))
@@ -0,0 +1,289 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+import http_client
+import skycells
+
+# --- NOIRLAB SOURCE CATALOG (DATA LAB TAP) ---
+# Shared by the grid surveys. A cone is fetched in pages that each stay under
+# the server's row limit:
+#   - the cone is cut into Dec strips no taller than STRIP_DEG;
+#   - a page that comes back with ROW_LIMIT rows may be truncated, so its
+#     strip is halved and both halves are fetched instead;
+#   - once a strip is thinner than MIN_STRIP_DEG it is sliced in magnitude.
+# Every page is parsed while it downloads (CSV chunks straight off the
+# socket), and the pages are concatenated without duplicates. A 0.25 deg
+# drill hole is a single page, exactly as before; 1-2 deg cones or whole
+# orbit segments just become more pages.
+#
+# query_cones() batches many cones (sectors, tiles) into few requests: up to
+# MULTI_CONE_BATCH q3c_radial_query predicates are OR'd into one query and
+# the rows are sorted back into their cones locally. A combined answer at
+# the row limit is split into two half batches; a single cone left over is
+# paged by query_cone().
+#
+# Pre-filters push cheap per-object cuts on nsc_dr2.object's own columns
+# (ndet, deltamjd, proper motion, flags) into the WHERE clause, so sources
+# that cannot be movers never reach PS1 verification. count_prefilters()
+# runs one extra aggregate query, on request, to report how many rows each
+# cut removes on the server (later local cuts are not included).
+
+NSC_URL = "https://datalab.noirlab.edu/tap/sync"
+NSC_TIMEOUT = 300          # seconds; sync TAP queries on dense fields are slow
+ROW_LIMIT = 100000         # rows per page (sent as MAXREC); a full page is treated as truncated
+STRIP_DEG = 0.5
+MIN_STRIP_DEG = 0.02
+MIN_MAG_SLICE = 0.05
+CSV_BLOCK_BYTES = 4 * 1024 * 1024
+MULTI_CONE_BATCH = 10      # cones per combined query
+EDGE_TOL = 1e-7            # deg; rounding slack when sorting rows back into cones
+
+# name: ADQL condition a row must meet, '{}' is the configured value
+PREFILTERS = {
+    'ndet_max': "ndet <= {}",                   # few detections
+    'deltamjd_max': "deltamjd <= {}",           # days between first and last detection
+    'pm_min': "pmra * pmra + pmdec * pmdec >= {0} * {0}",    # mas/yr
+    'pm_snr_min': "pmra * pmra + pmdec * pmdec >= {0} * {0} * (pmraerr * pmraerr + pmdecerr * pmdecerr)",
+    'flags_max': "flags <= {}",
+}
+
+
+def standardize_mag(df):
+    """Renames the r-band magnitude column ('rmag' or the 3rd column) to 'mag'."""
+    if 'mag' in df.columns:
+        return df
+    mag_col = next((c for c in df.columns if 'rmag' in c), None)
+    if mag_col is None and len(df.columns) > 2:
+        mag_col = df.columns[2]
+    return df.rename(columns={mag_col: 'mag'}) if mag_col else df
+
+
+def prefilter_terms(prefilters):
+    """[(name, ADQL condition)] for a {name: value} pre-filter config (see PREFILTERS)."""
+    unknown = set(prefilters or {}) - set(PREFILTERS)
+    if unknown:
+        raise ValueError(f"Unknown NOIRLab pre-filters: {sorted(unknown)}")
+    return [(name, PREFILTERS[name].format(float(value))) for name, value in (prefilters or {}).items()]
+
+
+def prefilter_where(where, prefilters):
+    """'where' AND every pre-filter condition (None when there is nothing to add)."""
+    terms = ([f"({where})"] if where else []) + [f"({cond})" for _, cond in prefilter_terms(prefilters)]
+    return " AND ".join(terms) or None
+
+
+def run_query(sql, row_limit=ROW_LIMIT, timeout=NSC_TIMEOUT):
+    """
+    One synchronous ADQL query, parsed block by block as the CSV streams in.
+    Returns a DataFrame with stripped, lower-case column names, or None on failure.
+    """
+    params = {'request': 'doQuery', 'lang': 'ADQL', 'format': 'csv', 'query': sql}
+    if row_limit:
+        params['maxrec'] = row_limit
+    header, tail, frames = None, b'', []
+    try:
+        with http_client.post(NSC_URL, data=params, timeout=timeout, stream=True) as r:
+            if r.status_code != 200:
+                print(f"[!] NOIRLab HTTP {r.status_code}")
+                return None
+            for chunk in r.iter_content(chunk_size=CSV_BLOCK_BYTES):
+                if header is None and not tail:
+                    head = chunk[:200].decode('utf-8', 'replace')
+                    if "ERROR" in head.upper() or "<VOTABLE" in head:
+                        print(f"[!] NOIRLab Error: {head[:100]}")
+                        return None
+                # Parse whole lines only; the partial last line waits for the next chunk
+                data = tail + chunk
+                cut = data.rfind(b'\n') + 1
+                block, tail = data[:cut], data[cut:]
+                if header is None and block:
+                    split = block.index(b'\n') + 1
+                    header, block = block[:split], block[split:]
+                if block:
+                    frames.append(pd.read_csv(io.BytesIO(header + block)))
+    except Exception as e:
+        print(f"[!] Network Error: {e}")
+        return None
+
+    if header is None:
+        header, tail = tail, b''
+    if tail.strip():
+        frames.append(pd.read_csv(io.BytesIO(header + b'\n' + tail)))
+    if frames:
+        df = pd.concat(frames, ignore_index=True)
+    elif header.strip():
+        df = pd.read_csv(io.BytesIO(header))
+    else:
+        df = pd.DataFrame()
+    df.columns = df.columns.str.strip().str.lower()
+    return df
+
+
+def _radial(cone):
+    """q3c predicate of an (ra, dec, radius[, extra condition]) cone."""
+    ra, dec, radius = cone[:3]
+    term = f"'t' = q3c_radial_query(ra, dec, {ra}, {dec}, {radius})"
+    return f"({term} AND {cone[3]})" if len(cone) > 3 and cone[3] else term
+
+
+def _piece_sql(select, table, cones, where, dec_bounds, mag_col, mag_bounds):
+    radial = [_radial(cone) for cone in cones]
+    terms = [radial[0] if len(radial) == 1 else "(" + "\n   OR ".join(radial) + ")"]
+    lo, hi = dec_bounds
+    # Open-ended outer strips: the cone itself bounds them
+    if lo is not None:
+        terms.append(f"dec >= {float(lo)!r}")
+    if hi is not None:
+        terms.append(f"dec < {float(hi)!r}")
+    if mag_bounds is not None:
+        m_lo, m_hi, top = mag_bounds
+        terms.append(f"{mag_col} BETWEEN {float(m_lo)!r} AND {float(m_hi)!r}" if top else
+                     f"{mag_col} >= {float(m_lo)!r} AND {mag_col} < {float(m_hi)!r}")
+    if where:
+        terms.append(f"({where})")
+    return f"SELECT {select}\nFROM {table}\nWHERE\n  " + "\n  AND ".join(terms)
+
+
+def _halve(piece, cone):
+    """Splits a piece in Dec, or in magnitude once its strip is too thin; None if it cannot be split."""
+    (lo, hi), mag_bounds = piece
+    ra, dec, radius = cone
+    bottom = dec - radius if lo is None else lo
+    top = dec + radius if hi is None else hi
+    if top - bottom > MIN_STRIP_DEG:
+        mid = (bottom + top) / 2
+        return [((lo, mid), mag_bounds), ((mid, hi), mag_bounds)]
+    if mag_bounds is not None and mag_bounds[1] - mag_bounds[0] > MIN_MAG_SLICE:
+        m_lo, m_hi, closed = mag_bounds
+        mid = (m_lo + m_hi) / 2
+        return [((lo, hi), (m_lo, mid, False)), ((lo, hi), (mid, m_hi, closed))]
+    return None
+
+
+def query_cone(ra, dec, radius, select, where=None, table="nsc_dr2.object", mag_col='rmag',
+               mag_range=None, row_limit=ROW_LIMIT, strip_deg=STRIP_DEG, key=None, timeout=NSC_TIMEOUT):
+    """
+    Every row of 'table' within 'radius' deg of (ra, dec), fetched in pages
+    that stay under row_limit. mag_range=(lo, hi) adds 'mag_col BETWEEN lo
+    AND hi' and allows magnitude slicing; 'where' is any extra ADQL condition.
+    Rows are de-duplicated on 'key' (all columns if None).
+    Returns a DataFrame, or None if any page failed.
+    """
+    cone = (ra, dec, radius)
+    n_strips = max(1, int(np.ceil(2 * radius / strip_deg)))
+    edges = [None] + [dec - radius + 2 * radius * k / n_strips for k in range(1, n_strips)] + [None]
+    mag_bounds = (mag_range[0], mag_range[1], True) if mag_range is not None else None
+    todo = [((edges[k], edges[k + 1]), mag_bounds) for k in range(n_strips)][::-1]
+
+    pages = []
+    while todo:
+        piece = todo.pop()
+        df = run_query(_piece_sql(select, table, [cone], where, piece[0], mag_col, piece[1]),
+                       row_limit=row_limit, timeout=timeout)
+        if df is None:
+            return None
+        if row_limit and len(df) >= row_limit:
+            halves = _halve(piece, cone)
+            if halves is not None:
+                todo.extend(halves[::-1])
+                continue
+            print(f"[!] NOIRLab page still at the {row_limit}-row limit at minimum size; rows may be missing.")
+        pages.append(df)
+
+    if len(pages) > 1:
+        print(f"    > NOIRLab: {len(pages)} pages")
+    df = pd.concat(pages, ignore_index=True) if pages else pd.DataFrame()
+    if not df.empty:
+        df = df.drop_duplicates(subset=key).reset_index(drop=True)
+    return df
+
+
+def _split_by_cone(df, group, key):
+    """{cone id: its rows of a combined answer}; a row inside several cones goes to each."""
+    if df.empty or 'ra' not in df.columns:
+        return {c['id']: df.copy() for c in group}
+    radii = np.array([c['radius'] for c in group], dtype=np.float64)
+    row, k, sep = skycells.pairs(df['ra'].to_numpy(dtype=np.float64), df['dec'].to_numpy(dtype=np.float64),
+                                 [c['ra'] for c in group], [c['dec'] for c in group], radii.max() + EDGE_TOL)
+    keep = sep <= radii[k] + EDGE_TOL
+    row, k = row[keep], k[keep]
+    out = {}
+    for j, c in enumerate(group):
+        rows = df.iloc[np.sort(row[k == j])]
+        out[c['id']] = rows.drop_duplicates(subset=key).reset_index(drop=True)
+    return out
+
+
+def query_cones(cones, select, where=None, table="nsc_dr2.object", mag_col='rmag', mag_range=None,
+                row_limit=ROW_LIMIT, batch=MULTI_CONE_BATCH, key=None, timeout=NSC_TIMEOUT):
+    """
+    query_cone() for many cones ({'id', 'ra', 'dec', 'radius'}) in few
+    requests: 'batch' cones per combined query (same select/where/mag_range
+    for all). Returns {cone id: DataFrame, or None if its query failed}.
+    'select' must include ra and dec (rows are assigned to cones by position).
+    A cone's optional 'where' narrows its own predicate on the server (e.g.
+    an MJD window); rows are still assigned to every cone they fall in.
+    """
+    results = {}
+    mag_bounds = (mag_range[0], mag_range[1], True) if mag_range is not None else None
+    todo = [cones[i:i + max(1, batch)] for i in range(0, len(cones), max(1, batch))][::-1]
+    n_queries = 0
+    while todo:
+        group = todo.pop()
+        if len(group) == 1:
+            c = group[0]
+            own = " AND ".join(f"({w})" for w in (where, c.get('where')) if w) or None
+            results[c['id']] = query_cone(c['ra'], c['dec'], c['radius'], select, where=own, table=table,
+                                          mag_col=mag_col, mag_range=mag_range, row_limit=row_limit,
+                                          key=key, timeout=timeout)
+            n_queries += 1
+            continue
+        sql = _piece_sql(select, table, [(c['ra'], c['dec'], c['radius'], c.get('where')) for c in group], where,
+                         (None, None), mag_col, mag_bounds)
+        df = run_query(sql, row_limit=row_limit, timeout=timeout)
+        n_queries += 1
+        if df is None:
+            results.update({c['id']: None for c in group})
+        elif row_limit and len(df) >= row_limit:
+            # Possibly truncated: ask again in two halves
+            half = len(group) // 2
+            todo.extend([group[half:], group[:half]])
+        else:
+            results.update(_split_by_cone(df, group, key))
+    print(f"    > NOIRLab: {len(cones)} cones in {n_queries} batches")
+    return results
+
+
+def count_prefilters(cones, prefilters, where=None, table="nsc_dr2.object", mag_col='rmag', mag_range=None,
+                     timeout=NSC_TIMEOUT):
+    """
+    Rows the pre-filters keep and drop over the union of 'cones', in one
+    aggregate query: {'total', 'kept', <filter name>: rows it alone rejects}.
+    None on failure. A NULL column counts as rejected, as in the WHERE clause.
+    """
+    terms = prefilter_terms(prefilters)
+    if not terms or not cones:
+        return None
+    columns = ["COUNT(*) AS total",
+               "SUM(CASE WHEN " + " AND ".join(f"({c})" for _, c in terms) + " THEN 1 ELSE 0 END) AS kept"]
+    columns += [f"SUM(CASE WHEN ({cond}) THEN 0 ELSE 1 END) AS {name}" for name, cond in terms]
+    mag_bounds = (mag_range[0], mag_range[1], True) if mag_range is not None else None
+    sql = _piece_sql(", ".join(columns), table, [(c['ra'], c['dec'], c['radius']) for c in cones], where,
+                     (None, None), mag_col, mag_bounds)
+    df = run_query(sql, row_limit=None, timeout=timeout)
+    if df is None or df.empty:
+        return None
+    return {k: int(v) if pd.notna(v) else 0 for k, v in df.iloc[0].items()}
+
+
+def report_prefilters(counts, label="NOIRLab pre-filters"):
+    """Prints the rows each pre-filter removed server-side (counts from count_prefilters)."""
+    if not counts:
+        return
+    print(f"    > {label}: {counts['kept']} of {counts['total']} rows kept, "
+          f"{counts['total'] - counts['kept']} removed server-side")
+    for name, value in counts.items():
+        if name not in ('total', 'kept'):
+            print(f"      - {name}: {value} rejected")
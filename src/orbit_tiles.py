@@ -0,0 +1,128 @@
+import numpy as np
+
+import skycells
+
+# --- ORBIT TRACK TILING ---
+# Covers a band of +/- BAND_DEG around the predicted track (the great-circle
+# polyline through the survey's sector centres) with nested HEALPix tiles
+# instead of isolated drill holes.
+#   - tiles start at BASE_NSIDE (~0.9 deg) and are split into their 4 nested
+#     children while the expected number of deep sources in them is above
+#     MAX_TILE_SOURCES, down to MAX_NSIDE. Expected counts come from a
+#     csc|b| star-count model, so tiles shrink towards the galactic plane;
+#   - each tile is queried as the smallest cone around it, and keeps only the
+#     sources whose own cell is the tile (tile_owns). Neighbouring cones
+#     overlap, the tiles do not, so no source is reported twice.
+# Query cost grows with the band's area, not with the number of holes.
+
+BAND_DEG = 0.5              # half-width of the band around the track
+BASE_NSIDE = 64             # ~0.92 deg tiles where the sky is sparse
+MAX_NSIDE = 512             # ~0.11 deg tiles at the most
+MAX_TILE_SOURCES = 5000     # split tiles expected to hold more deep sources than this
+POLE_DENSITY = 5000.0       # deep sources per deg^2 at the galactic pole (query cuts)
+MIN_LATITUDE = 5.0          # deg; the csc|b| model is capped inside this latitude
+TRACK_STEP_DEG = 0.05
+
+# ICRS (J2000) unit vector -> galactic unit vector
+_GALACTIC = np.array([
+    [-0.0548755604162154, -0.8734370902348850, -0.4838350155487132],
+    [0.4941094278755837, -0.4448296299600112, 0.7469822444972189],
+    [-0.8676661490190047, -0.1980763734312015, 0.4559837761750669],
+])
+
+
+def _unit(ra, dec):
+    ra, dec = np.deg2rad(np.asarray(ra, dtype=np.float64)), np.deg2rad(np.asarray(dec, dtype=np.float64))
+    return np.stack([np.cos(dec) * np.cos(ra), np.cos(dec) * np.sin(ra), np.sin(dec)], axis=-1)
+
+
+def galactic_latitude(ra, dec):
+    """Galactic latitude b (deg) of ICRS positions."""
+    return np.rad2deg(np.arcsin(np.clip(_unit(ra, dec) @ _GALACTIC[2], -1.0, 1.0)))
+
+
+def source_density(ra, dec, pole_density=POLE_DENSITY):
+    """Expected deep sources per deg^2: pole density x csc|b|, capped at MIN_LATITUDE."""
+    b = np.maximum(np.abs(galactic_latitude(ra, dec)), MIN_LATITUDE)
+    return pole_density / np.sin(np.deg2rad(b))
+
+
+def track_points(track, step=TRACK_STEP_DEG):
+    """(ra, dec) samples every ~step deg along the great-circle polyline through 'track' [(ra, dec), ...]."""
+    vertices = _unit([p[0] for p in track], [p[1] for p in track])
+    samples = [vertices[:1]]
+    for a, b in zip(vertices[:-1], vertices[1:]):
+        angle = np.arccos(np.clip(a @ b, -1.0, 1.0))
+        n = max(1, int(np.ceil(np.rad2deg(angle) / step)))
+        t = np.arange(1, n + 1)[:, None] / n
+        if angle > 0:
+            # Spherical linear interpolation
+            samples.append((np.sin((1 - t) * angle) * a + np.sin(t * angle) * b) / np.sin(angle))
+        else:
+            samples.append(np.repeat(a[None], n, axis=0))
+    v = np.concatenate(samples)
+    return np.mod(np.rad2deg(np.arctan2(v[:, 1], v[:, 0])), 360.0), np.rad2deg(np.arcsin(np.clip(v[:, 2], -1, 1)))
+
+
+def tile_radii(nside, pix):
+    """Radius (deg) of a cone around each pixel's centre that contains the whole pixel."""
+    # Centres of the pixel's sub-pixels 4 levels down trace its outline
+    sub = 16
+    pix = np.asarray(pix, dtype=np.int64)
+    ra, dec = skycells.pix2ang(nside, pix)
+    sra, sdec = skycells.pix2ang(nside * sub, pix[:, None] * sub * sub + np.arange(sub * sub))
+    return skycells.angsep(ra[:, None], dec[:, None], sra, sdec).max(axis=1) + skycells.max_pixrad(nside * sub)
+
+
+def _near_track(nside, pix, samples, band, step):
+    """(mask of pixels that overlap the band, index of the nearest track sample)."""
+    ra, dec = skycells.pix2ang(nside, pix)
+    # Loose bound over every pixel first, then each survivor's own radius
+    nearest, sep = skycells.crossmatch(ra, dec, samples[0], samples[1],
+                                       band + skycells.max_pixrad(nside) + step / 2)
+    inside = nearest >= 0
+    inside[inside] = sep[inside] <= band + tile_radii(nside, pix[inside]) + step / 2
+    return inside, nearest
+
+
+def tile_track(track, band=BAND_DEG, base_nside=BASE_NSIDE, max_nside=MAX_NSIDE,
+               max_sources=MAX_TILE_SOURCES, density=source_density, step=TRACK_STEP_DEG):
+    """
+    Nested HEALPix tiles covering the band around the track, ordered along it.
+    Returns a list of (nside, pix).
+    """
+    samples = track_points(track, step)
+    pix = np.arange(skycells.npix(base_nside))
+    nside = base_nside
+    tiles, along = [], []
+    while len(pix):
+        inside, nearest = _near_track(nside, pix, samples, band, step)
+        pix, nearest = pix[inside], nearest[inside]
+        ra, dec = skycells.pix2ang(nside, pix)
+        expected = density(ra, dec) * (4 * np.pi * (180 / np.pi) ** 2 / skycells.npix(nside))
+        split = (expected > max_sources) & (nside < max_nside)
+        tiles.extend((nside, int(p)) for p in pix[~split])
+        along.extend(nearest[~split])
+        pix = (pix[split][:, None] * 4 + np.arange(4)).ravel()
+        nside *= 2
+    order = np.argsort(along, kind='stable')
+    return [tiles[i] for i in order]
+
+
+def tile_targets(track, **tiling):
+    """Survey targets ({'id', 'ra', 'dec', 'radius', 'nside', 'pix'}) for the tiles of a track."""
+    targets = []
+    for nside, pix in tile_track(track, **tiling):
+        ra, dec = skycells.pix2ang(nside, np.array([pix]))
+        radius = tile_radii(nside, [pix])[0]
+        targets.append({'id': f"TILE_N{nside}_{pix}", 'ra': round(float(ra[0]), 6), 'dec': round(float(dec[0]), 6),
+                        'radius': round(float(radius), 6), 'nside': nside, 'pix': pix})
+    return targets
+
+
+def tile_owns(target, ra, dec):
+    """Mask of the positions that belong to a tile target (always all of them for a plain cone)."""
+    if 'pix' not in target:
+        return np.ones(len(ra), dtype=bool)
+    return skycells.ang2pix(target['nside'], np.asarray(ra, dtype=np.float64),
+                            np.asarray(dec, dtype=np.float64)) == target['pix']
@@ -1,180 +1,348 @@
-import requests
 import pandas as pd
-from io import StringIO
-import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import sys
 import os
 
-# --- CONFIGURATION: THE PLANET NINE "GRAND TOUR" TRACK ---
-# Covering every probability zone from the Northern Limit to the Galactic Edge.
-# Ordered by Right Ascension (RA).
-
-TARGETS = [
-    # --- PHASE 0: THE NORTHERN LIMIT (PISCES / CETUS) ---
-    # "Low Probability" - If P9 is closer/faster than models predict.
-    {"id": "SECTOR_ZERO_A", "ra": 30.0, "dec": 2.0},
-    {"id": "SECTOR_ZERO_B", "ra": 33.0, "dec": 0.0},
-    {"id": "SECTOR_ZERO_C", "ra": 36.0, "dec": -1.0},
-
-    # --- PHASE 3: LEADING EDGE (CETUS) ---
-    {"id": "SECTOR_ZETA",   "ra": 40.0, "dec": -2.0}, 
-    {"id": "SECTOR_ETA",    "ra": 45.0, "dec": -5.0},
-    {"id": "SECTOR_THETA_P","ra": 50.0, "dec": -8.0},
-
-    # --- PHASE 1: THE CORE (TAURUS / ERIDANUS BORDER) ---
-    # The "Batygin Box" - Highest Probability Resonance Zone
-    {"id": "SECTOR_ALPHA",  "ra": 55.0, "dec": -10.0}, # Alpha-1 Found Here
-    {"id": "SECTOR_BETA",   "ra": 58.0, "dec": -12.0}, 
-    {"id": "SECTOR_GAMMA",  "ra": 61.0, "dec": -14.0}, 
-    {"id": "SECTOR_DELTA",  "ra": 64.0, "dec": -16.0},
-
-    # --- PHASE 2: DEEP ERIDANUS ---
-    {"id": "SECTOR_THETA",  "ra": 67.0, "dec": -18.0}, 
-    {"id": "SECTOR_IOTA",   "ra": 70.0, "dec": -20.0}, # Iota-1 Found Here
-    {"id": "SECTOR_KAPPA",  "ra": 73.0, "dec": -22.0}, 
-    {"id": "SECTOR_LAMBDA", "ra": 76.0, "dec": -24.0},
-
-    # --- PHASE 3: TRAILING EDGE ---
-    {"id": "SECTOR_MU",     "ra": 79.0, "dec": -26.0},
-    {"id": "SECTOR_NU",     "ra": 82.0, "dec": -28.0},
-    {"id": "SECTOR_XI",     "ra": 85.0, "dec": -30.0},
-
-    # --- PHASE 4: THE SOUTHERN TURN (FORNAX) ---
-    # Poorly mapped by Northern surveys. High discovery potential.
-    {"id": "SECTOR_OMICRON","ra": 88.0, "dec": -32.0},
-    {"id": "SECTOR_PI",     "ra": 91.0, "dec": -34.0},
-    {"id": "SECTOR_RHO",    "ra": 94.0, "dec": -36.0},
-    {"id": "SECTOR_SIGMA",  "ra": 97.0, "dec": -38.0},
-
-    # --- PHASE 5: THE TAIL (PHOENIX) ---
-    # Deep South. Galactic latitude density starts increasing.
-    {"id": "SECTOR_TAU",    "ra": 100.0, "dec": -40.0},
-    {"id": "SECTOR_UPSILON","ra": 103.0, "dec": -42.0},
-    {"id": "SECTOR_PHI",    "ra": 106.0, "dec": -44.0},
-    {"id": "SECTOR_CHI",    "ra": 109.0, "dec": -46.0},
-
-    # --- PHASE 6: THE GALACTIC EDGE (COLUMBA / PUPPIS) ---
-    # "Lowest of Low Probabilities" - The orbit dives into the Milky Way plane.
-    # Extremely high star density makes detection very difficult.
-    {"id": "SECTOR_PSI",    "ra": 112.0, "dec": -48.0},
-    {"id": "SECTOR_OMEGA",  "ra": 115.0, "dec": -50.0},
-    {"id": "SECTOR_INF_A",  "ra": 118.0, "dec": -52.0},
-    {"id": "SECTOR_INF_B",  "ra": 121.0, "dec": -54.0}
-]
-
-SEARCH_RADIUS = 0.25  # 15 arcmin radius per drill hole
+import http_client
+import movers
+import noirlab
+import orbit_tiles
+from p9_track import TARGETS, SEARCH_RADIUS
+from pipeline import atomic_to_csv
+from ps1 import ps1_status, verify_ps1, verify_ps1_bulk, verify_ps1_local
+
+# --- CONFIGURATION ---
+# The track itself (TARGETS, SEARCH_RADIUS) lives in p9_track.py, shared with the offline ITF scripts
+# Cover the whole band around the track with HEALPix tiles (orbit_tiles.py)
+# instead of the drill holes: ~870 tiles, ~180 sq deg, so opt-in (or --tiles)
+TILE_TRACK = False
+PS1_SECTOR_FETCH = True  # One paged PS1 cone per sector + local matching (False: one call per object)
+PS1_REFCAT = None        # Local PS1 extract (refcat.py name) to match offline first; None: network only
+# Optional server-side pre-filters (noirlab.PREFILTERS), pushed into the ADQL
+# WHERE clause; none by default. E.g. {'deltamjd_max': 1.0}: a slow mover
+# leaves a separate NSC object on every night, so its detections span less
+# than a day, while static sources are seen across years.
+# Run with --fresh after changing them (deep checkpoints keep the old cut).
+NSC_PREFILTERS = {}
+COUNT_PREFILTERS = False  # One extra aggregate query per batch reporting the rows each pre-filter removes
 OUTPUT_FILE = "results/P9_Grand_Tour_Survivors.csv"
+UNVERIFIED_FILE = "results/P9_Grand_Tour_Unverified.csv"  # PS1 lookups that kept failing
+# Opt-in (or --movers): link survivors into intra-night tracklets from their
+# own nsc_dr2.meas detections (movers.py), one batched query set per sector.
+# Only survivors without a <sector>.movers.csv checkpoint result are queried.
+CONFIRM_MOVERS = False
+MOVERS_FILE = "results/P9_Grand_Tour_Movers.csv"
+
+# --- CHECKPOINTS ---
+# Every sector leaves two files in CHECKPOINT_DIR, both written atomically
+# (temp file + rename), so a crash never leaves a half-written checkpoint:
+#   <sector>.deep.csv    the NOIRLab answer (written once per sector)
+#   <sector>.checks.csv  PS1 verdict per deep row, rewritten every
+#                        CHECKPOINT_BATCH candidates
+# and, with CONFIRM_MOVERS, a third one per sector with survivors:
+#   <sector>.movers.csv  movers.py columns per survivor (ra, dec, mjd key)
+# With RESUME, finished sectors and already-verified candidates are skipped;
+# only missing sectors, unchecked rows and "unverified" rows are redone. The
+# output CSVs are always rebuilt from the checkpoints, so merging is
+# idempotent. 'python p9_full_grid_survey.py --fresh' starts over.
+CHECKPOINT_DIR = "results/checkpoints"
+CHECKPOINT_BATCH = 500
+RESUME = True
+
+# API Endpoints: NOIRLab TAP in noirlab.py, PS1 lookups in ps1.py
 
-# API Endpoints
-NSC_URL = "https://datalab.noirlab.edu/tap/sync"
-PS1_URL = "https://catalogs.mast.stsci.edu/api/v0.1/panstarrs/dr2/mean/search"
+# --- PIPELINE ---
+# NOIRLab drilling runs ahead of PS1 verification. Sectors are drilled
+# NSC_BATCH_SECTORS at a time, as one combined multi-cone query per batch;
+# the next PREFETCH_BATCHES batches are queried in the background
+# (NSC_CONCURRENCY at a time) while the current one is verified.
+# The window is the bounded queue: no new query starts until verification
+# takes a batch off it. Sectors are still verified and reported in survey
+# order.
+NSC_CONCURRENCY = 2     # NOIRLab queries in flight
+NSC_BATCH_SECTORS = 10  # sectors OR'd into one NOIRLab query (noirlab.query_cones)
+PREFETCH_BATCHES = 1    # batches (of NSC_BATCH_SECTORS sectors) drilled ahead of verification
+PS1_CONCURRENCY = 8     # PS1 lookups in flight (per-object mode)
+
+prefilter_counts = []   # count_prefilters() of every batch queried in this run
+
+def query_noirlab(targets):
+    """
+    Queries NOIRLab Source Catalog (Deep DECam Data) for a list of sectors in
+    combined multi-cone requests. Returns {sector id: DataFrame, or None on failure}.
+    """
+    for t in targets:
+        print(f"[*] Drilling {t['ra']}, {t['dec']} (Radius {t.get('radius', SEARCH_RADIUS)})...")
+    cones = [{'id': t['id'], 'ra': t['ra'], 'dec': t['dec'], 'radius': t.get('radius', SEARCH_RADIUS)}
+             for t in targets]
 
-def query_noirlab(ra, dec, radius):
-    """Queries NOIRLab Source Catalog (Deep DECam Data)"""
-    print(f"[*] Drilling {ra}, {dec} (Radius {radius})...")
-    
     # We ask for r-band mag between 22.0 and 24.5
     # We ensure it looks like a star (class_star > 0.8)
-    sql = f"""
-    SELECT ra, dec, rmag, mjd, class_star
-    FROM nsc_dr2.object
-    WHERE 
-      't' = q3c_radial_query(ra, dec, {ra}, {dec}, {radius})
-      AND rmag BETWEEN 22.0 AND 24.5
-      AND class_star > 0.8
+    # Batched, paged and streamed by noirlab.py, so many sectors cost few round trips
+    where = noirlab.prefilter_where("class_star > 0.8", NSC_PREFILTERS)
+    found = noirlab.query_cones(cones, select="ra, dec, rmag, mjd, class_star",
+                               where=where, mag_range=(22.0, 24.5), batch=NSC_BATCH_SECTORS)
+    if NSC_PREFILTERS and COUNT_PREFILTERS:
+        counts = noirlab.count_prefilters(cones, NSC_PREFILTERS, where="class_star > 0.8", mag_range=(22.0, 24.5))
+        noirlab.report_prefilters(counts)
+        if counts:
+            prefilter_counts.append(counts)
+    # None (not an empty frame) so a failed query is never checkpointed as an empty sector
+    return {sid: None if df is None else noirlab.standardize_mag(df) for sid, df in found.items()}
+
+# --- CHECKPOINT FILES ---
+def checkpoint_paths(sector_id):
+    base = os.path.join(CHECKPOINT_DIR, sector_id)
+    return base + ".deep.csv", base + ".checks.csv"
+
+def movers_path(sector_id):
+    return os.path.join(CHECKPOINT_DIR, sector_id + ".movers.csv")
+
+def survey_targets(tiles=TILE_TRACK):
+    """The sectors to scan: HEALPix tiles along the TARGETS track, or the TARGETS drill holes themselves."""
+    if tiles:
+        return orbit_tiles.tile_targets([(t['ra'], t['dec']) for t in TARGETS])
+    return TARGETS
+
+def load_deep(targets):
+    """
+    NOIRLab candidates of a batch of sectors: from their checkpoints, the
+    rest queried together and checkpointed. Returns {sector id: DataFrame or None on failure}.
+    """
+    deep = {}
+    missing = []
+    for target in targets:
+        deep_path, _ = checkpoint_paths(target['id'])
+        if RESUME and os.path.exists(deep_path):
+            deep[target['id']] = pd.read_csv(deep_path)
+        else:
+            missing.append(target)
+    if len(deep):
+        print(f"    > Deep candidates of {len(deep)} sectors from checkpoints")
+    if not missing:
+        return deep
+
+    found = query_noirlab(missing)
+    for target in missing:
+        df = found[target['id']]
+        if df is not None:
+            # A tile keeps only its own sources, so overlapping tile cones never report one twice
+            if not df.empty:
+                df = df[orbit_tiles.tile_owns(target, df['ra'], df['dec'])].reset_index(drop=True)
+            atomic_to_csv(df, checkpoint_paths(target['id'])[0])
+        deep[target['id']] = df
+    return deep
+
+def load_checks(target):
+    """PS1 verdicts checkpointed so far: DataFrame(row, status, ps1_id)."""
+    _, checks_path = checkpoint_paths(target['id'])
+    if RESUME and os.path.exists(checks_path):
+        return pd.read_csv(checks_path, dtype={'ps1_id': str})
+    return pd.DataFrame({'row': pd.Series(dtype='int64'), 'status': pd.Series(dtype=str),
+                         'ps1_id': pd.Series(dtype=str)})
+
+def verify_sector(target, df):
+    """
+    Verifies the sector's candidates that have no final verdict yet, in
+    batches, checkpointing after each batch. Returns the verdict table.
+    """
+    _, checks_path = checkpoint_paths(target['id'])
+    checks = load_checks(target)
+    final = checks.loc[checks['status'] != 'unverified', 'row']
+    pending = df.index[~df.index.isin(final)]
+    if len(final):
+        print(f"    > {len(final)} candidates already verified, {len(pending)} to go")
+
+    for start in range(0, len(pending), CHECKPOINT_BATCH):
+        batch = df.loc[pending[start:start + CHECKPOINT_BATCH]]
+        print(f"    > Verifying {len(batch)} objects against Pan-STARRS...")
+
+        # Results come back in row order either way
+        if PS1_REFCAT:
+            results = verify_ps1_local(batch['ra'], batch['dec'], PS1_REFCAT, concurrency=PS1_CONCURRENCY)
+        elif PS1_SECTOR_FETCH:
+            results = verify_ps1_bulk(batch['ra'], batch['dec'], target['ra'], target['dec'],
+                                      target.get('radius', SEARCH_RADIUS), concurrency=PS1_CONCURRENCY)
+        else:
+            results = verify_ps1(batch['ra'], batch['dec'], concurrency=PS1_CONCURRENCY)  # rate-limited
+        status = ps1_status(results)
+        new = pd.DataFrame({'row': batch.index, 'status': status,
+                            'ps1_id': [None if s != 'static' else str(r[1]) for s, r in zip(status, results)]})
+
+        for (i, row), s in zip(batch.iterrows(), status):
+            # Highlight Bright Ghosts immediately
+            if s == 'survivor' and row['mag'] < 23.3:
+                print(f"      [!] BRIGHT GHOST: Mag {row['mag']:.2f} at {row['ra']:.5f}, {row['dec']:.5f}")
+
+        checks = pd.concat([checks[~checks['row'].isin(batch.index)], new]).sort_values('row')
+        atomic_to_csv(checks, checks_path)
+    return checks
+
+def drill_ahead(targets, workers=NSC_CONCURRENCY, depth=PREFETCH_BATCHES, batch=NSC_BATCH_SECTORS):
     """
-    params = {'request': 'doQuery', 'lang': 'ADQL', 'format': 'csv', 'query': sql}
-    
-    try:
-        r = requests.post(NSC_URL, data=params)
-        if r.status_code == 200:
-            if "ERROR" in r.text[:200].upper() or "<VOTABLE" in r.text[:200]: 
-                print(f"[!] NOIRLab Error: {r.text[:100]}")
-                return pd.DataFrame()
-                
-            data = StringIO(r.text)
-            df = pd.read_csv(data)
-            df.columns = df.columns.str.strip().str.lower()
-            
-            # Robustly find the magnitude column
-            mag_col = next((c for c in df.columns if 'rmag' in c), None)
-            if mag_col:
-                df = df.rename(columns={mag_col: 'mag'})
-                return df
-            elif len(df.columns) > 2:
-                 df = df.rename(columns={df.columns[2]: 'mag'})
-                 return df
-    except Exception as e:
-        print(f"[!] Network Error: {e}")
-    return pd.DataFrame()
-
-def check_ps1(ra, dec):
-    """Queries Pan-STARRS to see if a static star exists there"""
-    params = {'ra': ra, 'dec': dec, 'radius': 0.000833, 'format': 'json'}
-    try:
-        r = requests.get(PS1_URL, params=params, timeout=4)
-        if r.status_code == 200 and len(r.json()) > 0:
-            return True # Static Star Found
-    except:
-        return True # Fail safe
-    return False
+    Yields (target, deep candidates or None) in survey order. Sectors are
+    drilled in batches of 'batch' (one combined NOIRLab query each) while
+    the next 'depth' batches run in the background.
+    """
+    batch = max(1, batch)
+    groups = [targets[i:i + batch] for i in range(0, len(targets), batch)]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        window = deque()
+        for group in groups:
+            window.append((group, pool.submit(load_deep, group)))
+            while len(window) > depth:
+                done, future = window.popleft()
+                deep = future.result()
+                for target in done:
+                    yield target, deep[target['id']]
+        while window:
+            done, future = window.popleft()
+            deep = future.result()
+            for target in done:
+                yield target, deep[target['id']]
+
+def confirm_sector_movers(sector_id, survivors):
+    """
+    Mover columns (movers.py) for one sector's survivors. Results are
+    checkpointed per sector, so only survivors not linked in an earlier run
+    are queried. Returns survivors with the mover_* columns, or None if the
+    NOIRLab query failed.
+    """
+    keys = ['ra', 'dec', 'mjd']
+    path = movers_path(sector_id)
+    # round_trip: the keys must read back bit-identical to be matched
+    done = pd.read_csv(path, float_precision='round_trip') if RESUME and os.path.exists(path) else None
+    new = survivors
+    if done is not None:
+        new = survivors[~pd.MultiIndex.from_frame(survivors[keys]).isin(pd.MultiIndex.from_frame(done[keys]))]
+    if len(new):
+        linked = movers.confirm_movers(new)
+        if linked is None:
+            return None
+        linked = linked[keys + [c for c in linked.columns if c.startswith('mover_')]]
+        done = linked if done is None else pd.concat([done, linked], ignore_index=True)
+        atomic_to_csv(done, path)
+    return survivors.merge(done, on=keys, how='left')
+
+def merge_results(targets):
+    """
+    Rebuilds the survivor and unverified CSVs from the checkpoints of every
+    sector (in 'targets' order). Running it twice gives the same files.
+    Returns (survivors, unverified, total deep candidates).
+    """
+    parts = {'survivor': [], 'unverified': []}
+    total = 0
+    for target in targets:
+        deep_path, checks_path = checkpoint_paths(target['id'])
+        if not os.path.exists(deep_path):
+            continue
+        df = pd.read_csv(deep_path)
+        total += len(df)
+        if not os.path.exists(checks_path) or df.empty:
+            continue
+        checks = pd.read_csv(checks_path, dtype={'ps1_id': str})
+        for status, rows in parts.items():
+            picked = df.loc[checks.loc[checks['status'] == status, 'row']].copy()
+            picked['sector'] = target['id']
+            rows.append(picked)
+
+    out = {}
+    for status, path in (('survivor', OUTPUT_FILE), ('unverified', UNVERIFIED_FILE)):
+        frame = pd.concat(parts[status]) if parts[status] else pd.DataFrame()
+        if len(frame):
+            frame = frame.drop_duplicates(subset=['ra', 'dec', 'mjd'])
+        if len(frame):
+            atomic_to_csv(frame, path)
+        elif os.path.exists(path):
+            os.remove(path)
+        out[status] = frame
+    return out['survivor'], out['unverified'], total
 
 # --- MAIN EXECUTION ---
-if not os.path.exists('results'):
-    os.makedirs('results')
-
-print(f"--- PLANET NINE GRAND TOUR SURVEY ---")
-print(f"Targets: {len(TARGETS)} Sectors (RA 30 to 121)")
-print("Filters: Mag 22.0 - 24.5 | Star-like | Missing in Pan-STARRS")
-
-master_survivors = []
-total_deep_candidates = 0
-
-for target in TARGETS:
-    print(f"\n>>> SCANNING: {target['id']}")
-    df = query_noirlab(target['ra'], target['dec'], SEARCH_RADIUS)
-    count = len(df)
-    total_deep_candidates += count
-    print(f"    > Deep Candidates: {count}")
-    
-    if not df.empty:
-        # Artifact Filter: Remove exact 22.000000 (Saturation/Flag)
-        df = df[df['mag'] != 22.0]
-        
-        if df.empty:
-            print("    > No valid candidates after artifact cleaning.")
+def main():
+    if "--fresh" in sys.argv[1:] and os.path.isdir(CHECKPOINT_DIR):
+        for name in os.listdir(CHECKPOINT_DIR):
+            os.remove(os.path.join(CHECKPOINT_DIR, name))
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+
+    tiles = TILE_TRACK or "--tiles" in sys.argv[1:]
+    targets = survey_targets(tiles)
+    print(f"--- PLANET NINE GRAND TOUR SURVEY ---")
+    if tiles:
+        print(f"Targets: {len(targets)} HEALPix tiles, +/-{orbit_tiles.BAND_DEG} deg around the track (RA 30 to 121)")
+    else:
+        print(f"Targets: {len(targets)} Sectors (RA 30 to 121)")
+    prefilters = "".join(f" | {k} {v}" for k, v in NSC_PREFILTERS.items())
+    print(f"Filters: Mag 22.0 - 24.5 | Star-like{prefilters} | Missing in Pan-STARRS")
+
+    failed_sectors = []
+
+    for target, df in drill_ahead(targets, NSC_CONCURRENCY, PREFETCH_BATCHES, NSC_BATCH_SECTORS):
+        print(f"\n>>> SCANNING: {target['id']}")
+        if df is None:
+            print("    > NOIRLab query failed; sector left for the next run.")
+            failed_sectors.append(target['id'])
             continue
+        print(f"    > Deep Candidates: {len(df)}")
+
+        if not df.empty:
+            # Artifact Filter: Remove exact 22.000000 (Saturation/Flag)
+            df = df[df['mag'] != 22.0]
+
+            if df.empty:
+                print("    > No valid candidates after artifact cleaning.")
+                continue
+
+            checks = verify_sector(target, df)
+            if not (checks['status'] == 'survivor').any():
+                print(f"    > Sector Clean.")
+        else:
+            print("    > No candidates found in deep search.")
+
+    master_survivors, unverified, total_deep_candidates = merge_results(targets)
 
-        print(f"    > Verifying {len(df)} objects against Pan-STARRS...")
-        sector_survivors = 0
-        
-        for i, row in df.iterrows():
-            if not check_ps1(row['ra'], row['dec']):
-                # Highlight Bright Ghosts immediately
-                if row['mag'] < 23.3:
-                    print(f"      [!] BRIGHT GHOST: Mag {row['mag']:.2f} at {row['ra']:.5f}, {row['dec']:.5f}")
-                
-                row['sector'] = target['id']
-                master_survivors.append(row)
-                sector_survivors += 1
-            
-            if i % 20 == 0: time.sleep(0.05)
-            
-        if sector_survivors == 0:
-            print(f"    > Sector Clean.")
+    print("\n" + "="*60)
+    print(f"GRAND TOUR COMPLETE.")
+    print(f"Total Objects Scanned: {total_deep_candidates}")
+    print(f"Total Survivors (Movers): {len(master_survivors)}")
+    print("="*60)
+
+    if (CONFIRM_MOVERS or "--movers" in sys.argv[1:]) and len(master_survivors):
+        print(f"\n[*] Linking survivors with their NSC measurements...")
+        parts, failed_movers = [], []
+        for sector, rows in master_survivors.groupby('sector', sort=False):
+            linked = confirm_sector_movers(sector, rows)
+            if linked is None:
+                failed_movers.append(sector)
+            else:
+                parts.append(linked)
+        linked = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['mover_status'])
+        confirmed = linked[linked['mover_status'] != 'none']
+        print(f"    > {len(confirmed)} survivors move in their own night "
+              f"({int((confirmed['mover_status'] == 'tracklet').sum())} tracklets of 3+).")
+        if len(confirmed):
+            atomic_to_csv(confirmed, MOVERS_FILE)
+            print(f"    > Saved to '{MOVERS_FILE}'")
+        if failed_movers:
+            print(f"[!] Measurement queries failed for {len(failed_movers)} sectors; re-run with --movers to retry.")
+    http_client.report()
+    if prefilter_counts:
+        totals = {k: sum(c.get(k, 0) for c in prefilter_counts) for k in prefilter_counts[0]}
+        noirlab.report_prefilters(totals, label="Pre-filters this run")
+
+    if failed_sectors:
+        print(f"\n[!] {len(failed_sectors)} sectors not scanned ({', '.join(failed_sectors)}). Re-run to resume.")
+
+    if len(unverified):
+        print(f"\n[!] {len(unverified)} objects could not be checked against PS1. Saved to '{UNVERIFIED_FILE}'")
+        print("    Re-run to retry them; verified candidates are not queried again.")
+
+    if len(master_survivors):
+        print(f"\n[ACTION] Data saved to '{OUTPUT_FILE}'")
+        print("[NEXT STEP] Run 'analyze_survivors.py' to update the map.")
     else:
-        print("    > No candidates found in deep search.")
-
-print("\n" + "="*60)
-print(f"GRAND TOUR COMPLETE.")
-print(f"Total Objects Scanned: {total_deep_candidates}")
-print(f"Total Survivors (Movers): {len(master_survivors)}")
-print("="*60)
-
-if master_survivors:
-    final_df = pd.DataFrame(master_survivors)
-    final_df.to_csv(OUTPUT_FILE, index=False)
-    print(f"\n[ACTION] Data saved to '{OUTPUT_FILE}'")
-    print("[NEXT STEP] Run 'analyze_survivors.py' to update the map.")
-else:
-    print("No candidates found.")
\ No newline at end of file
+        print("No candidates found.")
+
+if __name__ == "__main__":
+    main()
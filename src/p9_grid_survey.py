@@ -1,8 +1,7 @@
-import requests
-import pandas as pd
-from io import StringIO
-import time
-from astropy.time import Time
+import sys
+
+import http_client
+from pipeline import run_pipeline
 
 # --- CONFIGURATION: THE P9 ORBIT TRACK (2025) ---
 # Four "Drill Holes" along the high-probability resonance line
@@ -13,86 +12,57 @@ TARGETS = [
     {"id": "SECTOR_DELTA", "ra": 64.0, "dec": -16.0}  # Deep Eridanus
 ]
 SEARCH_RADIUS = 0.25 # Slightly wider
+PREFILTERS = {}  # optional server-side cuts (noirlab.PREFILTERS), e.g. {'deltamjd_max': 1.0}: movers span < 1 day
+# Opt-in (or --movers): link survivors into intra-night tracklets from their
+# own nsc_dr2.meas detections (movers.py), as in p9_full_grid_survey.py.
+CONFIRM_MOVERS = False
 
-# NOIRLab & Pan-STARRS Endpoints
-NSC_URL = "https://datalab.noirlab.edu/tap/sync"
-PS1_URL = "https://catalogs.mast.stsci.edu/api/v0.1/panstarrs/dr2/mean/search"
-
-def query_noirlab(ra, dec, radius):
-    print(f"[*] Drilling {ra}, {dec} (Radius {radius})...")
-    sql = f"""
-    SELECT ra, dec, rmag, mjd, class_star
-    FROM nsc_dr2.object
-    WHERE 
-      't' = q3c_radial_query(ra, dec, {ra}, {dec}, {radius})
-      AND rmag BETWEEN 22.5 AND 24.5
-      AND class_star > 0.8
-    """
-    params = {'request': 'doQuery', 'lang': 'ADQL', 'format': 'csv', 'query': sql}
-    try:
-        r = requests.post(NSC_URL, data=params)
-        if r.status_code == 200 and "ERROR" not in r.text[:200].upper():
-            data = StringIO(r.text)
-            df = pd.read_csv(data)
-            df.columns = df.columns.str.strip().str.lower()
-            
-            # Find mag col
-            mag_candidates = [c for c in df.columns if 'rmag' in c]
-            mag_col = mag_candidates[0] if mag_candidates else df.columns[2]
-            
-            # Standardize column names for the df
-            df = df.rename(columns={mag_col: 'mag'})
-            return df
-    except Exception as e:
-        print(f"[!] NOIRLab Error: {e}")
-    return pd.DataFrame()
+LINK_MOVERS = CONFIRM_MOVERS or "--movers" in sys.argv[1:]
 
-def check_ps1(ra, dec):
-    params = {'ra': ra, 'dec': dec, 'radius': 0.000833, 'format': 'json'}
-    try:
-        r = requests.get(PS1_URL, params=params, timeout=5)
-        if r.status_code == 200 and len(r.json()) > 0:
-            return True # Found in PS1
-    except:
-        return True # Fail safe
-    return False
+# The survey as pipeline stages (see pipeline.py). Every stage's output is
+# cached under a hash of its inputs and parameters: re-running skips NOIRLab
+# and PS1 entirely, and editing a later stage only recomputes from there.
+STAGES = [
+    {'stage': 'noirlab', 'targets': TARGETS, 'radius': SEARCH_RADIUS, 'mag_range': [22.5, 24.5],
+     'prefilters': PREFILTERS},
+    {'stage': 'ps1', 'mode': 'object'},
+    {'stage': 'save', 'path': "P9_Grid_Unverified.csv", 'query': "ps1_status == 'unverified'"},
+    {'stage': 'survivors'},
+] + ([{'stage': 'movers'}] if LINK_MOVERS else []) + [
+    {'stage': 'save', 'name': 'final', 'path': "P9_Grid_Survivors.csv"},
+]
 
 # --- MAIN EXECUTION ---
 print(f"--- PLANET NINE GRID SURVEY (AUTONOMOUS) ---")
-master_survivors = []
+outputs = run_pipeline(STAGES)
+checked, final_df = outputs['ps1'], outputs['final']
 
 for target in TARGETS:
-    print(f"\n>>> INITIATING SCAN: {target['id']}")
-    
-    # 1. Deep Search
-    df = query_noirlab(target['ra'], target['dec'], SEARCH_RADIUS)
-    print(f"    > Deep Candidates Found: {len(df)}")
-    
-    if not df.empty:
-        # 2. Cross Match
-        print(f"    > Cross-matching against Pan-STARRS...")
-        sector_survivors = 0
-        for i, row in df.iterrows():
-            if not check_ps1(row['ra'], row['dec']):
-                print(f"      [!] UNIQUE HIT: Mag {row['mag']:.2f} at {row['ra']:.5f}, {row['dec']:.5f}")
-                row['sector'] = target['id']
-                master_survivors.append(row)
-                sector_survivors += 1
-            # Slight delay to be nice to API
-            if i % 10 == 0: time.sleep(0.1)
-            
-        if sector_survivors == 0:
-            print(f"    > Result: All matched. Sector Clear.")
+    hits = final_df[final_df['sector'] == target['id']] if len(final_df) else final_df
+    print(f"\n>>> SCAN: {target['id']}")
+    for row in hits.itertuples():
+        moving = LINK_MOVERS and row.mover_status != 'none'
+        motion = f" | {row.mover_status} {row.mover_rate:.2f}\"/hr" if moving else ""
+        print(f"      [!] UNIQUE HIT: Mag {row.mag:.2f} at {row.ra:.5f}, {row.dec:.5f}{motion}")
+    if hits.empty:
+        print(f"    > Result: All matched. Sector Clear.")
 
 print("\n" + "="*60)
-print(f"SURVEY COMPLETE. TOTAL SURVIVORS: {len(master_survivors)}")
+print(f"SURVEY COMPLETE. TOTAL SURVIVORS: {len(final_df)}")
 print("="*60)
+http_client.report()
+
+n_unverified = int((checked['ps1_status'] == 'unverified').sum()) if len(checked) else 0
+if n_unverified:
+    print(f"[!] {n_unverified} objects could not be checked against PS1. Saved to 'P9_Grid_Unverified.csv'")
 
-if master_survivors:
-    final_df = pd.DataFrame(master_survivors)
-    print(final_df[['sector', 'ra', 'dec', 'mag', 'mjd']].to_string(index=False))
-    final_df.to_csv("P9_Grid_Survivors.csv", index=False)
+if len(final_df):
+    columns = ['sector', 'ra', 'dec', 'mag', 'mjd'] + (['mover_status', 'mover_rate'] if LINK_MOVERS else [])
+    print(final_df[columns].to_string(index=False))
+    if LINK_MOVERS:
+        n_linked = int((final_df['mover_status'] != 'none').sum())
+        print(f"\n[*] {n_linked} survivors confirmed moving in their own night's NSC measurements.")
     print("\n[ACTION] Check 'P9_Grid_Survivors.csv'. These are the Movers.")
 else:
     print("The sky is static in all sectors. Planet Nine is either fainter than Mag 24.5")
-    print("or currently outside these 4 probability zones.")
\ No newline at end of file
+    print("or currently outside these 4 probability zones.")
@@ -0,0 +1,60 @@
+# --- CONFIGURATION: THE PLANET NINE "GRAND TOUR" TRACK ---
+# Covering every probability zone from the Northern Limit to the Galactic Edge.
+# Ordered by Right Ascension (RA).
+# Plain constants, no imports: the Grand Tour and the offline ITF scripts
+# (find_p9.py, find_p9_local.py) share them.
+
+TARGETS = [
+    # --- PHASE 0: THE NORTHERN LIMIT (PISCES / CETUS) ---
+    # "Low Probability" - If P9 is closer/faster than models predict.
+    {"id": "SECTOR_ZERO_A", "ra": 30.0, "dec": 2.0},
+    {"id": "SECTOR_ZERO_B", "ra": 33.0, "dec": 0.0},
+    {"id": "SECTOR_ZERO_C", "ra": 36.0, "dec": -1.0},
+
+    # --- PHASE 3: LEADING EDGE (CETUS) ---
+    {"id": "SECTOR_ZETA",   "ra": 40.0, "dec": -2.0}, 
+    {"id": "SECTOR_ETA",    "ra": 45.0, "dec": -5.0},
+    {"id": "SECTOR_THETA_P","ra": 50.0, "dec": -8.0},
+
+    # --- PHASE 1: THE CORE (TAURUS / ERIDANUS BORDER) ---
+    # The "Batygin Box" - Highest Probability Resonance Zone
+    {"id": "SECTOR_ALPHA",  "ra": 55.0, "dec": -10.0}, # Alpha-1 Found Here
+    {"id": "SECTOR_BETA",   "ra": 58.0, "dec": -12.0}, 
+    {"id": "SECTOR_GAMMA",  "ra": 61.0, "dec": -14.0}, 
+    {"id": "SECTOR_DELTA",  "ra": 64.0, "dec": -16.0},
+
+    # --- PHASE 2: DEEP ERIDANUS ---
+    {"id": "SECTOR_THETA",  "ra": 67.0, "dec": -18.0}, 
+    {"id": "SECTOR_IOTA",   "ra": 70.0, "dec": -20.0}, # Iota-1 Found Here
+    {"id": "SECTOR_KAPPA",  "ra": 73.0, "dec": -22.0}, 
+    {"id": "SECTOR_LAMBDA", "ra": 76.0, "dec": -24.0},
+
+    # --- PHASE 3: TRAILING EDGE ---
+    {"id": "SECTOR_MU",     "ra": 79.0, "dec": -26.0},
+    {"id": "SECTOR_NU",     "ra": 82.0, "dec": -28.0},
+    {"id": "SECTOR_XI",     "ra": 85.0, "dec": -30.0},
+
+    # --- PHASE 4: THE SOUTHERN TURN (FORNAX) ---
+    # Poorly mapped by Northern surveys. High discovery potential.
+    {"id": "SECTOR_OMICRON","ra": 88.0, "dec": -32.0},
+    {"id": "SECTOR_PI",     "ra": 91.0, "dec": -34.0},
+    {"id": "SECTOR_RHO",    "ra": 94.0, "dec": -36.0},
+    {"id": "SECTOR_SIGMA",  "ra": 97.0, "dec": -38.0},
+
+    # --- PHASE 5: THE TAIL (PHOENIX) ---
+    # Deep South. Galactic latitude density starts increasing.
+    {"id": "SECTOR_TAU",    "ra": 100.0, "dec": -40.0},
+    {"id": "SECTOR_UPSILON","ra": 103.0, "dec": -42.0},
+    {"id": "SECTOR_PHI",    "ra": 106.0, "dec": -44.0},
+    {"id": "SECTOR_CHI",    "ra": 109.0, "dec": -46.0},
+
+    # --- PHASE 6: THE GALACTIC EDGE (COLUMBA / PUPPIS) ---
+    # "Lowest of Low Probabilities" - The orbit dives into the Milky Way plane.
+    # Extremely high star density makes detection very difficult.
+    {"id": "SECTOR_PSI",    "ra": 112.0, "dec": -48.0},
+    {"id": "SECTOR_OMEGA",  "ra": 115.0, "dec": -50.0},
+    {"id": "SECTOR_INF_A",  "ra": 118.0, "dec": -52.0},
+    {"id": "SECTOR_INF_B",  "ra": 121.0, "dec": -54.0}
+]
+
+SEARCH_RADIUS = 0.25  # 15 arcmin radius per drill hole
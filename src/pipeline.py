@@ -0,0 +1,212 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+import movers
+import noirlab
+from itf_cache import file_sha256
+from ps1 import (MATCH_RADIUS, PS1_CONCURRENCY, PS1_MAX_RPS, ps1_status, verify_ps1, verify_ps1_bulk,
+                 verify_ps1_local)
+
+# --- DECLARATIVE SURVEY PIPELINE ---
+# A survey is a list of stages, each a dict: {'stage': <name in STAGES>,
+# 'name': <optional label>, **params}. Stage k gets stage k-1's DataFrame
+# (None for the first) and returns a new one.
+#
+# Every stage output is cached in PIPELINE_CACHE under a key that chains the
+# upstream key, the stage name, its parameters and PIPELINE_VERSION (plus
+# the content hash of any 'path' input). Changing one parameter, e.g. the
+# bright-ghost cut, changes that stage's key and every key downstream of it;
+# the stages above it are read back from the cache.
+#
+# 'save' stages are sinks: they always run (writing is cheap and the file
+# may have been removed). A stage can mark its output uncacheable (e.g. PS1
+# lookups that failed); neither it nor anything downstream is cached, so a
+# re-run retries it.
+
+PIPELINE_CACHE = "pipeline_cache"
+PIPELINE_VERSION = 1
+
+
+def stage_key(upstream, step):
+    """Cache key of a stage: hash of the upstream key, the stage and its parameters."""
+    params = {k: v for k, v in step.items() if k != 'name'}
+    if 'path' in params and step['stage'] not in SINKS and os.path.exists(params['path']):
+        params['path_sha256'] = file_sha256(params['path'])
+    blob = json.dumps({'upstream': upstream, 'version': PIPELINE_VERSION, 'params': params},
+                      sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()[:16]
+
+
+def _cache_path(cache_dir, step, key):
+    return os.path.join(cache_dir, f"{step['stage']}-{key}.csv")
+
+
+def atomic_to_csv(df, path):
+    """Writes a CSV via a temp file + rename: readers see the old file or the new one, never half of one."""
+    tmp = path + ".tmp"
+    df.to_csv(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def run_pipeline(steps, cache_dir=PIPELINE_CACHE, refresh=False):
+    """
+    Runs a survey's stages in order, reusing cached outputs.
+    Returns {stage label: DataFrame}; the label is step['name'] or the stage name.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    outputs = {}
+    df, key = None, ""
+    incomplete = False
+    for step in steps:
+        label = step.get('name', step['stage'])
+        key = stage_key(key, step)
+        path = _cache_path(cache_dir, step, key)
+        params = {k: v for k, v in step.items() if k not in ('stage', 'name')}
+
+        if step['stage'] not in SINKS and not (refresh or incomplete) and os.path.exists(path):
+            df = pd.read_csv(path, keep_default_na=False, na_values=[''])
+            print(f"[*] {label}: {len(df)} rows (cached {key})")
+        else:
+            df = STAGES[step['stage']](df, **params)
+            # Whatever is computed from an incomplete table is incomplete too
+            incomplete = incomplete or bool(df.attrs.get('no_cache'))
+            if step['stage'] not in SINKS:
+                if incomplete:
+                    print(f"[*] {label}: {len(df)} rows (not cached: incomplete)")
+                else:
+                    atomic_to_csv(df, path)
+                    print(f"[*] {label}: {len(df)} rows")
+        outputs[label] = df
+    return outputs
+
+
+# --- STAGES ---
+
+def stage_noirlab(df, targets, radius, mag_range, class_star_min=0.8, prefilters=None, count_prefilters=False,
+                  select="ra, dec, rmag, mjd, class_star", mag_column='mag', tag_sector=True):
+    """
+    NOIRLab deep detections in a cone per target, fetched in combined
+    multi-cone queries (noirlab.query_cones), optionally tagged with the
+    target id. 'prefilters' ({name: value}, see noirlab.PREFILTERS) are
+    applied server-side; count_prefilters reports the rows they remove (one
+    extra query). Failed targets are skipped and the output is not cached.
+    """
+    for target in targets:
+        print(f"[*] Drilling {target['ra']}, {target['dec']} (Radius {radius})...")
+    cones = [dict(target, radius=radius) for target in targets]
+    base = f"class_star > {class_star_min}"
+    found = noirlab.query_cones(cones, select=select, where=noirlab.prefilter_where(base, prefilters),
+                                mag_range=tuple(mag_range))
+    if prefilters and count_prefilters:
+        noirlab.report_prefilters(noirlab.count_prefilters(cones, prefilters, where=base,
+                                                           mag_range=tuple(mag_range)))
+    frames, failed = [], []
+    for target in targets:
+        rows = found[target['id']]
+        if rows is None:
+            print(f"    > [!] {target['id']} failed; skipped for this run")
+            failed.append(target['id'])
+            continue
+        rows = noirlab.standardize_mag(rows)
+        if mag_column != 'mag':
+            rows = rows.rename(columns={'mag': mag_column})
+        if tag_sector:
+            rows['sector'] = target['id']
+        print(f"    > {target['id']}: {len(rows)} deep candidates")
+        frames.append(rows)
+    out = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['ra', 'dec', mag_column])
+    out.attrs['no_cache'] = bool(failed)
+    return out
+
+
+def stage_load_csv(df, path):
+    """A CSV input (its content hash is part of the cache key)."""
+    return pd.read_csv(path)
+
+
+def stage_drop_mag(df, value=22.0):
+    """Artifact filter: drops the exact saturation/flag magnitude."""
+    return df[df['mag'] != value].reset_index(drop=True)
+
+
+def stage_ps1(df, radius=MATCH_RADIUS, mode='object', targets=None, sector_radius=None,
+              catalog=None, offline=False, concurrency=PS1_CONCURRENCY, max_rps=PS1_MAX_RPS):
+    """
+    Pan-STARRS verdict per row: adds ps1_status (static / survivor /
+    unverified) and ps1_id. mode='sector' fetches one catalog per target
+    (rows grouped by 'sector'); mode='local' matches against a local extract
+    ('catalog', see refcat.py). Outputs with unverified rows are not cached.
+    """
+    results = [None] * len(df)
+    if mode == 'local':
+        results = verify_ps1_local(df['ra'], df['dec'], catalog, radius=radius, offline=offline,
+                                   concurrency=concurrency, max_rps=max_rps)
+    elif mode == 'sector':
+        centres = {t['id']: t for t in targets}
+        for sector, rows in df.groupby('sector', sort=False).indices.items():
+            t = centres[sector]
+            checks = verify_ps1_bulk(df['ra'].values[rows], df['dec'].values[rows], t['ra'], t['dec'],
+                                     sector_radius, radius=radius, concurrency=concurrency, max_rps=max_rps)
+            for i, res in zip(rows, checks):
+                results[i] = res
+    else:
+        results = verify_ps1(df['ra'], df['dec'], radius=radius, concurrency=concurrency, max_rps=max_rps)
+
+    status = ps1_status(results)
+    out = df.copy()
+    out['ps1_status'] = status
+    out['ps1_id'] = [str(ps1_id) if s == 'static' else '' for s, (_, ps1_id) in zip(status, results)]
+    out.attrs['no_cache'] = 'unverified' in status
+    return out
+
+
+def stage_survivors(df):
+    """Rows PS1 did not see (the PS1 columns are dropped again)."""
+    return df[df['ps1_status'] == 'survivor'].drop(columns=['ps1_status', 'ps1_id']).reset_index(drop=True)
+
+
+def stage_movers(df, **link_args):
+    """
+    Intra-night motion of every row from its nsc_dr2.meas detections (see
+    movers.py): adds mover_status / mover_points / mover_rate / mover_pa /
+    mover_rms. If a query fails the rows are kept unlinked and not cached.
+    """
+    out = movers.confirm_movers(df, **link_args)
+    if out is None:
+        out = df.join(movers.link_movers(df, None))
+        out.attrs['no_cache'] = True
+    return out
+
+
+def stage_bright_split(df, cut=23.3):
+    """The 'bright ghosts': rows bright enough (mag <= cut) that PS1 should have seen them."""
+    return df[df['mag'] <= cut].reset_index(drop=True)
+
+
+def stage_sort(df, by, ascending=True):
+    return df.sort_values(by, ascending=ascending).reset_index(drop=True)
+
+
+def stage_save(df, path, query=None):
+    """Writes the current table (optionally filtered with DataFrame.query) to 'path'."""
+    out = df.query(query) if query else df
+    if len(out):
+        out.to_csv(path, index=False)
+    return df
+
+
+STAGES = {
+    'noirlab': stage_noirlab,
+    'load_csv': stage_load_csv,
+    'drop_mag': stage_drop_mag,
+    'ps1': stage_ps1,
+    'survivors': stage_survivors,
+    'movers': stage_movers,
+    'bright_split': stage_bright_split,
+    'sort': stage_sort,
+    'save': stage_save,
+}
+SINKS = {'save'}
@@ -0,0 +1,257 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+
+import http_client
+import ps1_cache
+import refcat
+from skycells import angsep, crossmatch
+
+# --- PAN-STARRS DR2 VERIFICATION ---
+# Shared by cross_match.py, p9_grid_survey.py and p9_full_grid_survey.py.
+# verify_ps1() runs the per-candidate cone searches concurrently: up to
+# PS1_CONCURRENCY requests are in flight and the PS1 host's token bucket in
+# http_client.py keeps the rate under PS1_MAX_RPS. With enough concurrency
+# the wall time is set by the rate ceiling instead of by round-trip latency.
+#
+# verify_ps1_bulk() is the sector mode: the PS1 catalog for the whole drill
+# hole is fetched once (paged) and every candidate is matched locally, so a
+# sector costs a few requests instead of one per candidate.
+#
+# verify_ps1_local() answers from a local PS1 extract (refcat.py) without
+# any network call; only positions outside the extract's footprint fall back
+# to verify_ps1(), or are left unverified when running offline.
+#
+# Both network modes go through the persistent cache in ps1_cache.py (PS1_CACHE_FILE,
+# None disables it): answers already known, from an earlier lookup or from a
+# cached sector catalog covering the position, never hit the network again.
+#
+# Fail safe: a lookup that still fails after http_client's retries is
+# re-queued behind the others (PS1_REQUEUE_ROUNDS); if it never succeeds it
+# comes back as (True, "Error") so it cannot become a survivor, and callers
+# keep those rows as unverified instead of dropping them. Errors are not
+# cached.
+
+PS1_URL = "https://catalogs.mast.stsci.edu/api/v0.1/panstarrs/dr2/mean/search"
+MATCH_RADIUS = 0.000833   # 3 arcseconds (standard matching radius)
+PS1_TIMEOUT = 10
+PS1_CONCURRENCY = 8
+PS1_MAX_RPS = 10.0
+PS1_REQUEUE_ROUNDS = 2
+PS1_REQUEUE_DELAY = 10.0   # seconds before each re-queue round
+
+PS1_BULK_URL = "https://catalogs.mast.stsci.edu/api/v0.1/panstarrs/dr2/mean.csv"
+PS1_PAGE_SIZE = 50000
+PS1_BULK_TIMEOUT = 120
+
+PS1_CACHE_FILE = ps1_cache.CACHE_FILE
+
+
+def ps1_lookup(ra, dec, radius=MATCH_RADIUS, timeout=PS1_TIMEOUT):
+    """
+    One PS1 mean-object cone search.
+    Returns (exists, objid): (True, objID) on a match, (False, None) for empty
+    sky and (True, "Error") when the lookup failed (fail safe).
+    """
+    params = {'ra': ra, 'dec': dec, 'radius': radius, 'format': 'json', 'sort_by': 'distance'}
+    try:
+        r = http_client.get(PS1_URL, params=params, timeout=timeout)
+        if r.status_code != 200:
+            return True, "Error"
+        data = r.json()
+        if len(data) > 0:
+            return True, data[0].get('objID')
+        return False, None
+    except Exception as e:
+        print(f"[!] PS1 Connection Error: {e}")
+        return True, "Error"
+
+
+def ps1_status(results):
+    """Verdict of every (exists, objid) result: 'static', 'survivor' or 'unverified' (the lookup failed)."""
+    return ['unverified' if ps1_id == "Error" else ('static' if in_ps1 else 'survivor') for in_ps1, ps1_id in results]
+
+
+def _verify(coords, radius, concurrency, timeout, progress):
+    """ps1_lookup() of every (ra, dec) on a pool of 'concurrency' threads, in input order."""
+    def one(coord):
+        res = ps1_lookup(coord[0], coord[1], radius, timeout)
+        if progress:
+            progress(1)
+        return res
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, coords))
+
+
+def verify_ps1(ra, dec, radius=MATCH_RADIUS, concurrency=PS1_CONCURRENCY, max_rps=PS1_MAX_RPS,
+               timeout=PS1_TIMEOUT, progress=None, cache=PS1_CACHE_FILE):
+    """
+    Checks every (ra, dec) against PS1 concurrently.
+    Returns a list of (exists, objid) tuples in input order (see ps1_lookup).
+    Positions already answered in the cache are not queried again.
+    """
+    ra = np.asarray(ra, dtype=np.float64)
+    dec = np.asarray(dec, dtype=np.float64)
+    results = [None] * len(ra)
+    if len(ra) == 0:
+        return results
+
+    conn = ps1_cache.open_cache(cache)
+    if conn is not None:
+        for i, res in ps1_cache.get_lookups(conn, ra, dec, radius).items():
+            results[i] = res
+        _from_cached_cones(conn, ra, dec, radius, results)
+
+    todo = [i for i, res in enumerate(results) if res is None]
+    if conn is not None:
+        print(f"    > PS1 cache: {len(ra) - len(todo)} of {len(ra)} answered locally, {len(todo)} to query")
+    if max_rps:
+        http_client.set_rate(PS1_URL, max_rps)
+    for round_ in range(PS1_REQUEUE_ROUNDS + 1):
+        if not todo:
+            break
+        if round_:
+            print(f"[!] Re-queuing {len(todo)} failed PS1 lookups (round {round_}/{PS1_REQUEUE_ROUNDS})...")
+            time.sleep(PS1_REQUEUE_DELAY)
+        coords = list(zip(ra[todo], dec[todo]))
+        fetched = _verify(coords, radius, max(1, concurrency), timeout, progress)
+        for i, res in zip(todo, fetched):
+            results[i] = res
+        if conn is not None:
+            ps1_cache.put_lookups(conn, ra[todo], dec[todo], radius, fetched)
+        todo = [i for i, res in zip(todo, fetched) if res[1] == "Error"]
+    if todo:
+        print(f"[!] {len(todo)} PS1 lookups still failing: kept as unverified (not survivors).")
+
+    if conn is not None:
+        ps1_cache.prune(conn)
+        conn.close()
+    return results
+
+
+def _from_cached_cones(conn, ra, dec, radius, results):
+    """Fills unanswered positions that lie inside a cached sector catalog."""
+    pending = [i for i, res in enumerate(results) if res is None]
+    owner = ps1_cache.cones_containing(conn, ra[pending], dec[pending], radius)
+    by_cone = {}
+    for i, key in zip(pending, owner):
+        if key is not None:
+            by_cone.setdefault(key, []).append(i)
+    for key, rows in by_cone.items():
+        ref = ps1_cache.load_cone(conn, key)
+        nearest, _ = crossmatch(ra[rows], dec[rows], ref['ra'], ref['dec'], radius)
+        objids = ref['objid'].to_numpy()
+        for i, k in zip(rows, nearest):
+            results[i] = (True, objids[k]) if k >= 0 else (False, None)
+
+
+# --- SECTOR MODE: ONE PAGED CONE FETCH + LOCAL MATCHING ---
+
+def fetch_ps1_cone(ra, dec, radius, page_size=PS1_PAGE_SIZE, timeout=PS1_BULK_TIMEOUT):
+    """
+    Every PS1 mean object in a cone, page by page.
+    Returns a DataFrame (objid, ra, dec), or None if any page failed.
+    """
+    pages = []
+    page = 1
+    while True:
+        params = {'ra': ra, 'dec': dec, 'radius': radius, 'columns': '[objID,raMean,decMean]',
+                  'pagesize': page_size, 'page': page}
+        try:
+            r = http_client.get(PS1_BULK_URL, params=params, timeout=timeout)
+            if r.status_code != 200:
+                print(f"[!] PS1 bulk fetch: HTTP {r.status_code} on page {page}")
+                return None
+            chunk = pd.read_csv(StringIO(r.text)) if r.text.strip() else pd.DataFrame()
+        except Exception as e:
+            print(f"[!] PS1 bulk fetch error on page {page}: {e}")
+            return None
+        pages.append(chunk)
+        if len(chunk) < page_size:
+            break
+        page += 1
+
+    df = pd.concat(pages, ignore_index=True)
+    if df.empty:
+        return pd.DataFrame({'objid': np.zeros(0, np.int64), 'ra': np.zeros(0), 'dec': np.zeros(0)})
+    df.columns = df.columns.str.strip()
+    # -999 marks objects without a mean position
+    df = df[(df['raMean'] > -999) & (df['decMean'] > -999)].drop_duplicates('objID')
+    return pd.DataFrame({'objid': df['objID'].to_numpy(), 'ra': df['raMean'].to_numpy(),
+                         'dec': df['decMean'].to_numpy()})
+
+
+def verify_ps1_bulk(ra, dec, sector_ra, sector_dec, sector_radius, radius=MATCH_RADIUS,
+                    cache=PS1_CACHE_FILE, **lookup_args):
+    """
+    Same answers as verify_ps1() for candidates inside a sector cone, from one
+    paged fetch of the sector (padded by the match radius, reused from the
+    cache when possible) and a local sorted-array cross-match. Candidates
+    outside the cone, or all of them if the fetch fails, are looked up one by
+    one with verify_ps1().
+    """
+    ra = np.asarray(ra, dtype=np.float64)
+    dec = np.asarray(dec, dtype=np.float64)
+    results = [None] * len(ra)
+    if len(ra) == 0:
+        return results
+
+    cone_radius = sector_radius + radius
+    conn = ps1_cache.open_cache(cache)
+    ref = ps1_cache.get_cone(conn, sector_ra, sector_dec, cone_radius) if conn is not None else None
+    if ref is not None:
+        print(f"    > PS1 sector catalog: {len(ref)} objects (cached)")
+    else:
+        ref = fetch_ps1_cone(sector_ra, sector_dec, cone_radius)
+        if ref is not None and conn is not None:
+            ps1_cache.put_cone(conn, sector_ra, sector_dec, cone_radius, ref)
+            ps1_cache.prune(conn)
+        if ref is not None:
+            print(f"    > PS1 sector catalog: {len(ref)} objects")
+    if conn is not None:
+        conn.close()
+
+    inside = angsep(sector_ra, sector_dec, ra, dec) <= sector_radius
+    if ref is None:
+        print("[!] Falling back to per-object PS1 lookups for this sector.")
+        inside[:] = False
+    else:
+        nearest, _ = crossmatch(ra[inside], dec[inside], ref['ra'], ref['dec'], radius)
+        objids = ref['objid'].to_numpy()
+        for i, k in zip(np.flatnonzero(inside), nearest):
+            results[i] = (True, objids[k]) if k >= 0 else (False, None)
+
+    outside = np.flatnonzero(~inside)
+    if len(outside):
+        for i, res in zip(outside, verify_ps1(ra[outside], dec[outside], radius, cache=cache, **lookup_args)):
+            results[i] = res
+    return results
+
+
+def verify_ps1_local(ra, dec, catalog, radius=MATCH_RADIUS, offline=False, **lookup_args):
+    """
+    Same answers as verify_ps1() from a local reference catalog (a name or
+    directory for refcat.open_refcat, or an opened one). Positions outside its
+    footprint are looked up with verify_ps1(), or come back as (True, "Error")
+    when offline.
+    """
+    ra = np.asarray(ra, dtype=np.float64)
+    dec = np.asarray(dec, dtype=np.float64)
+    results = [(True, "Error")] * len(ra)
+    cat = refcat.open_refcat(catalog) if isinstance(catalog, str) else catalog
+    inside = refcat.covers(cat, ra, dec, radius) if cat is not None else np.zeros(len(ra), dtype=bool)
+
+    nearest, _ = refcat.match(cat, ra[inside], dec[inside], radius) if inside.any() else ([], [])
+    for i, k in zip(np.flatnonzero(inside), nearest):
+        results[i] = (True, int(cat['objid'][k])) if k >= 0 else (False, None)
+    print(f"    > PS1 local catalog: {int(inside.sum())} of {len(ra)} answered offline")
+
+    outside = np.flatnonzero(~inside)
+    if len(outside) and not offline:
+        for i, res in zip(outside, verify_ps1(ra[outside], dec[outside], radius, **lookup_args)):
+            results[i] = res
+    return results
@@ -0,0 +1,203 @@
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+import skycells
+
+# --- PERSISTENT PAN-STARRS CACHE (SQLITE) ---
+# One file shared by cross_match.py, p9_grid_survey.py and
+# p9_full_grid_survey.py (everything that goes through ps1.py).
+#
+#   lookups     one row per per-object cone search (rounded ra/dec/radius),
+#               answer = objID, '' (a PS1 object without an objID) or NULL
+#               ("no PS1 object")
+#   cones       one row per sector catalog fetch (objid/ra/dec arrays)
+#   cone_cells  HEALPix cells covered by each cone, so a per-object lookup
+#               inside any cached sector is answered from that catalog
+#
+# Failed lookups (the fail-safe "Error" answers) are never stored. Rows
+# older than CACHE_TTL_DAYS are ignored and purged; when the file holds more
+# than CACHE_MAX_MB of payload the least recently used rows are evicted.
+
+CACHE_FILE = "ps1_cache.sqlite"
+CACHE_TTL_DAYS = 90        # PS1 DR2 is a static release; expiry only guards against stale query logic
+CACHE_MAX_MB = 256
+CACHE_NSIDE = skycells.DEFAULT_NSIDE
+
+_LOOKUP_BYTES = 96         # approximate payload of one lookups row
+_KEY_DIGITS = 8            # 1e-8 deg (~0.04 mas) key rounding
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS lookups (
+    key TEXT PRIMARY KEY, cell INTEGER, objid TEXT, fetched REAL, used REAL);
+CREATE INDEX IF NOT EXISTS lookups_used ON lookups(used);
+CREATE TABLE IF NOT EXISTS cones (
+    key TEXT PRIMARY KEY, ra REAL, dec REAL, radius REAL, n INTEGER,
+    data BLOB, nbytes INTEGER, fetched REAL, used REAL);
+CREATE TABLE IF NOT EXISTS cone_cells (
+    cell INTEGER, cone TEXT, PRIMARY KEY (cell, cone));
+"""
+
+
+def _key(*values):
+    return ",".join(f"{v:.{_KEY_DIGITS}f}" for v in values)
+
+
+def open_cache(path=CACHE_FILE):
+    """Opens (creating if needed) the cache database. Returns None if path is None."""
+    if path is None:
+        return None
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _fresh_after(ttl_days):
+    return time.time() - ttl_days * 86400.0
+
+
+# --- PER-OBJECT LOOKUPS ---
+
+def get_lookups(conn, ra, dec, radius, ttl_days=CACHE_TTL_DAYS):
+    """
+    Cached answers for per-object lookups.
+    Returns {position: (exists, objid)} for the positions that were found.
+    """
+    keys = [_key(a, d, radius) for a, d in zip(ra, dec)]
+    found = {}
+    now = time.time()
+    for start in range(0, len(keys), 500):
+        batch = keys[start:start + 500]
+        rows = conn.execute(
+            f"SELECT key, objid FROM lookups WHERE fetched >= ? AND key IN ({','.join('?' * len(batch))})",
+            [_fresh_after(ttl_days)] + batch).fetchall()
+        found.update(rows)
+    if found:
+        conn.executemany("UPDATE lookups SET used = ? WHERE key = ?", [(now, k) for k in found])
+        conn.commit()
+
+    out = {}
+    for i, k in enumerate(keys):
+        if k in found:
+            objid = found[k]
+            # '' (or "None" from older caches): a PS1 object without an objID
+            out[i] = (objid is not None, int(objid) if objid not in (None, '', 'None') else None)
+    return out
+
+
+def put_lookups(conn, ra, dec, radius, results):
+    """Stores (exists, objid) answers; failed lookups ("Error") are skipped."""
+    now = time.time()
+    ra = np.asarray(ra, dtype=np.float64)
+    dec = np.asarray(dec, dtype=np.float64)
+    cells = skycells.ang2pix(CACHE_NSIDE, ra, dec) if len(ra) else []
+    rows = [(_key(a, d, radius), int(c), ('' if objid is None else str(objid)) if exists else None, now, now)
+            for a, d, c, (exists, objid) in zip(ra, dec, cells, results) if objid != "Error"]
+    conn.executemany("INSERT OR REPLACE INTO lookups VALUES (?, ?, ?, ?, ?)", rows)
+    conn.commit()
+
+
+# --- SECTOR CATALOGS ---
+
+def _unpack(n, data):
+    objid = np.frombuffer(data, dtype=np.int64, count=n)
+    coords = np.frombuffer(data, dtype=np.float64, offset=8 * n).reshape(2, n)
+    return pd.DataFrame({'objid': objid, 'ra': coords[0], 'dec': coords[1]})
+
+
+def put_cone(conn, ra, dec, radius, catalog):
+    """Stores a sector catalog (objid, ra, dec) fetched for a cone."""
+    now = time.time()
+    key = _key(ra, dec, radius)
+    data = (np.asarray(catalog['objid'], dtype=np.int64).tobytes() +
+            np.asarray(catalog['ra'], dtype=np.float64).tobytes() +
+            np.asarray(catalog['dec'], dtype=np.float64).tobytes())
+    cells = skycells.cone_cells(CACHE_NSIDE, ra, dec, radius)
+    conn.execute("INSERT OR REPLACE INTO cones VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                 (key, ra, dec, radius, len(catalog), data, len(data), now, now))
+    conn.execute("DELETE FROM cone_cells WHERE cone = ?", (key,))
+    conn.executemany("INSERT INTO cone_cells VALUES (?, ?)", [(int(c), key) for c in cells])
+    conn.commit()
+
+
+def covering_cones(conn, ra, dec, radius, ttl_days=CACHE_TTL_DAYS):
+    """Fresh cached cones that fully contain the cone (ra, dec, radius): list of (key, ra, dec, radius)."""
+    cell = int(skycells.ang2pix(CACHE_NSIDE, np.array([ra]), np.array([dec]))[0])
+    rows = conn.execute(
+        "SELECT c.key, c.ra, c.dec, c.radius FROM cones c JOIN cone_cells k ON k.cone = c.key "
+        "WHERE k.cell = ? AND c.fetched >= ?", (cell, _fresh_after(ttl_days))).fetchall()
+    return [r for r in rows if skycells.angsep(r[1], r[2], ra, dec) + radius <= r[3]]
+
+
+def load_cone(conn, key):
+    """Catalog (objid, ra, dec) of a cached cone."""
+    n, data = conn.execute("SELECT n, data FROM cones WHERE key = ?", (key,)).fetchone()
+    conn.execute("UPDATE cones SET used = ? WHERE key = ?", (time.time(), key))
+    conn.commit()
+    return _unpack(n, data)
+
+
+def get_cone(conn, ra, dec, radius, ttl_days=CACHE_TTL_DAYS):
+    """Catalog of a cone from any cached cone that contains it (trimmed to the cone), or None."""
+    cones = covering_cones(conn, ra, dec, radius, ttl_days)
+    if not cones:
+        return None
+    # The tightest covering cone holds the fewest extra objects
+    key = min(cones, key=lambda r: r[3])[0]
+    cat = load_cone(conn, key)
+    return cat[skycells.angsep(ra, dec, cat['ra'].to_numpy(), cat['dec'].to_numpy()) <= radius].reset_index(drop=True)
+
+
+def cones_containing(conn, ra, dec, radius, ttl_days=CACHE_TTL_DAYS):
+    """For each position, the key of a fresh cached cone containing its whole match circle (None if none)."""
+    ra = np.asarray(ra, dtype=np.float64)
+    dec = np.asarray(dec, dtype=np.float64)
+    owner = [None] * len(ra)
+    if len(ra) == 0:
+        return owner
+    cells = np.unique(skycells.ang2pix(CACHE_NSIDE, ra, dec)).tolist()
+    rows = conn.execute(
+        f"SELECT DISTINCT c.key, c.ra, c.dec, c.radius FROM cones c JOIN cone_cells k ON k.cone = c.key "
+        f"WHERE c.fetched >= ? AND k.cell IN ({','.join('?' * len(cells))}) ORDER BY c.radius",
+        [_fresh_after(ttl_days)] + cells).fetchall()
+    for key, cra, cdec, cradius in rows:
+        inside = skycells.angsep(cra, cdec, ra, dec) + radius <= cradius
+        for i in np.flatnonzero(inside):
+            if owner[i] is None:
+                owner[i] = key
+    return owner
+
+
+# --- EXPIRY AND EVICTION ---
+
+def prune(conn, ttl_days=CACHE_TTL_DAYS, max_mb=CACHE_MAX_MB):
+    """Drops expired rows, then least recently used rows until the payload fits in max_mb."""
+    cutoff = _fresh_after(ttl_days)
+    conn.execute("DELETE FROM lookups WHERE fetched < ?", (cutoff,))
+    conn.execute("DELETE FROM cones WHERE fetched < ?", (cutoff,))
+
+    n_lookups = conn.execute("SELECT COUNT(*) FROM lookups").fetchone()[0]
+    cone_bytes = conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM cones").fetchone()[0]
+    excess = n_lookups * _LOOKUP_BYTES + cone_bytes - max_mb * 1024 * 1024
+    if excess > 0:
+        # Oldest first across both tables
+        rows = conn.execute(
+            "SELECT 'lookups', key, ? AS nbytes, used FROM lookups "
+            "UNION ALL SELECT 'cones', key, nbytes, used FROM cones ORDER BY used",
+            (_LOOKUP_BYTES,))
+        drop = {'lookups': [], 'cones': []}
+        for table, key, nbytes, _ in rows:
+            if excess <= 0:
+                break
+            drop[table].append((key,))
+            excess -= nbytes
+        conn.executemany("DELETE FROM lookups WHERE key = ?", drop['lookups'])
+        conn.executemany("DELETE FROM cones WHERE key = ?", drop['cones'])
+    conn.execute("DELETE FROM cone_cells WHERE cone NOT IN (SELECT key FROM cones)")
+    conn.commit()
@@ -0,0 +1,248 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+import skycells
+from itf_cache import save_array
+
+# --- LOCAL REFERENCE CATALOGS (PS1 / GAIA EXTRACTS) ---
+# An extract of a static catalog over the survey band (CSV or FITS, e.g. a
+# MAST CasJobs or Gaia archive download) is ingested once into
+# REFCAT_DIR/<name>/ and memory-mapped afterwards:
+#   ra.npy, dec.npy (float64), objid.npy (int64)
+#   key.npy   (float64) zone * ZONE_STRIDE + ra, sorted: the sky is cut into
+#             Dec zones ZONE_DEG tall and every zone is stored RA-sorted
+#   meta.json zone height, rows, source files, footprint; written last
+#
+# A batch query looks at the 1-2 zones that reach [dec - radius, dec + radius]
+# and, inside each, at the RA window radius / cos(dec) wide found by binary
+# search on key, so it only touches sources that are nearly matches already.
+# Everything is vectorized: matching is CPU-bound and works offline.
+#
+# The footprint ([(ra, dec, radius), ...] cones the extract is complete
+# for) says where "no source" means absent rather than not downloaded;
+# covers() tells callers which positions they may answer locally.
+
+REFCAT_DIR = "refcat"
+REFCAT_VERSION = 1
+ZONE_DEG = 1.0 / 60.0        # zone height: a few match radii
+ZONE_STRIDE = 400.0          # key gap between zones (> 360, so zones never touch)
+KEY_PAD = 1e-8               # covers float rounding of the key
+CSV_CHUNK_ROWS = 1000000
+
+# Accepted column names (case-insensitive): PS1 mean, Gaia, VizieR, plain
+RA_COLUMNS = ('ra', 'ramean', 'ra_icrs', 'raj2000')
+DEC_COLUMNS = ('dec', 'decmean', 'de_icrs', 'dej2000', 'dec_icrs')
+ID_COLUMNS = ('objid', 'source_id', 'id')
+
+
+def catalog_dir(name, root=REFCAT_DIR):
+    return os.path.join(root, name)
+
+
+def _pick(columns, names):
+    lower = {c.strip().lower(): c for c in columns}
+    return next((lower[n] for n in names if n in lower), None)
+
+
+def _clean(ra, dec, objid):
+    """Drops rows without a usable position (NaN, PS1's -999 sentinels)."""
+    ra = np.asarray(ra, dtype=np.float64)
+    dec = np.asarray(dec, dtype=np.float64)
+    ok = np.isfinite(ra) & np.isfinite(dec) & (ra >= 0) & (ra <= 360) & (np.abs(dec) <= 90)
+    return np.mod(ra[ok], 360.0), dec[ok], None if objid is None else np.asarray(objid, dtype=np.int64)[ok]
+
+
+def read_extract(path, chunk_rows=CSV_CHUNK_ROWS):
+    """Yields (ra, dec, objid or None) blocks of a CSV or FITS table extract."""
+    if path.lower().endswith(('.fits', '.fit', '.fits.gz', '.fit.gz')):
+        from astropy.io import fits   # only needed for FITS extracts
+        with fits.open(path, memmap=True) as hdul:
+            table = next(h for h in hdul if isinstance(h, (fits.BinTableHDU, fits.TableHDU)))
+            names = table.columns.names
+            ra_col, dec_col, id_col = (_pick(names, n) for n in (RA_COLUMNS, DEC_COLUMNS, ID_COLUMNS))
+            if ra_col is None or dec_col is None:
+                raise ValueError(f"{path}: no RA/Dec columns in {names}")
+            data = table.data
+            for start in range(0, len(data), chunk_rows):
+                rows = data[start:start + chunk_rows]
+                yield _clean(rows[ra_col], rows[dec_col], rows[id_col] if id_col else None)
+        return
+
+    names = pd.read_csv(path, nrows=0).columns
+    ra_col, dec_col, id_col = (_pick(names, n) for n in (RA_COLUMNS, DEC_COLUMNS, ID_COLUMNS))
+    if ra_col is None or dec_col is None:
+        raise ValueError(f"{path}: no RA/Dec columns in {list(names)}")
+    usecols = [c for c in (ra_col, dec_col, id_col) if c]
+    for rows in pd.read_csv(path, usecols=usecols, chunksize=chunk_rows):
+        yield _clean(rows[ra_col].to_numpy(), rows[dec_col].to_numpy(),
+                     rows[id_col].to_numpy() if id_col else None)
+
+
+def _zone(dec, zone_deg):
+    top = int(np.ceil(180.0 / zone_deg)) - 1
+    return np.clip(np.floor((np.asarray(dec) + 90.0) / zone_deg), 0, top).astype(np.int64)
+
+
+def build_refcat(paths, name, footprint=None, root=REFCAT_DIR, zone_deg=ZONE_DEG):
+    """
+    Ingests one or more extracts into REFCAT_DIR/<name>/. Sources listed in
+    several extracts (same objid) are kept once. footprint: cones
+    [(ra, dec, radius), ...] the extracts are complete for (None: everywhere).
+    """
+    ra, dec, objid = [], [], []
+    has_ids = True
+    for path in paths:
+        print(f"[*] Reading {path}...")
+        for r, d, i in read_extract(path):
+            ra.append(r)
+            dec.append(d)
+            objid.append(i)
+            has_ids = has_ids and i is not None
+    ra = np.concatenate(ra) if ra else np.zeros(0)
+    dec = np.concatenate(dec) if dec else np.zeros(0)
+    if has_ids and objid:
+        objid = np.concatenate(objid)
+        _, first = np.unique(objid, return_index=True)
+        if len(first) < len(objid):
+            print(f"    > {len(objid) - len(first)} duplicate sources dropped")
+            first.sort()
+            ra, dec, objid = ra[first], dec[first], objid[first]
+    else:
+        # No usable ID column: the row number stands in for it
+        objid = np.arange(len(ra), dtype=np.int64)
+
+    zone = _zone(dec, zone_deg)
+    key = zone * ZONE_STRIDE + ra
+    order = np.argsort(key, kind='stable')
+
+    out = catalog_dir(name, root)
+    os.makedirs(out, exist_ok=True)
+    try:
+        os.remove(os.path.join(out, 'meta.json'))
+    except FileNotFoundError:
+        pass
+    save_array(os.path.join(out, 'ra.npy'), ra[order])
+    save_array(os.path.join(out, 'dec.npy'), dec[order])
+    save_array(os.path.join(out, 'objid.npy'), objid[order])
+    save_array(os.path.join(out, 'key.npy'), key[order])
+    meta = {'version': REFCAT_VERSION, 'zone_deg': zone_deg, 'rows': int(len(ra)),
+            'sources': [os.path.basename(p) for p in paths],
+            'footprint': [list(map(float, cone)) for cone in footprint] if footprint else None}
+    with open(os.path.join(out, 'meta.json.tmp'), 'w') as f:
+        json.dump(meta, f, indent=1)
+    os.replace(os.path.join(out, 'meta.json.tmp'), os.path.join(out, 'meta.json'))
+    print(f"[*] Reference catalog '{out}': {len(ra)} sources in {len(np.unique(zone))} zones.")
+    return open_refcat(name, root)
+
+
+def open_refcat(name, root=REFCAT_DIR):
+    """Memory-maps a built catalog ('name' under root, or a directory path). None if it is missing."""
+    path = name if os.sep in name else catalog_dir(name, root)
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        print(f"[!] No reference catalog at '{path}' (build it with refcat.py).")
+        return None
+    if meta.get('version') != REFCAT_VERSION:
+        print(f"[!] Reference catalog '{path}' has an old layout; rebuild it.")
+        return None
+    cat = {col: np.load(os.path.join(path, f'{col}.npy'), mmap_mode='r')
+           for col in ('ra', 'dec', 'objid', 'key')}
+    cat['meta'] = dict(meta, dir=path)
+    return cat
+
+
+def _windows(cat, ra, dec, radius):
+    """(position, first row, end row) of every key range that can hold sources within 'radius' of a position."""
+    zone_deg = cat['meta']['zone_deg']
+    z_lo, z_hi = _zone(dec - radius, zone_deg), _zone(dec + radius, zone_deg)
+    n_zones = z_hi - z_lo + 1
+    q = np.repeat(np.arange(len(ra)), n_zones)
+    zone = z_lo[q] + np.arange(n_zones.sum()) - np.repeat(np.cumsum(n_zones) - n_zones, n_zones)
+
+    # RA half-width of the disc (whole zone when it reaches a pole)
+    reach = np.abs(dec[q]) + radius
+    with np.errstate(divide='ignore'):
+        half = np.where(reach < 90.0, radius / np.cos(np.deg2rad(np.minimum(reach, 89.9999))), 360.0)
+    full = half >= 180.0
+    lo, hi = ra[q] - half, ra[q] + half
+
+    # A window crossing RA 0/360 becomes two
+    a_lo, a_hi = np.where(full, 0.0, np.maximum(lo, 0.0)), np.where(full, 360.0, np.minimum(hi, 360.0))
+    wrap = ~full & ((lo < 0) | (hi > 360.0))
+    b_lo = np.where(lo < 0, lo + 360.0, 0.0)[wrap]
+    b_hi = np.where(lo < 0, 360.0, hi - 360.0)[wrap]
+
+    q = np.concatenate((q, q[wrap]))
+    base = np.concatenate((zone, zone[wrap])) * ZONE_STRIDE
+    first, last = base + np.concatenate((a_lo, b_lo)) - KEY_PAD, base + np.concatenate((a_hi, b_hi)) + KEY_PAD
+
+    # Binary searches in key order walk the (memory-mapped) key array
+    # front to back instead of jumping around it
+    order = np.argsort(first)
+    start, stop = np.empty(len(q), dtype=np.int64), np.empty(len(q), dtype=np.int64)
+    start[order] = np.searchsorted(cat['key'], first[order], side='left')
+    stop[order] = np.searchsorted(cat['key'], last[order], side='right')
+    return q, start, stop
+
+
+def pairs(cat, ra, dec, radius):
+    """Every (position, catalog row, separation deg) closer than 'radius' deg."""
+    ra = np.mod(np.atleast_1d(np.asarray(ra, dtype=np.float64)), 360.0)
+    dec = np.atleast_1d(np.asarray(dec, dtype=np.float64))
+    if len(ra) == 0 or len(cat['key']) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    q, lo, hi = _windows(cat, ra, dec, radius)
+
+    pos = skycells.slices(lo, hi)
+    cand = np.repeat(q, hi - lo)
+    sep = skycells.angsep(ra[cand], dec[cand], cat['ra'][pos], cat['dec'][pos])
+    ok = sep <= radius
+    return cand[ok], pos[ok], sep[ok]
+
+
+def match(cat, ra, dec, radius):
+    """
+    Nearest catalog source within 'radius' deg of every (ra, dec).
+    Returns (row index, separation deg); index is -1 where nothing matches.
+    """
+    return skycells.nearest_pairs(len(np.atleast_1d(ra)), *pairs(cat, ra, dec, radius))
+
+
+def has_source(cat, ra, dec, radius):
+    """Mask of the positions with a catalog source within 'radius' deg."""
+    return match(cat, ra, dec, radius)[0] >= 0
+
+
+def covers(cat, ra, dec, radius=0.0):
+    """Mask of the positions whose whole 'radius' disc lies inside the catalog's footprint."""
+    ra = np.atleast_1d(np.asarray(ra, dtype=np.float64))
+    dec = np.atleast_1d(np.asarray(dec, dtype=np.float64))
+    footprint = cat['meta'].get('footprint')
+    if footprint is None:
+        return np.ones(len(ra), dtype=bool)
+    inside = np.zeros(len(ra), dtype=bool)
+    for c_ra, c_dec, c_radius in footprint:
+        inside |= skycells.angsep(c_ra, c_dec, ra, dec) + radius <= c_radius
+    return inside
+
+
+def main():
+    """python refcat.py NAME EXTRACT [EXTRACT ...] [--cone=ra,dec,radius ...]"""
+    args = [a for a in sys.argv[1:] if not a.startswith('--cone=')]
+    cones = [tuple(float(v) for v in a.split('=', 1)[1].split(',')) for a in sys.argv[1:] if a.startswith('--cone=')]
+    if len(args) < 2:
+        print(main.__doc__)
+        sys.exit(1)
+    print(f"--- REFERENCE CATALOG INGEST: {args[0]} ---")
+    build_refcat(args[1:], args[0], footprint=cones or None)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import numpy as np
+import pandas as pd
+
+import skycells
+from itf_parser import box_mask
+from tracklets import tracklet_motion, fit_linear_motion
+
+# --- MULTI-REGION ASSIGNMENT ---
+# A region is a dict with an 'id' and either
+#   'box': (ra_min, ra_max, dec_min, dec_max)        or
+#   'ra', 'dec', 'radius' (deg)                      -> a cone
+# assign_regions() tags every detection with every region it falls in, in
+# one pass: the HEALPix cells of all regions go into one sorted table, each
+# detection looks up its own cell there (binary search), and only those
+# (detection, region) pairs get the exact box/cone test. 30 sectors cost
+# about as much as one.
+
+
+def box_region(region_id, ra_min, ra_max, dec_min, dec_max):
+    return {'id': region_id, 'box': (ra_min, ra_max, dec_min, dec_max)}
+
+
+def cone_region(region_id, ra, dec, radius):
+    return {'id': region_id, 'ra': ra, 'dec': dec, 'radius': radius}
+
+
+def regions_from_targets(targets, radius):
+    """Cones from a survey TARGETS list ({'id', 'ra', 'dec'} dicts)."""
+    return [cone_region(t['id'], t['ra'], t['dec'], radius) for t in targets]
+
+
+def region_cells(nside, region):
+    """HEALPix cells that may hold detections of 'region'."""
+    if 'box' in region:
+        return skycells.box_cells(nside, region['box'])
+    return skycells.cone_cells(nside, region['ra'], region['dec'], region['radius'])
+
+
+def all_region_cells(regions, nside=skycells.DEFAULT_NSIDE):
+    """Sorted (cell, region index) table over every region."""
+    cells = [np.asarray(region_cells(nside, r), dtype=np.int64) for r in regions]
+    owner = np.repeat(np.arange(len(regions)), [len(c) for c in cells])
+    cells = np.concatenate(cells) if cells else np.zeros(0, dtype=np.int64)
+    order = np.argsort(cells, kind='stable')
+    return cells[order], owner[order]
+
+
+def _inside(ra, dec, reg, regions):
+    """Exact test of detection coordinates against region 'reg' (pairwise arrays)."""
+    is_box = np.array(['box' in r for r in regions], dtype=bool)
+    boxes = np.array([r['box'] if 'box' in r else (np.nan,) * 4 for r in regions], dtype=np.float64).reshape(-1, 4)
+    cones = np.array([(np.nan,) * 3 if 'box' in r else (r['ra'], r['dec'], r['radius']) for r in regions],
+                     dtype=np.float64).reshape(-1, 3)
+
+    in_box = box_mask(ra, dec, boxes[reg].T)
+    with np.errstate(invalid='ignore'):
+        in_cone = skycells.angsep(cones[reg, 0], cones[reg, 1], ra, dec) <= cones[reg, 2]
+    return np.where(is_box[reg], in_box, in_cone)
+
+
+def assign_regions(ra, dec, regions, nside=skycells.DEFAULT_NSIDE):
+    """
+    Returns (det, reg): detection i lies in regions[reg[k]] for every k with det[k] == i.
+    Pairs come out in detection order, then region order.
+    """
+    ra = np.asarray(ra, dtype=np.float64)
+    dec = np.asarray(dec, dtype=np.float64)
+    cells, owner = all_region_cells(regions, nside)
+    if len(ra) == 0 or len(cells) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    pix = skycells.ang2pix(nside, ra, dec)
+    lo = np.searchsorted(cells, pix, side='left')
+    hi = np.searchsorted(cells, pix, side='right')
+
+    det = np.repeat(np.arange(len(ra)), hi - lo)
+    reg = owner[skycells.slices(lo, hi)]
+
+    keep = _inside(ra[det], dec[det], reg, regions)
+    det, reg = det[keep], reg[keep]
+    order = np.lexsort((reg, det))
+    return det[order], reg[order]
+
+
+def split_regions(df, regions, nside=skycells.DEFAULT_NSIDE):
+    """
+    Long table of per-region candidates: every row of df (ra, dec, ...) once per
+    region it falls in, with a 'region' column holding the region id.
+    """
+    det, reg = assign_regions(df['ra'].to_numpy(), df['dec'].to_numpy(), regions, nside)
+    out = df.iloc[det].reset_index(drop=True)
+    out.insert(0, 'region', np.array([r['id'] for r in regions], dtype=object)[reg])
+    return out
+
+
+def region_motion(df):
+    """
+    tracklet_motion + least-squares fit per (region, tracklet) for a table from
+    split_regions(). Returns one row per pair with 'region' and 'id' columns.
+    """
+    region_codes, region_names = pd.factorize(df['region'])
+    id_codes, id_names = pd.factorize(df['id'])
+    key = region_codes.astype(np.int64) * max(len(id_names), 1) + id_codes
+
+    keyed = pd.DataFrame({'id': key, 'mjd': df['mjd'].to_numpy(), 'ra': df['ra'].to_numpy(),
+                          'dec': df['dec'].to_numpy(), 'mag': df['mag'].to_numpy()})
+    motion = tracklet_motion(keyed)
+    fits, _ = fit_linear_motion(keyed)
+    for col in ('rate', 'pa', 'rms', 'n_used'):
+        motion[col] = fits[col].to_numpy()
+
+    pair = motion['id'].to_numpy()
+    n = max(len(id_names), 1)
+    motion['id'] = np.asarray(id_names, dtype=object)[pair % n]
+    motion.insert(0, 'region', np.asarray(region_names, dtype=object)[pair // n])
+    return motion
+
+
+def save_region_results(tagged, candidates_file, motion_file, regions=None,
+                        min_rate=0.5, max_rate=5.0, min_arc_hours=0.5):
+    """
+    Writes the per-region candidate table and per-region motion (tracklets with
+    more than one detection) and prints a one-line summary per region
+    (in 'regions' order, empty regions included, when given).
+    """
+    tagged.to_csv(candidates_file, index=False)
+    motion = region_motion(tagged)
+    motion = motion[motion['n_obs'] > 1]
+    motion.to_csv(motion_file, index=False)
+
+    slow = motion[(motion['arc_hours'] > min_arc_hours) &
+                  (motion['rate'] > min_rate) & (motion['rate'] < max_rate)]
+    summary = pd.DataFrame({
+        'Detections': tagged.groupby('region', sort=False).size(),
+        'Tracklets': motion.groupby('region', sort=False).size(),
+        'Slow': slow.groupby('region', sort=False).size(),
+    })
+    names = [r['id'] for r in regions] if regions is not None else tagged['region'].unique()
+    summary = summary.reindex(names).fillna(0).astype(int)
+    print(summary.to_string())
+    print(f"[*] Per-region candidates -> '{candidates_file}', motion -> '{motion_file}'")
+    return motion
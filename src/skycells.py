@@ -0,0 +1,216 @@
+from functools import lru_cache
+
+import numpy as np
+
+# --- HEALPIX SKY CELLS (NESTED SCHEME, PURE NUMPY) ---
+# Equal-area sky partitioning used to bucket detections and catalogs.
+# Same pixel numbering as healpy's ang2pix(nside, ..., nest=True,
+# lonlat=True), without adding healpy as a dependency. Nested numbering
+# means pixel p at one level contains pixels 4p..4p+3 at the next level.
+
+DEFAULT_NSIDE = 64   # ~0.92 deg cells
+
+# Face layout constants (HEALPix C++ reference implementation)
+_JRLL = np.array([2, 2, 2, 2, 3, 3, 3, 3, 4, 4, 4, 4])
+_JPLL = np.array([1, 3, 5, 7, 0, 2, 4, 6, 1, 3, 5, 7])
+
+
+def _spread_bits(v):
+    """Interleaves zeros between the bits of v (x -> .x.x.x)."""
+    v = v.astype(np.int64) & 0xFFFFFFFF
+    v = (v | (v << 16)) & 0x0000FFFF0000FFFF
+    v = (v | (v << 8)) & 0x00FF00FF00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F0F0F0F0F
+    v = (v | (v << 2)) & 0x3333333333333333
+    v = (v | (v << 1)) & 0x5555555555555555
+    return v
+
+
+def _compress_bits(v):
+    """Inverse of _spread_bits: keeps every other bit."""
+    v = v.astype(np.int64) & 0x5555555555555555
+    v = (v | (v >> 1)) & 0x3333333333333333
+    v = (v | (v >> 2)) & 0x0F0F0F0F0F0F0F0F
+    v = (v | (v >> 4)) & 0x00FF00FF00FF00FF
+    v = (v | (v >> 8)) & 0x0000FFFF0000FFFF
+    v = (v | (v >> 16)) & 0x00000000FFFFFFFF
+    return v
+
+
+def npix(nside):
+    return 12 * nside * nside
+
+
+def ang2pix(nside, ra, dec):
+    """Nested HEALPix pixel index of (ra, dec) in degrees."""
+    ra = np.asarray(ra, dtype=np.float64)
+    dec = np.asarray(dec, dtype=np.float64)
+    z = np.sin(np.deg2rad(dec))
+    za = np.abs(z)
+    tt = np.mod(ra, 360.0) / 90.0  # in [0, 4)
+
+    # Equatorial region
+    temp1 = nside * (0.5 + tt)
+    temp2 = nside * z * 0.75
+    jp = (temp1 - temp2).astype(np.int64)
+    jm = (temp1 + temp2).astype(np.int64)
+    ifp = jp // nside
+    ifm = jm // nside
+    face_eq = np.where(ifp == ifm, ifp | 4, np.where(ifp < ifm, ifp, ifm + 8))
+    ix_eq = jm & (nside - 1)
+    iy_eq = nside - (jp & (nside - 1)) - 1
+
+    # Polar caps
+    ntt = np.minimum(tt.astype(np.int64), 3)
+    tp = tt - ntt
+    tmp = nside * np.sqrt(3 * (1 - za))
+    jp_p = np.minimum((tp * tmp).astype(np.int64), nside - 1)
+    jm_p = np.minimum(((1.0 - tp) * tmp).astype(np.int64), nside - 1)
+    north = z >= 0
+    face_p = np.where(north, ntt, ntt + 8)
+    ix_p = np.where(north, nside - jm_p - 1, jp_p)
+    iy_p = np.where(north, nside - jp_p - 1, jm_p)
+
+    equatorial = za <= 2.0 / 3.0
+    face = np.where(equatorial, face_eq, face_p)
+    ix = np.where(equatorial, ix_eq, ix_p)
+    iy = np.where(equatorial, iy_eq, iy_p)
+    return face * nside * nside + _spread_bits(ix) + (_spread_bits(iy) << 1)
+
+
+def pix2ang(nside, pix):
+    """Centre (ra, dec) in degrees of nested HEALPix pixels."""
+    pix = np.asarray(pix, dtype=np.int64)
+    nsq = nside * nside
+    face = pix // nsq
+    ipf = pix & (nsq - 1)
+    ix = _compress_bits(ipf)
+    iy = _compress_bits(ipf >> 1)
+
+    jr = _JRLL[face] * nside - ix - iy - 1
+    fact2 = 4.0 / npix(nside)
+    fact1 = 2 * nside * fact2
+
+    north = jr < nside
+    south = jr > 3 * nside
+    nr = np.where(north, jr, np.where(south, 4 * nside - jr, nside))
+    z = np.where(north, 1 - nr * nr * fact2,
+                 np.where(south, nr * nr * fact2 - 1, (2 * nside - jr) * fact1))
+    kshift = np.where(north | south, 0, (jr - nside) & 1)
+
+    jp = (_JPLL[face] * nr + ix - iy + 1 + kshift) // 2
+    jp = np.where(jp > 4 * nside, jp - 4 * nside, jp)
+    jp = np.where(jp < 1, jp + 4 * nside, jp)
+
+    phi = (jp - (kshift + 1) * 0.5) * (np.pi / 2 / nr)
+    return np.rad2deg(phi), np.rad2deg(np.arcsin(z))
+
+
+def max_pixrad(nside):
+    """Upper bound (deg) on the distance from a pixel centre to any of its corners."""
+    # The most elongated pixels reach ~1.04 x sqrt(pixel area); pad to 1.1
+    return 1.1 * np.rad2deg(np.sqrt(4 * np.pi / npix(nside)))
+
+
+def angsep(ra1, dec1, ra2, dec2):
+    """Great-circle separation in degrees (Vincenty formula, as SkyCoord.separation)."""
+    ra1, dec1, ra2, dec2 = (np.deg2rad(np.asarray(v, dtype=np.float64)) for v in (ra1, dec1, ra2, dec2))
+    dra = ra2 - ra1
+    s1, c1 = np.sin(dec1), np.cos(dec1)
+    s2, c2 = np.sin(dec2), np.cos(dec2)
+    num1 = c2 * np.sin(dra)
+    num2 = c1 * s2 - s1 * c2 * np.cos(dra)
+    den = s1 * s2 + c1 * c2 * np.cos(dra)
+    return np.rad2deg(np.arctan2(np.hypot(num1, num2), den))
+
+
+@lru_cache(maxsize=8)
+def _centres(nside):
+    ra, dec = pix2ang(nside, np.arange(npix(nside)))
+    ra.setflags(write=False)
+    dec.setflags(write=False)
+    return ra, dec
+
+
+def cone_cells(nside, ra, dec, radius):
+    """All pixels that may overlap the cone (conservative)."""
+    cra, cdec = _centres(nside)
+    near = np.abs(cdec - dec) <= radius + max_pixrad(nside)
+    cand = np.flatnonzero(near)
+    sep = angsep(ra, dec, cra[cand], cdec[cand])
+    return cand[sep <= radius + max_pixrad(nside)]
+
+
+def box_cells(nside, box):
+    """All pixels that may overlap an (ra_min, ra_max, dec_min, dec_max) box (conservative)."""
+    ra_min, ra_max, dec_min, dec_max = box
+    pad = max_pixrad(nside)
+    cra, cdec = _centres(nside)
+    in_dec = (cdec >= dec_min - pad) & (cdec <= dec_max + pad)
+
+    # RA padding grows towards the pole of the widest edge
+    widest = min(89.0, max(abs(dec_min), abs(dec_max)) + pad)
+    ra_pad = pad / np.cos(np.deg2rad(widest))
+    if ra_max - ra_min + 2 * ra_pad >= 360.0:
+        return np.flatnonzero(in_dec)
+    lo = np.mod(ra_min - ra_pad, 360.0)
+    width = ra_max - ra_min + 2 * ra_pad
+    in_ra = np.mod(cra - lo, 360.0) <= width
+    return np.flatnonzero(in_dec & in_ra)
+
+
+def slices(starts, stops):
+    """Concatenation of the index ranges [start, stop) without a Python loop."""
+    starts = np.asarray(starts, dtype=np.int64)
+    lengths = np.asarray(stops, dtype=np.int64) - starts
+    return np.repeat(starts - np.concatenate(([0], np.cumsum(lengths)[:-1])), lengths) + np.arange(lengths.sum())
+
+
+def pairs(ra, dec, ref_ra, ref_dec, radius):
+    """
+    Every (position, reference) pair closer than 'radius' deg.
+    Returns (position index, reference index, separation deg), unordered.
+    Sorted-array match: references sorted by Dec, each position only tests the
+    ones inside its Dec window [dec - radius, dec + radius].
+    """
+    ra, dec = np.asarray(ra, dtype=np.float64), np.asarray(dec, dtype=np.float64)
+    ref_ra, ref_dec = np.asarray(ref_ra, dtype=np.float64), np.asarray(ref_dec, dtype=np.float64)
+    if len(ra) == 0 or len(ref_ra) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    order = np.argsort(ref_dec, kind='stable')
+    sorted_dec = ref_dec[order]
+    lo = np.searchsorted(sorted_dec, dec - radius, side='left')
+    hi = np.searchsorted(sorted_dec, dec + radius, side='right')
+
+    pos = slices(lo, hi)
+    cand = np.repeat(np.arange(len(ra)), hi - lo)
+    ref = order[pos]
+
+    sep = angsep(ra[cand], dec[cand], ref_ra[ref], ref_dec[ref])
+    ok = sep <= radius
+    return cand[ok], ref[ok], sep[ok]
+
+
+def nearest_pairs(n, cand, ref, sep):
+    """
+    Keeps the closest reference of each of 'n' positions from (cand, ref, sep) pairs.
+    Returns (index into ref, separation deg); index is -1 where there is no pair.
+    """
+    best = np.full(n, -1, dtype=np.int64)
+    best_sep = np.full(n, np.nan)
+    # Sort pairs by (position, separation), keep the first
+    first = np.lexsort((sep, cand))
+    cand, ref, sep = cand[first], ref[first], sep[first]
+    head = np.concatenate(([True], cand[1:] != cand[:-1])) if len(cand) else np.zeros(0, dtype=bool)
+    best[cand[head]] = ref[head]
+    best_sep[cand[head]] = sep[head]
+    return best, best_sep
+
+
+def crossmatch(ra, dec, ref_ra, ref_dec, radius):
+    """
+    Nearest reference source within 'radius' deg of every (ra, dec).
+    Returns (index into ref, separation deg); index is -1 where nothing matches.
+    """
+    return nearest_pairs(len(np.atleast_1d(ra)), *pairs(ra, dec, ref_ra, ref_dec, radius))
@@ -0,0 +1,41 @@
+import numpy as np
+
+# --- VECTORIZED CALENDAR <-> MJD CONVERSION ---
+# Pure integer arithmetic on NumPy arrays (Fliegel & Van Flandern, Gregorian
+# calendar), so millions of dates convert without building astropy Time
+# objects. Matches Time(..., scale='utc').mjd for whole days; the fractional
+# day is added on top exactly as parse_date_bulletproof used to do.
+
+MJD_JD_OFFSET = 2400001   # JDN of the civil day that starts at MJD 0
+MJD_UNIX_EPOCH = 40587    # MJD of 1970-01-01
+
+
+def calendar_to_mjd(year, month, day):
+    """
+    Converts arrays of year, month and (fractional) day to MJD.
+    An integer day ('2018 11 13') gives midnight; '2018 11 13.238' adds .238.
+    """
+    year = np.asarray(year, dtype=np.int64)
+    month = np.asarray(month, dtype=np.int64)
+    day = np.asarray(day, dtype=np.float64)
+    day_int = np.floor(day)
+
+    a = (14 - month) // 12
+    y = year + 4800 - a
+    m = month + 12 * a - 3
+    jdn = day_int.astype(np.int64) + (153 * m + 2) // 5 + 365 * y + y // 4 - y // 100 + y // 400 - 32045
+
+    return (jdn - MJD_JD_OFFSET) + (day - day_int)
+
+
+def mjd_to_iso(mjd, missing="Unknown"):
+    """
+    Converts MJD values to 'YYYY-MM-DD' strings (same as Time(mjd).iso.split()[0]).
+    Non-finite values become 'missing'. Returns a NumPy array of str.
+    """
+    mjd = np.atleast_1d(np.asarray(mjd, dtype=np.float64))
+    ok = np.isfinite(mjd)
+    # Round to the millisecond first, like the ISO formatter, so 0.9999999 rolls over
+    days = np.floor(np.round(np.where(ok, mjd, 0.0) * 86400000.0) / 86400000.0)
+    dates = (days - MJD_UNIX_EPOCH).astype(np.int64).astype('datetime64[D]')
+    return np.where(ok, np.datetime_as_string(dates, unit='D'), missing)
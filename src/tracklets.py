@@ -0,0 +1,377 @@
+import numpy as np
+import pandas as pd
+
+from skycells import angsep, slices
+
+# --- VECTORIZED PER-TRACKLET MOTION ---
+# Detections are sorted once by (tracklet, mjd); every tracklet is then a
+# contiguous run of rows, and per-tracklet quantities come from the run
+# boundaries (first/last row) or from np.add.reduceat over the runs.
+# One pass over the table instead of one boolean mask + two SkyCoords per ID.
+
+
+def group_runs(ids, mjd):
+    """
+    Sorts detections by (tracklet, mjd). Returns (order, first, last, labels):
+    rows order[first[k]:last[k]+1] are tracklet labels[k], in time order.
+    Tracklets are numbered in order of first appearance, like Series.unique().
+    """
+    codes, labels = pd.factorize(np.asarray(ids))
+    order = np.lexsort((np.asarray(mjd), codes))
+    if len(order) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return order, empty, empty, labels
+    boundary = np.flatnonzero(np.diff(codes[order])) + 1
+    first = np.concatenate(([0], boundary))
+    last = np.concatenate((boundary - 1, [len(order) - 1]))
+    return order, first, last, labels
+
+
+def tracklet_motion(df):
+    """
+    First/last epoch, arc, great-circle separation, velocity, mean magnitude
+    and observation count for every tracklet in a detections DataFrame
+    (id, mjd, ra, dec, mag). Velocity uses the first and last detection.
+    """
+    order, first, last, labels = group_runs(df['id'], df['mjd'])
+    mjd = df['mjd'].to_numpy(dtype=np.float64)[order]
+    ra = df['ra'].to_numpy(dtype=np.float64)[order]
+    dec = df['dec'].to_numpy(dtype=np.float64)[order]
+    mag = df['mag'].to_numpy(dtype=np.float64)[order]
+
+    n_obs = last - first + 1
+    arc_hours = (mjd[last] - mjd[first]) * 24.0
+    sep_arcsec = angsep(ra[first], dec[first], ra[last], dec[last]) * 3600.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        velocity = np.where(arc_hours > 0, sep_arcsec / arc_hours, np.nan)
+
+    # Mean of the non-blank magnitudes (NaN if a tracklet has none)
+    has_mag = np.isfinite(mag)
+    if len(first):
+        mag_sum = np.add.reduceat(np.where(has_mag, mag, 0.0), first)
+        mag_n = np.add.reduceat(has_mag.astype(np.int64), first)
+    else:
+        mag_sum = mag_n = np.zeros(0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean_mag = np.where(mag_n > 0, mag_sum / mag_n, np.nan)
+
+    return pd.DataFrame({
+        'id': labels,
+        'n_obs': n_obs,
+        'mjd_first': mjd[first],
+        'mjd_last': mjd[last],
+        'arc_hours': arc_hours,
+        'ra_first': ra[first],
+        'dec_first': dec[first],
+        'ra_last': ra[last],
+        'dec_last': dec[last],
+        'sep_arcsec': sep_arcsec,
+        'velocity': velocity,
+        'mean_mag': mean_mag,
+    })
+
+
+# --- LEAST-SQUARES LINEAR MOTION (ALL TRACKLETS AT ONCE) ---
+# Every detection is projected onto the tangent plane of its tracklet's
+# first detection (arcsec, x = east, y = north) and x(t), y(t) are fitted
+# with straight lines. A weighted line fit only needs a handful of sums
+# (n, t, t^2, x, tx, x^2, ...), so np.bincount over the tracklet label
+# solves every fit at once, and subtracting one point's own terms gives the
+# leave-one-out fit of every point for free.
+# Outliers are rejected iteratively: each round takes, per tracklet, the
+# point whose removal lowers the residuals most and drops it if it lies more
+# than CLIP_SIGMA x the RMS of the other points off their line, as long as
+# MIN_KEEP points survive. With MIN_KEEP = 3 a 3-point tracklet is never
+# clipped (a 2-point line through the rest would have no residuals to judge
+# the third point by), and a 2-point tracklet always fits exactly.
+# The RMS is sqrt(RSS / (n - 2)) everywhere, both for the clipping threshold
+# and for the reported fit: each line uses two of the n points.
+
+CLIP_SIGMA = 3.0
+CLIP_ITERATIONS = 3
+MIN_KEEP = 3
+ASTROMETRY_FLOOR = 0.2   # arcsec; never clip below typical astrometric noise
+
+
+def tangent_plane(ra, dec, ra0, dec0):
+    """Gnomonic projection of (ra, dec) about (ra0, dec0). Returns (x, y) in arcsec."""
+    a, d, a0, d0 = (np.deg2rad(v) for v in (ra, dec, ra0, dec0))
+    cos_c = np.sin(d0) * np.sin(d) + np.cos(d0) * np.cos(d) * np.cos(a - a0)
+    x = np.cos(d) * np.sin(a - a0) / cos_c
+    y = (np.cos(d0) * np.sin(d) - np.sin(d0) * np.cos(d) * np.cos(a - a0)) / cos_c
+    return np.rad2deg(x) * 3600.0, np.rad2deg(y) * 3600.0
+
+
+def _point_terms(t, x, y):
+    """Per-point terms of the line-fit sums (n, t, tt, x, tx, xx, y, ty, yy), shape (9, n)."""
+    return np.stack([np.ones_like(t), t, t * t, x, t * x, x * x, y, t * y, y * y])
+
+
+def _solve(S):
+    """Line fits from stacked sums S (rows n, t, tt, x, tx, xx, y, ty, yy). Returns (x0, y0, vx, vy, rss)."""
+    n, st, stt, sx, stx, sxx, sy, sty, syy = S
+    with np.errstate(divide='ignore', invalid='ignore'):
+        den = n * stt - st * st
+        vx = np.where(den > 0, (n * stx - st * sx) / den, 0.0)
+        vy = np.where(den > 0, (n * sty - st * sy) / den, 0.0)
+        x0 = sx / n - vx * st / n
+        y0 = sy / n - vy * st / n
+    rss = (sxx - x0 * sx - vx * stx) + (syy - y0 * sy - vy * sty)
+    return x0, y0, vx, vy, np.maximum(rss, 0.0)
+
+
+def fit_linear_motion(df, clip_sigma=CLIP_SIGMA, iterations=CLIP_ITERATIONS,
+                      min_keep=MIN_KEEP, floor=ASTROMETRY_FLOOR):
+    """
+    Fits linear RA/Dec motion to every tracklet in a detections DataFrame
+    (id, mjd, ra, dec). Returns (fits, used): one row per tracklet in
+    first-appearance order with id, n_obs, n_used, mjd_first, mjd_last,
+    arc_hours (of the used points), rate ("/hr), pa (deg, east of north),
+    rms (arcsec, sqrt(RSS / (n_used - 2))), ra_first, dec_first; and a boolean mask over df's rows
+    marking the detections kept by the fit.
+    """
+    order, first, last, labels = group_runs(df['id'], df['mjd'])
+    n_groups = len(first)
+    n_obs = last - first + 1
+    label = np.repeat(np.arange(n_groups), n_obs)
+
+    mjd = df['mjd'].to_numpy(dtype=np.float64)[order]
+    ra = df['ra'].to_numpy(dtype=np.float64)[order]
+    dec = df['dec'].to_numpy(dtype=np.float64)[order]
+
+    x, y = tangent_plane(ra, dec, ra[first][label], dec[first][label])
+    t = (mjd - mjd[first][label]) * 24.0   # hours since first detection
+    terms = _point_terms(t, x, y)
+
+    def group_sums(used):
+        return np.stack([np.bincount(label, weights=row * used, minlength=n_groups) for row in terms])
+
+    used = np.ones(len(order), dtype=bool)
+    for _ in range(iterations):
+        S = group_sums(used)
+        n_used = S[0]
+
+        # Leave-one-out fit for every used point: group sums minus its own terms
+        loo = S[:, label] - terms
+        x0, y0, vx, vy, rss = _solve(loo)
+        resid = np.hypot(x - x0 - vx * t, y - y0 - vy * t)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # n_used - 1 points remain and the line uses two of them
+            rms_rest = np.sqrt(rss / np.maximum(n_used[label] - 1 - 2, 1))
+
+        # Candidate per tracklet: the point whose removal leaves the smallest RSS
+        eligible = used & (n_used[label] - 1 >= min_keep)
+        score = np.where(eligible, rss, np.inf)
+        best = np.full(n_groups, np.inf)
+        np.minimum.at(best, label, score)
+        idx = np.flatnonzero(eligible & (score == best[label]))
+        _, first_hit = np.unique(label[idx], return_index=True)
+        idx = idx[first_hit]
+
+        # Prediction error grows with the point's distance in time from the others
+        n_rest, t_rest, tt_rest = loo[0][idx], loo[1][idx], loo[2][idx]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            leverage = 1.0 / n_rest + (t[idx] - t_rest / n_rest) ** 2 / (tt_rest - t_rest ** 2 / n_rest)
+        limit = clip_sigma * np.maximum(rms_rest[idx], floor) * np.sqrt(1.0 + leverage)
+        reject = idx[resid[idx] > limit]
+        if len(reject) == 0:
+            break
+        used[reject] = False
+
+    x0, y0, vx, vy, rss = _solve(group_sums(used))
+    n_used = np.bincount(label, weights=used.astype(np.float64), minlength=n_groups).astype(np.int64)
+    t_min = np.full(n_groups, np.inf)
+    t_max = np.full(n_groups, -np.inf)
+    np.minimum.at(t_min, label[used], t[used])
+    np.maximum.at(t_max, label[used], t[used])
+
+    used_mask = np.zeros(len(order), dtype=bool)
+    used_mask[order] = used
+
+    # Two points fit exactly; the sums would leave cancellation noise (~1e-7") instead of 0
+    rss = np.where(n_used <= 2, 0.0, rss)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rms = np.sqrt(rss / np.maximum(n_used - 2, 1))
+    fits = pd.DataFrame({
+        'id': labels,
+        'n_obs': n_obs,
+        'n_used': n_used,
+        'mjd_first': mjd[first],
+        'mjd_last': mjd[last],
+        'arc_hours': t_max - t_min,
+        'rate': np.hypot(vx, vy),
+        'pa': np.mod(np.rad2deg(np.arctan2(vx, vy)), 360.0),
+        'rms': rms,
+        'ra_first': ra[first],
+        'dec_first': dec[first],
+    })
+    return fits, used_mask
+
+
+# --- INTRA-NIGHT LINKING (PAIRS, TRIPLES AND LONGER CHAINS) ---
+# Single detections (e.g. PS1 survivors, one row each) are linked into
+# tracklets without any anchor. Detections are bucketed by night (the MJD
+# day starting at NIGHT_START, local noon in Chile / morning in Arizona) and
+# indexed by one sort on (night, dec): a partner can only lie inside
+# MAX_RATE x the night's length, so each detection binary-searches that Dec
+# window of its own night and only tests the rows inside it.
+#   - pairs: two detections at least MIN_DT_HOURS apart whose implied rate
+#     is within [MIN_RATE, MAX_RATE] "/hr (and magnitudes within MAX_DMAG);
+#   - triples: pair (a, b) followed by pair (b, c) whose velocities agree
+#     within the astrometric error of both legs;
+#   - chains: triples sharing a leg (two detections) are merged, so 4+
+#     detections of one object become one tracklet (a -> b -> c -> d is the
+#     triples (a, b, c) and (b, c, d)).
+# Every candidate is then fitted with fit_linear_motion (which clips a
+# stray point from chains of 4+); pairs between two detections that are
+# already in chains are dropped. Tracklets are ranked by points on the line
+# first, then by fit RMS. Cost: O(N log N) for the sorts and searches, plus
+# the (few) neighbours inside each window.
+
+NIGHT_START = 0.67         # MJD fraction (16h UT) where one observing night ends and the next begins
+LINK_MIN_RATE = 0.1        # arcsec/hour
+LINK_MAX_RATE = 5.0        # arcsec/hour
+LINK_MIN_DT_HOURS = 0.02   # ~1 minute: the same exposure (or its twin) is not motion
+LINK_MAX_DT_HOURS = 14.0   # longest night
+MAX_DMAG = 1.0             # the same object in two exposures of one night
+
+
+def night_of(mjd, night_start=NIGHT_START):
+    """Observing night of each MJD (integer MJD of the evening it started)."""
+    return np.floor(np.asarray(mjd, dtype=np.float64) - night_start).astype(np.int64)
+
+
+def _night_neighbours(night, ra, dec, radius):
+    """Pairs (i, j), i != j, from the same night closer than 'radius' deg."""
+    key = (night - night.min()) * 360.0 + dec if len(night) else dec
+    order = np.argsort(key, kind='stable')
+    sorted_key = key[order]
+    lo = np.searchsorted(sorted_key, key - radius, side='left')
+    hi = np.searchsorted(sorted_key, key + radius, side='right')
+
+    i = np.repeat(np.arange(len(key)), hi - lo)
+    j = order[slices(lo, hi)]
+    keep = (i != j) & (night[i] == night[j])
+    i, j = i[keep], j[keep]
+    keep = angsep(ra[i], dec[i], ra[j], dec[j]) <= radius
+    return i[keep], j[keep]
+
+
+def link_night_pairs(df, min_rate=LINK_MIN_RATE, max_rate=LINK_MAX_RATE, min_dt=LINK_MIN_DT_HOURS,
+                     max_dt=LINK_MAX_DT_HOURS, max_dmag=MAX_DMAG, night_start=NIGHT_START):
+    """
+    Every time-ordered pair of detections (df rows with ra, dec, mjd and an
+    optional mag) consistent with linear motion inside one night. Returns a
+    DataFrame: first, second (row positions), dt (hours), vx, vy ("/hr).
+    """
+    ra = df['ra'].to_numpy(dtype=np.float64)
+    dec = df['dec'].to_numpy(dtype=np.float64)
+    mjd = df['mjd'].to_numpy(dtype=np.float64)
+    i, j = _night_neighbours(night_of(mjd, night_start), ra, dec, max_rate * max_dt / 3600.0)
+
+    dt = (mjd[j] - mjd[i]) * 24.0
+    keep = (dt >= min_dt) & (dt <= max_dt)
+    if 'mag' in df.columns:
+        mag = df['mag'].to_numpy(dtype=np.float64)
+        keep &= ~(np.abs(mag[i] - mag[j]) > max_dmag)
+    i, j, dt = i[keep], j[keep], dt[keep]
+    x, y = tangent_plane(ra[j], dec[j], ra[i], dec[i])
+    vx, vy = x / dt, y / dt
+    rate = np.hypot(vx, vy)
+    keep = (rate >= min_rate) & (rate <= max_rate)
+    return pd.DataFrame({'first': i[keep], 'second': j[keep], 'dt': dt[keep], 'vx': vx[keep], 'vy': vy[keep]})
+
+
+def link_night_triples(pairs, floor=ASTROMETRY_FLOOR):
+    """
+    Triples a -> b -> c from link_night_pairs() output: pair (a, b) followed
+    by pair (b, c) with agreeing velocities. Returns a DataFrame of row
+    positions a, b, c.
+    """
+    pairs = pairs.sort_values(['first', 'second'], kind='stable')
+    first = pairs['first'].to_numpy()
+    lo = np.searchsorted(first, pairs['second'].to_numpy(), side='left')
+    hi = np.searchsorted(first, pairs['second'].to_numpy(), side='right')
+
+    # Every leg (a, b) against every leg (b, c) leaving its second detection
+    pos = slices(lo, hi)
+    p = np.repeat(np.arange(len(first)), hi - lo)
+    dt1, dt2 = pairs['dt'].to_numpy()[p], pairs['dt'].to_numpy()[pos]
+    dv = np.hypot(pairs['vx'].to_numpy()[p] - pairs['vx'].to_numpy()[pos],
+                  pairs['vy'].to_numpy()[p] - pairs['vy'].to_numpy()[pos])
+    agree = dv <= floor * (1.0 / dt1 + 1.0 / dt2)
+    second = pairs['second'].to_numpy()
+    return pd.DataFrame({'a': first[p][agree], 'b': second[p][agree], 'c': second[pos][agree]})
+
+
+def merge_chains(triples):
+    """Chain label of every triple: triples sharing two detections (a leg) get the same label."""
+    n = len(triples)
+    abc = triples[['a', 'b', 'c']].to_numpy(dtype=np.int64)
+    legs = np.concatenate([abc[:, [0, 1]], abc[:, [1, 2]], abc[:, [0, 2]]])
+    owner = np.tile(np.arange(n), 3)
+    order = np.lexsort((legs[:, 1], legs[:, 0]))
+    legs, owner = legs[order], owner[order]
+    same = np.flatnonzero((legs[1:] == legs[:-1]).all(axis=1))
+    u, v = owner[same], owner[same + 1]
+
+    # Label propagation: every triple takes the smallest label it is connected to
+    label = np.arange(n)
+    while True:
+        new = label.copy()
+        np.minimum.at(new, u, label[v])
+        np.minimum.at(new, v, label[u])
+        new = new[new]
+        if np.array_equal(new, label):
+            return label
+        label = new
+
+
+def link_tracklets(df, floor=ASTROMETRY_FLOOR, **pair_args):
+    """
+    Links single detections (ra, dec, mjd[, mag]) into scored intra-night
+    tracklets. Returns (tracklets, members): one row per tracklet with
+    tracklet, night, n_points, rate, pa, rms, arc_hours, mjd_first,
+    ra_first, dec_first and score (best first); and the df rows of each
+    tracklet (tracklet, row = df position).
+    Score: points on the line, minus rms / (rms + floor). The penalty is
+    below 1, so more points always rank higher and the RMS only orders
+    tracklets with the same number of points.
+    """
+    pairs = link_night_pairs(df, **pair_args)
+    triples = link_night_triples(pairs, floor=floor)
+
+    # Pairs between detections already in a chain add nothing
+    chained = np.unique(triples[['a', 'b', 'c']].to_numpy())
+    lone = pairs[~(np.isin(pairs['first'], chained) & np.isin(pairs['second'], chained))]
+
+    # Chains of triples, then the lone pairs, each detection once per tracklet
+    _, chain = np.unique(merge_chains(triples), return_inverse=True)
+    n_chains, n_pairs = (chain.max() + 1 if len(chain) else 0), len(lone)
+    members = pd.DataFrame({
+        'tracklet': np.concatenate([np.repeat(chain, 3),
+                                    n_chains + np.repeat(np.arange(n_pairs), 2)]).astype(np.int64),
+        'row': np.concatenate([triples[['a', 'b', 'c']].to_numpy().ravel(),
+                               lone[['first', 'second']].to_numpy().ravel()]).astype(np.int64),
+    }).drop_duplicates().sort_values(['tracklet', 'row'], kind='stable').reset_index(drop=True)
+    detections = pd.DataFrame({'id': members['tracklet'].to_numpy(),
+                               'mjd': df['mjd'].to_numpy(dtype=np.float64)[members['row']],
+                               'ra': df['ra'].to_numpy(dtype=np.float64)[members['row']],
+                               'dec': df['dec'].to_numpy(dtype=np.float64)[members['row']]})
+    fits, _ = fit_linear_motion(detections, floor=floor)
+
+    tracklets = pd.DataFrame({
+        'tracklet': fits['id'].astype(np.int64),
+        'night': night_of(fits['mjd_first'], pair_args.get('night_start', NIGHT_START)),
+        'n_points': fits['n_used'],
+        'rate': fits['rate'],
+        'pa': fits['pa'],
+        'rms': fits['rms'],
+        'arc_hours': fits['arc_hours'],
+        'mjd_first': fits['mjd_first'],
+        'ra_first': fits['ra_first'],
+        'dec_first': fits['dec_first'],
+    })
+    tracklets['score'] = tracklets['n_points'] - tracklets['rms'] / (tracklets['rms'] + floor)
+    tracklets = tracklets.sort_values(['score', 'arc_hours'], ascending=False, kind='stable').reset_index(drop=True)
+    return tracklets, members
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+from itf_parser import iter_blocks, open_itf, scan_itf
+
+BLOCK_BYTES = 4096   # ~50 lines per block
+
+
+def _line(k, rng):
+    """One 80-column MPC observation line of tracklet k."""
+    ra_h, ra_m, ra_s = rng.integers(0, 24), rng.integers(0, 60), rng.uniform(0, 60)
+    sign, dec_d, dec_m, dec_s = rng.choice(['+', '-']), rng.integers(0, 89), rng.integers(0, 60), rng.uniform(0, 60)
+    day = rng.uniform(1, 28)
+    mag = f"{rng.uniform(18, 24):4.1f} " if k % 7 else "     "
+    line = (f"     K{k:05d}   C{2010 + k % 10:4d} {1 + k % 12:02d} {day:09.6f}"
+            f"{ra_h:02d} {ra_m:02d} {ra_s:06.3f}{sign}{dec_d:02d} {dec_m:02d} {dec_s:05.2f}"
+            f"         {mag}r      W84")
+    assert len(line) == 80
+    return line
+
+
+def _write_itf(path, n=1000, seed=5):
+    rng = np.random.default_rng(seed)
+    lines = ["ITF header: junk shorter than a detection"] + [_line(k, rng) for k in range(n)]
+    text = "\n".join(lines[:500]) + "\r\n" + "\n".join(lines[500:])   # one CRLF line, no final newline
+    path.write_bytes(text.encode('ascii'))
+    return len(lines) - 1
+
+
+def test_parallel_scan_matches_serial(tmp_path):
+    path = tmp_path / "itf.txt"
+    n = _write_itf(path)
+    data = open_itf(str(path))
+    ranges = list(iter_blocks(data, BLOCK_BYTES))
+    assert len(ranges) > 4
+    # Some block's nominal end falls inside a line, which iter_blocks extends to the newline
+    assert any(stop - start > BLOCK_BYTES for start, stop in ranges[:-1])
+
+    whole = scan_itf(str(path), block_bytes=len(data) + 1, workers=1)
+    serial = scan_itf(str(path), block_bytes=BLOCK_BYTES, workers=1)
+    assert len(whole) == n
+    pd.testing.assert_frame_equal(serial, whole)
+    for workers in (2, 3):
+        pd.testing.assert_frame_equal(scan_itf(str(path), block_bytes=BLOCK_BYTES, workers=workers), serial)
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+from tracklets import fit_linear_motion, link_tracklets
+
+
+def _pairs(n, seed=1):
+    """n two-detection objects on separate nights, moving 0.5-4 "/hr over 0.5-12 h arcs."""
+    rng = np.random.default_rng(seed)
+    ra, dec = rng.uniform(0.0, 360.0, n), rng.uniform(-60.0, 30.0, n)
+    mjd = 57000.7 + np.arange(n) + rng.uniform(0.0, 0.4, n)
+    hours = rng.uniform(0.5, 12.0, n)
+    rate, pa = rng.uniform(0.5, 4.0, n), rng.uniform(0.0, 2 * np.pi, n)
+    ddec = rate * hours * np.cos(pa) / 3600.0
+    dra = rate * hours * np.sin(pa) / 3600.0 / np.cos(np.deg2rad(dec))
+    return pd.DataFrame({'id': np.repeat(np.arange(n), 2),
+                         'mjd': np.column_stack([mjd, mjd + hours / 24.0]).ravel(),
+                         'ra': np.column_stack([ra, ra + dra]).ravel(),
+                         'dec': np.column_stack([dec, dec + ddec]).ravel()})
+
+
+def test_two_point_fits_have_zero_rms():
+    fits, _ = fit_linear_motion(_pairs(50))
+    assert (fits['n_used'] == 2).all()
+    assert (fits['rms'] == 0.0).all()
+
+
+def test_pairs_ranked_by_arc_length():
+    tracklets, _ = link_tracklets(_pairs(50).drop(columns='id'))
+    assert len(tracklets) == 50
+    assert (tracklets['n_points'] == 2).all()
+    assert np.all(np.diff(tracklets['arc_hours'].to_numpy()) < 0)